@@ -1,6 +1,10 @@
 import pygame
 import sys
 import math
+import argparse
+from text_cache import render_text, GlyphAtlas
+from instrument_layers import ColorLUT, StaticLayer
+from profiling import frame_done, add_profile_arguments, run_main
 
 # Initialize Pygame
 pygame.init()
@@ -12,6 +16,9 @@ WHITE = (255, 255, 255)
 RED = (255, 0, 0)
 IMAGE_SCALE_FACTOR = 0.32  # Adjust the scale factor as needed
 PITCH_ROLL_SPEED = 1  # Adjust the speed of pitch and roll adjustments
+CIRCLE_RADIUS = 100
+LEFT_CIRCLE_CENTER = (WIDTH // 4, HEIGHT // 2)  # Center for the left image (Roll)
+RIGHT_CIRCLE_CENTER = (3 * WIDTH // 4, HEIGHT // 2)  # Center for the right image (Pitch)
 
 def pitch_angle_to_color(angle):
     # Convert the pitch angle to a color gradient centered on 0
@@ -59,6 +66,27 @@ def roll_angle_to_color(angle):
     else:
         return RED
 
+# The gradients looked up instead of recomputed every frame
+PITCH_COLORS = ColorLUT(pitch_angle_to_color)
+ROLL_COLORS = ColorLUT(roll_angle_to_color)
+
+def draw_horizon_markers(screen):
+    """Draw the fixed pitch and roll pointers of the horizon rulers."""
+    pitch_ruler_width = 10
+    pitch_marker_y = CENTER[1]
+    pygame.draw.polygon(screen, RED, [(pitch_ruler_width * 4, pitch_marker_y),
+                                       (pitch_ruler_width * 5, pitch_marker_y + 10),
+                                       (pitch_ruler_width * 5, pitch_marker_y - 10)])
+
+    roll_ruler_height = 10
+    roll_marker_x = CENTER[0]
+    pygame.draw.polygon(screen, RED, [(roll_marker_x - 10, roll_ruler_height * 4),
+                                        (roll_marker_x + 10, roll_ruler_height * 4),
+                                        (roll_marker_x, roll_ruler_height * 3)])
+
+# The pointers never move, render them once
+HORIZON_MARKERS = StaticLayer((WIDTH, HEIGHT), draw_horizon_markers)
+
 def draw_horizon(screen, roll, pitch):
     screen.fill(WHITE)
 
@@ -66,7 +94,7 @@ def draw_horizon(screen, roll, pitch):
     pitch_ruler_height = HEIGHT
     pitch_ruler_rect = pygame.Rect(0, 0, pitch_ruler_width, pitch_ruler_height)
 
-    pitch_color = pitch_angle_to_color(pitch)
+    pitch_color = PITCH_COLORS(pitch)
     pygame.draw.rect(screen, pitch_color, pitch_ruler_rect)
 
     pitch_interval = 10
@@ -75,21 +103,15 @@ def draw_horizon(screen, roll, pitch):
             rotated_angle = angle + pitch 
             pitch_line_y = CENTER[1] - int((pitch_ruler_height / 180) * rotated_angle)
             alpha = int(255 * (1 - abs(angle) / 40))
-            font = pygame.font.Font(None, 24)
-            text = font.render(str(angle), True, (RED[0], RED[1], RED[2], alpha))
+            text = render_text(str(angle), (RED[0], RED[1], RED[2], alpha))
             text_rect = text.get_rect(center=(pitch_ruler_width * 3, pitch_line_y))
             screen.blit(text, text_rect)
 
-    pitch_marker_y = CENTER[1]
-    pygame.draw.polygon(screen, RED, [(pitch_ruler_width * 4, pitch_marker_y),
-                                       (pitch_ruler_width * 5, pitch_marker_y + 10),
-                                       (pitch_ruler_width * 5, pitch_marker_y - 10)])
-
     roll_ruler_width = WIDTH
     roll_ruler_height = 10
     roll_ruler_rect = pygame.Rect(0, 0, roll_ruler_width, roll_ruler_height)
 
-    roll_color = roll_angle_to_color(roll)
+    roll_color = ROLL_COLORS(roll)
     pygame.draw.rect(screen, roll_color, roll_ruler_rect)
 
     roll_interval = 10
@@ -98,15 +120,12 @@ def draw_horizon(screen, roll, pitch):
             rotated_angle = roll - angle
             roll_line_x = CENTER[0] + int((roll_ruler_width / 180) * rotated_angle)
             alpha = int(255 * (1 - abs(angle) / 40))
-            font = pygame.font.Font(None, 24)
-            text = font.render(str(angle), True, (RED[0], RED[1], RED[2], alpha))
+            text = render_text(str(angle), (RED[0], RED[1], RED[2], alpha))
             text_rect = text.get_rect(center=(roll_line_x, roll_ruler_height * 3))
             screen.blit(text, text_rect)
 
-    roll_marker_x = CENTER[0]
-    pygame.draw.polygon(screen, RED, [(roll_marker_x - 10, roll_ruler_height * 4),
-                                        (roll_marker_x + 10, roll_ruler_height * 4),
-                                        (roll_marker_x, roll_ruler_height * 3)])
+    # Pointers last, over any label that scrolls under them
+    HORIZON_MARKERS.blit(screen)
 
 def rotate_image(image, angle, circle_center):
     """Rotate an image around its center and calculate the new position to keep it centered at a given point."""
@@ -126,9 +145,8 @@ def scale_image(image, scale_factor):
     scaled_image = pygame.transform.scale(image, (scaled_width, scaled_height))
     return scaled_image
 
-def draw_angle_markers(screen, center, radius, current_angle, is_pitch=False):
-    """Draw static angle markers like a protractor around a circle, and a moving marker for the current angle."""
-    font = pygame.font.Font(None, 24)
+def draw_angle_scale(screen, center, radius, is_pitch=False):
+    """Draw static angle markers like a protractor around a circle."""
     marker_length = 10  # Length of the marker lines extending out from the circle
 
     # Define angles for static markers
@@ -148,16 +166,26 @@ def draw_angle_markers(screen, center, radius, current_angle, is_pitch=False):
         pygame.draw.line(screen, RED, inner_pos, outer_pos, 2)
 
         # Draw angle text
-        text = font.render(str(angle), True, RED)
+        text = render_text(str(angle), RED)
         text_rect = text.get_rect(center=(outer_pos[0], outer_pos[1] - 10))
         screen.blit(text, text_rect)
 
-    # Draw moving marker for current angle
+def draw_moving_marker(screen, center, radius, current_angle, is_pitch=False):
+    """Draw the marker for the current angle on a circle."""
     current_draw_angle = -current_angle if is_pitch else 90 - current_angle
     current_rad = math.radians(current_draw_angle)
     marker_pos = (center[0] + radius * math.cos(current_rad), center[1] - radius * math.sin(current_rad))
     pygame.draw.circle(screen, RED, marker_pos, 5)  # Moving marker
 
+def draw_dial_scale(screen, center, is_pitch=False):
+    """Draw the circle around a dial image and its protractor scale."""
+    pygame.draw.circle(screen, RED, center, CIRCLE_RADIUS, 2)
+    draw_angle_scale(screen, center, CIRCLE_RADIUS, is_pitch)
+
+def make_angle_scales():
+    """The roll and pitch dial circles and protractor scales, baked once as StaticLayers."""
+    return (StaticLayer((WIDTH, HEIGHT), lambda surface: draw_dial_scale(surface, LEFT_CIRCLE_CENTER, is_pitch=False)),
+            StaticLayer((WIDTH, HEIGHT), lambda surface: draw_dial_scale(surface, RIGHT_CIRCLE_CENTER, is_pitch=True)))
 
 
 def ahrs_main():
@@ -178,8 +206,11 @@ def ahrs_main():
     pitch_angle = 0
     roll_angle = 0
 
-    # Font for data boxes and angle markers
-    font = pygame.font.Font(None, 24)
+    # Pre-rendered glyphs for the roll and pitch readouts
+    readout = GlyphAtlas(RED)
+
+    # Circles, ticks and labels never move, render them once
+    left_scale, right_scale = make_angle_scales()
 
     clock = pygame.time.Clock()
 
@@ -202,9 +233,9 @@ def ahrs_main():
         back_buffer.fill(WHITE)
 
         # Define circle properties
-        circle_radius = 100
-        left_circle_center = (WIDTH // 4, HEIGHT // 2)  # Center for the left image (Roll)
-        right_circle_center = (3 * WIDTH // 4, HEIGHT // 2)  # Center for the right image (Pitch)
+        circle_radius = CIRCLE_RADIUS
+        left_circle_center = LEFT_CIRCLE_CENTER
+        right_circle_center = RIGHT_CIRCLE_CENTER
 
         # Rotate and blit the images to the back buffer, negating the angles to correct rotation direction
         rotated_left_image, new_position_left = rotate_image(left_image, -roll_angle, left_circle_center)
@@ -213,25 +244,15 @@ def ahrs_main():
         rotated_right_image, new_position_right = rotate_image(right_image, pitch_angle, right_circle_center)
         back_buffer.blit(rotated_right_image, new_position_right)
 
-        # Draw circles around the images
-        pygame.draw.circle(back_buffer, RED, left_circle_center, circle_radius, 2)
-        pygame.draw.circle(back_buffer, RED, right_circle_center, circle_radius, 2)
-
-        # Draw angle markers and moving marker for roll and pitch
-        draw_angle_markers(back_buffer, left_circle_center, circle_radius, roll_angle, is_pitch=False)
-        draw_angle_markers(back_buffer, right_circle_center, circle_radius, -pitch_angle, is_pitch=True)
-
-        # Draw data boxes for roll and pitch under the circles
-        roll_text = font.render(f"Roll: {roll_angle:.3f}°", True, RED)
-        pitch_text = font.render(f"Pitch: {pitch_angle:.3f}°", True, RED)
-
-        # Position data boxes below the circles
-        roll_text_rect = roll_text.get_rect(midtop=(left_circle_center[0], left_circle_center[1] + circle_radius + 20))
-        pitch_text_rect = pitch_text.get_rect(midtop=(right_circle_center[0], right_circle_center[1] + circle_radius + 20))
+        # Blit the static circles and angle markers, then draw the moving marker for roll and pitch
+        left_scale.blit(back_buffer)
+        right_scale.blit(back_buffer)
+        draw_moving_marker(back_buffer, left_circle_center, circle_radius, roll_angle, is_pitch=False)
+        draw_moving_marker(back_buffer, right_circle_center, circle_radius, -pitch_angle, is_pitch=True)
 
-        # Blit data boxes onto the back buffer
-        back_buffer.blit(roll_text, roll_text_rect)
-        back_buffer.blit(pitch_text, pitch_text_rect)
+        # Draw data boxes for roll and pitch under the circles, glyph by glyph from the atlas
+        readout.blit(back_buffer, f"{roll_angle:.3f}°", prefix="Roll: ", midtop=(left_circle_center[0], left_circle_center[1] + circle_radius + 20))
+        readout.blit(back_buffer, f"{pitch_angle:.3f}°", prefix="Pitch: ", midtop=(right_circle_center[0], right_circle_center[1] + circle_radius + 20))
 
         # Blit the back buffer to the screen
         screen.blit(back_buffer, (0, 0))
@@ -241,9 +262,13 @@ def ahrs_main():
 
         # Cap the frame rate
         clock.tick(60)
+        frame_done()
 
 
 if __name__ == "__main__":
-    ahrs_main()
+    parser = argparse.ArgumentParser(description='AHRS instrument demo, roll and pitch from the arrow keys')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    run_main(args, ahrs_main)
 
 #((WIDTH - rotated_left_image.get_width()) // 4, (HEIGHT - rotated_left_image.get_height()) // 2))
@@ -1,6 +1,11 @@
 import pygame
 import sys
 import math
+import argparse
+from text_cache import render_text, GlyphAtlas
+from rotation_cache import RotationCache
+from instrument_layers import ColorLUT, StaticLayer
+from profiling import frame_done, add_profile_arguments, run_main
 
 # Initialize Pygame
 pygame.init()
@@ -59,6 +64,10 @@ def roll_angle_to_color(angle):
     else:
         return RED
 
+# The gradients looked up instead of recomputed every frame
+PITCH_COLORS = ColorLUT(pitch_angle_to_color)
+ROLL_COLORS = ColorLUT(roll_angle_to_color)
+
 
 def rotate_image(image, angle, circle_center):
     """Rotate an image around its center and calculate the new position to keep it centered at a given point."""
@@ -78,9 +87,8 @@ def scale_image(image, scale_factor):
     scaled_image = pygame.transform.scale(image, (scaled_width, scaled_height))
     return scaled_image
 
-def draw_angle_markers(screen, center, radius, current_angle, is_pitch=False):
-    """Draw static angle markers like a protractor around a circle, and a moving marker for the current angle."""
-    font = pygame.font.Font(None, 24)
+def draw_angle_scale(screen, center, radius, is_pitch=False):
+    """Draw static angle markers like a protractor around a circle."""
     marker_length = 10  # Length of the marker lines extending out from the circle
 
     # Define angles for static markers
@@ -100,11 +108,12 @@ def draw_angle_markers(screen, center, radius, current_angle, is_pitch=False):
         pygame.draw.line(screen, RED, inner_pos, outer_pos, 2)
 
         # Draw angle text
-        text = font.render(str(angle), True, RED)
+        text = render_text(str(angle), RED)
         text_rect = text.get_rect(center=(outer_pos[0], outer_pos[1] - 10))
         screen.blit(text, text_rect)
 
-    # Draw moving marker for current angle
+def draw_moving_marker(screen, center, radius, current_angle, is_pitch=False):
+    """Draw the marker for the current angle on a circle."""
     current_draw_angle = -current_angle if is_pitch else 90 - current_angle
     current_rad = math.radians(current_draw_angle)
     marker_pos = (center[0] + radius * math.cos(current_rad), center[1] - radius * math.sin(current_rad))
@@ -123,6 +132,10 @@ def ahrs_main():
     right_image = pygame.image.load("Rover GUI Images/Ortho_Right_PNG.PNG")  # Ensure correct pathOrtho_Right_PNG.PNG
     right_image = scale_image(right_image, IMAGE_SCALE_FACTOR)
 
+    # Rotations at quantized angles, rendered once and then served as plain blits
+    left_rotations = RotationCache(left_image)
+    right_rotations = RotationCache(right_image)
+
     # Create back buffer surface
     back_buffer = pygame.Surface((WIDTH, HEIGHT))
 
@@ -130,8 +143,12 @@ def ahrs_main():
     pitch_angle = 0
     roll_angle = 0
 
-    # Font for data boxes and angle markers
-    font = pygame.font.Font(None, 24)
+    # Pre-rendered glyphs for the roll and pitch readouts
+    readout = GlyphAtlas(RED)
+
+    # Protractor ticks and labels never move, render them once
+    left_scale = StaticLayer((WIDTH, HEIGHT), lambda surface: draw_angle_scale(surface, (WIDTH // 4, HEIGHT // 2), 100, is_pitch=False))
+    right_scale = StaticLayer((WIDTH, HEIGHT), lambda surface: draw_angle_scale(surface, (3 * WIDTH // 4, HEIGHT // 2), 100, is_pitch=True))
 
     clock = pygame.time.Clock()
 
@@ -160,34 +177,28 @@ def ahrs_main():
         right_circle_center_adjust = (3 * WIDTH // 4, (HEIGHT // 2) + 10)
 
         # Rotate and blit the images to the back buffer, negating the angles to correct rotation direction
-        rotated_left_image, new_position_left = rotate_image(left_image, -roll_angle, left_circle_center)
+        rotated_left_image, new_position_left = left_rotations.rotate(-roll_angle, left_circle_center)
         back_buffer.blit(rotated_left_image, new_position_left)
 
-        rotated_right_image, new_position_right = rotate_image(right_image, pitch_angle, right_circle_center)
+        rotated_right_image, new_position_right = right_rotations.rotate(pitch_angle, right_circle_center)
         back_buffer.blit(rotated_right_image, new_position_right)
 
 
-        pitch_color = pitch_angle_to_color(pitch_angle)
-        roll_color = roll_angle_to_color(roll_angle)
+        pitch_color = PITCH_COLORS(pitch_angle)
+        roll_color = ROLL_COLORS(roll_angle)
         # Draw circles around the images
         pygame.draw.circle(back_buffer, roll_color, left_circle_center, circle_radius, 4)
         pygame.draw.circle(back_buffer, pitch_color, right_circle_center, circle_radius, 4)
 
-        # Draw angle markers and moving marker for roll and pitch
-        draw_angle_markers(back_buffer, left_circle_center, circle_radius, roll_angle, is_pitch=False)
-        draw_angle_markers(back_buffer, right_circle_center, circle_radius, -pitch_angle, is_pitch=True)
-
-        # Draw data boxes for roll and pitch under the circles
-        roll_text = font.render(f"Roll: {roll_angle:.3f}°", True, RED)
-        pitch_text = font.render(f"Pitch: {pitch_angle:.3f}°", True, RED)
-
-        # Position data boxes below the circles
-        roll_text_rect = roll_text.get_rect(midtop=(left_circle_center[0], left_circle_center[1] + circle_radius + 20))
-        pitch_text_rect = pitch_text.get_rect(midtop=(right_circle_center[0], right_circle_center[1] + circle_radius + 20))
+        # Blit the static angle markers, then draw the moving marker for roll and pitch
+        left_scale.blit(back_buffer)
+        right_scale.blit(back_buffer)
+        draw_moving_marker(back_buffer, left_circle_center, circle_radius, roll_angle, is_pitch=False)
+        draw_moving_marker(back_buffer, right_circle_center, circle_radius, -pitch_angle, is_pitch=True)
 
-        # Blit data boxes onto the back buffer
-        back_buffer.blit(roll_text, roll_text_rect)
-        back_buffer.blit(pitch_text, pitch_text_rect)
+        # Draw data boxes for roll and pitch under the circles, glyph by glyph from the atlas
+        readout.blit(back_buffer, f"{roll_angle:.3f}°", prefix="Roll: ", midtop=(left_circle_center[0], left_circle_center[1] + circle_radius + 20))
+        readout.blit(back_buffer, f"{pitch_angle:.3f}°", prefix="Pitch: ", midtop=(right_circle_center[0], right_circle_center[1] + circle_radius + 20))
 
         # Blit the back buffer to the screen
         screen.blit(back_buffer, (0, 0))
@@ -197,9 +208,13 @@ def ahrs_main():
 
         # Cap the frame rate
         clock.tick(60)
+        frame_done()
 
 
 if __name__ == "__main__":
-    ahrs_main()
+    parser = argparse.ArgumentParser(description='AHRS instrument demo, roll and pitch from the arrow keys')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    run_main(args, ahrs_main)
 
 #((WIDTH - rotated_left_image.get_width()) // 4, (HEIGHT - rotated_left_image.get_height()) // 2))
@@ -1,11 +1,27 @@
 import pygame
 import sys
 import math
-import board
-import busio
-from adafruit_lsm6ds.ism330dhcx import ISM330DHCX
-from ahrs.filters import Madgwick
+import time
+import argparse
+import atexit
+import asyncio
 import numpy as np
+from text_cache import render_text, GlyphAtlas
+from rotation_cache import RotationCache, ROTATION_STEP, ROTATION_CACHE_MB
+from dirty_rects import DirtyTracker, FULL_FLIP_FRACTION
+from instrument_layers import ColorLUT, StaticLayer
+from ism330_fifo import FifoReader, FIFO_MAX_WORDS
+from acquisition import (SampleRing, SamplePipeline, AcquisitionWorker, MultiSensorPipeline, SampleBudget,
+                         AttitudeInterpolator, RENDER_DELAY)
+from imu_log import ImuRecorder
+from async_pipeline import run_pipeline
+from frame_timing import FrameTimer, FrameTimingLog, TimingHUD
+from profiling import frame_done, add_profile_arguments, run_main
+from telemetry import TelemetryPublisher, TelemetryReceiver, parse_address, TELEMETRY_TTL
+from fusion_backends import make_backend, BACKENDS
+from calibration import calibrate_gyro, load_or_calibrate_gyro, load_accel_calibration
+from temp_bias import load_temp_bias_table, save_temp_bias_table
+from sim_sensor import open_sensor, sensor_clock, sensor_rate, add_sensor_arguments
 
 # Initialize Pygame
 pygame.init()
@@ -17,6 +33,14 @@ WHITE = (255, 255, 255)
 RED = (255, 0, 0)
 IMAGE_SCALE_FACTOR = 0.5 # Adjust the scale factor as needed
 PITCH_ROLL_SPEED = 1  # Adjust the speed of pitch and roll adjustments
+CIRCLE_RADIUS = 100
+LEFT_CIRCLE_CENTER = (WIDTH // 4, HEIGHT // 2)  # Center for the left image (Roll)
+RIGHT_CIRCLE_CENTER = (3 * WIDTH // 4, HEIGHT // 2)  # Center for the right image (Pitch)
+HUD_KEY = pygame.K_h  # Shows and hides the timing overlay
+REPORT_INTERVAL = 5  # Seconds between the status reports on stdout
+# Stages timed in each frame, the sensor ones only when the render loop reads the sensor itself
+SENSOR_STAGES = ('read', 'bias', 'update')
+DISPLAY_STAGES = ('euler', 'rotate', 'dials', 'text', 'present')
 
 def pitch_angle_to_color(angle):
     # Convert the pitch angle to a color gradient centered on 0
@@ -64,6 +88,10 @@ def roll_angle_to_color(angle):
     else:
         return RED
 
+# The gradients looked up instead of recomputed every frame
+PITCH_COLORS = ColorLUT(pitch_angle_to_color)
+ROLL_COLORS = ColorLUT(roll_angle_to_color)
+
 def rotate_image(image, angle, circle_center):
     """Rotate an image around its center and calculate the new position to keep it centered at a given point."""
     # Rotate the image
@@ -82,9 +110,8 @@ def scale_image(image, scale_factor):
     scaled_image = pygame.transform.scale(image, (scaled_width, scaled_height))
     return scaled_image
 
-def draw_angle_markers(screen, center, radius, current_angle, is_pitch=False):
-    """Draw static angle markers like a protractor around a circle, and a moving marker for the current angle."""
-    font = pygame.font.Font(None, 24)
+def draw_angle_scale(screen, center, radius, is_pitch=False):
+    """Draw static angle markers like a protractor around a circle."""
     marker_length = 10  # Length of the marker lines extending out from the circle
 
     # Define angles for static markers
@@ -104,15 +131,16 @@ def draw_angle_markers(screen, center, radius, current_angle, is_pitch=False):
         pygame.draw.line(screen, RED, inner_pos, outer_pos, 2)
 
         # Draw angle text
-        text = font.render(str(angle), True, RED)
+        text = render_text(str(angle), RED)
         text_rect = text.get_rect(center=(outer_pos[0], outer_pos[1] - 10))
         screen.blit(text, text_rect)
 
-    # Draw moving marker for current angle
+def draw_moving_marker(screen, center, radius, current_angle, is_pitch=False):
+    """Draw the marker for the current angle on a circle, returns its rect."""
     current_draw_angle = -current_angle if is_pitch else 90 - current_angle
     current_rad = math.radians(current_draw_angle)
     marker_pos = (center[0] + radius * math.cos(current_rad), center[1] - radius * math.sin(current_rad))
-    pygame.draw.circle(screen, RED, marker_pos, 5)  # Moving marker
+    return pygame.draw.circle(screen, RED, marker_pos, 5)  # Moving marker
 
 def quaternion_to_euler(q):
     """Convert quaternion to roll and pitch angles."""
@@ -121,28 +149,89 @@ def quaternion_to_euler(q):
     pitch = np.arcsin(2.0 * (w * y - z * x))
     return np.degrees(roll), np.degrees(pitch)
 
+def make_angle_scales():
+    """The roll and pitch protractor scales, baked once as StaticLayers."""
+    return (StaticLayer((WIDTH, HEIGHT), lambda surface: draw_angle_scale(surface, LEFT_CIRCLE_CENTER, CIRCLE_RADIUS, is_pitch=False)),
+            StaticLayer((WIDTH, HEIGHT), lambda surface: draw_angle_scale(surface, RIGHT_CIRCLE_CENTER, CIRCLE_RADIUS, is_pitch=True)))
+
+def draw_frame(back_buffer, left_rotations, right_rotations, scales, readout, roll_angle, pitch_angle, dirty=None, timer=None):
+    """Draw the roll and pitch dials for one frame into the back buffer.
+
+    `scales` are the pre-rendered protractor scales from make_angle_scales(). The moving
+    elements are marked on `dirty` (a DirtyTracker), if given, so only what changed has to be
+    pushed to the screen. A timer (a FrameTimer) gets the 'rotate', 'dials' and 'text' stages.
+    """
+    start = time.perf_counter()
+    # Clear the back buffer
+    back_buffer.fill(WHITE)
+
+    # Define circle properties
+    circle_radius = CIRCLE_RADIUS
+    left_circle_center = LEFT_CIRCLE_CENTER
+    right_circle_center = RIGHT_CIRCLE_CENTER
+    right_circle_center_adjust = (3 * WIDTH // 4, (HEIGHT // 2) + 10)
+
+    # Blit the pre-rotated images to the back buffer, negating the angles to correct rotation direction
+    rotated_left_image, new_position_left = left_rotations.rotate(-roll_angle, left_circle_center)
+    left_rect = back_buffer.blit(rotated_left_image, new_position_left)
+
+    rotated_right_image, new_position_right = right_rotations.rotate(pitch_angle, right_circle_center)
+    right_rect = back_buffer.blit(rotated_right_image, new_position_right)
+    rotated = time.perf_counter()
+
+    pitch_color = PITCH_COLORS(pitch_angle)
+    roll_color = ROLL_COLORS(roll_angle)
+    # Draw circles around the images
+    roll_circle = pygame.draw.circle(back_buffer, roll_color, left_circle_center, circle_radius, 4)
+    pitch_circle = pygame.draw.circle(back_buffer, pitch_color, right_circle_center, circle_radius, 4)
+
+    # Blit the static angle markers, then draw the moving marker for roll and pitch
+    for scale in scales:
+        scale.blit(back_buffer)
+    roll_marker = draw_moving_marker(back_buffer, left_circle_center, circle_radius, roll_angle, is_pitch=False)
+    pitch_marker = draw_moving_marker(back_buffer, right_circle_center, circle_radius, -pitch_angle, is_pitch=True)
+    dials_drawn = time.perf_counter()
+
+    # Draw data boxes for roll and pitch under the circles, glyph by glyph from the atlas
+    roll_text = f"{roll_angle:.3f}°"
+    pitch_text = f"{pitch_angle:.3f}°"
+    roll_text_rect = readout.blit(back_buffer, roll_text, prefix="Roll: ", midtop=(left_circle_center[0], left_circle_center[1] + circle_radius + 20))
+    pitch_text_rect = readout.blit(back_buffer, pitch_text, prefix="Pitch: ", midtop=(right_circle_center[0], right_circle_center[1] + circle_radius + 20))
+    if timer is not None:
+        timer.add('rotate', rotated - start)
+        timer.add('dials', dials_drawn - rotated)
+        timer.add('text', time.perf_counter() - dials_drawn)
+
+    if dirty is not None:
+        dirty.mark('left image', rotated_left_image, left_rect)
+        dirty.mark('right image', rotated_right_image, right_rect)
+        dirty.mark('roll circle', roll_color, roll_circle)
+        dirty.mark('pitch circle', pitch_color, pitch_circle)
+        dirty.mark('roll marker', None, roll_marker)
+        dirty.mark('pitch marker', None, pitch_marker)
+        dirty.mark('roll text', roll_text, roll_text_rect)
+        dirty.mark('pitch text', pitch_text, pitch_text_rect)
+
+def handle_events(hud, dirty):
+    """Quit when the window is closed, show or hide the timing overlay on HUD_KEY."""
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            pygame.quit()
+            sys.exit()
+        elif event.type == pygame.KEYDOWN and event.key == HUD_KEY:
+            hud.toggle()
+            # The whole frame goes out next, so a hidden overlay does not linger on screen
+            dirty.invalidate()
+
 def calibrate_sensor(sox, num_samples=1000):
-    gyro_bias = np.zeros(3)
-    for _ in range(num_samples):
-        gyro_bias += np.array(sox.gyro)
-    return gyro_bias / num_samples
+    """Measure the gyro bias, stopping early once the running mean has settled."""
+    return np.array(calibrate_gyro(sox, max_samples=num_samples).mean)
 
-manual_gyro_bias = np.array([0.006795875774952921, -0.0014508049407202864, -0.002443460952792061])
+def open_display(rotation_step=ROTATION_STEP, rotation_cache_mb=ROTATION_CACHE_MB, warm_rotations=False, full_flip=False):
+    """Open the window and set up everything draw_frame() needs.
 
-def ahrs_main():
-    i2c = board.I2C()
-    sox = ISM330DHCX(i2c)
-    
-    num_samples = 10
-    
-    gyro_bias = calibrate_sensor(sox)
-    
-    gyro_data = np.zeros((num_samples, 3))
-    accel_data = np.zeros((num_samples, 3))
-    
-    madgwick = Madgwick()
-    Q = np.tile([1., 0., 0., 0.], (num_samples, 1))
-    
+    Returns (screen, back_buffer, left_rotations, right_rotations, scales, readout, dirty).
+    """
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption('AHRS Visualization')
 
@@ -153,16 +242,164 @@ def ahrs_main():
     right_image = pygame.image.load("Rover GUI Images/Ortho_Right_PNG.PNG")  # Ensure correct pathOrtho_Right_PNG.PNG
     right_image = scale_image(right_image, IMAGE_SCALE_FACTOR)
 
+    # Rotations at quantized angles, rendered once and then served as plain blits
+    left_rotations = RotationCache(left_image, rotation_step, rotation_cache_mb * 2 ** 20)
+    right_rotations = RotationCache(right_image, rotation_step, rotation_cache_mb * 2 ** 20)
+    if warm_rotations:
+        left_rotations.warm()
+        right_rotations.warm()
+
     # Create back buffer surface
     back_buffer = pygame.Surface((WIDTH, HEIGHT))
+    # Regions of the back buffer that changed, pushed with display.update() instead of a full flip
+    dirty = DirtyTracker((WIDTH, HEIGHT), 0.0 if full_flip else FULL_FLIP_FRACTION)
+
+    # Pre-rendered glyphs for the roll and pitch readouts
+    readout = GlyphAtlas(RED)
+    # Protractor ticks and labels never move, render them once
+    scales = make_angle_scales()
+
+    return screen, back_buffer, left_rotations, right_rotations, scales, readout, dirty
+
+def subscriber_main(port, group=None, fps=60, render_delay=RENDER_DELAY, **display_options):
+    """Show the attitude from a telemetry stream instead of a sensor, as one subscriber among many."""
+    receiver = TelemetryReceiver(port, group)
+    screen, back_buffer, left_rotations, right_rotations, scales, readout, dirty = open_display(**display_options)
+    ring = SampleRing()
+    interpolator = AttitudeInterpolator(ring, render_delay)
+    render_cost = 0.0
+    clock = pygame.time.Clock()
+    last_report = time.perf_counter()
+    while True:
+        # Everything that arrived since the last frame goes into the ring to interpolate in
+        sample = receiver.receive(0)
+        while sample is not None:
+            ring.push(sample.t, sample.gyro, sample.accel, sample.q)
+            sample = receiver.receive(0)
+        render_start = time.perf_counter()
+        q = interpolator.attitude(render_start, render_start + render_cost)
+        roll_angle, pitch_angle = quaternion_to_euler(q)
+        draw_frame(back_buffer, left_rotations, right_rotations, scales, readout, roll_angle, pitch_angle, dirty)
+        dirty.present(screen, back_buffer)
+
+        now = time.perf_counter()
+        render_cost += 0.1 * (now - render_start - render_cost)
+        if now - last_report > REPORT_INTERVAL:
+            last_report = now
+            print("telemetry", receiver.summary())
+        clock.tick(fps)
+        frame_done()
+
+def ahrs_main(use_fifo=False, threaded=False, sensor='hw', speed=1.0, record=None, fusion='madgwick',
+              recalibrate=False, temp_comp=False, sensors=None, use_async=False, telemetry=None, fps=60,
+              rotation_step=ROTATION_STEP, rotation_cache_mb=ROTATION_CACHE_MB, warm_rotations=False,
+              full_flip=False, telemetry_ttl=TELEMETRY_TTL, render_delay=RENDER_DELAY, hud=False, timing_csv=None,
+              samples_per_frame=None, report_interval=REPORT_INTERVAL):
+    """The sensor driven GUI, samples_per_frame fixes the samples fused per frame and
+    report_interval=None silences the status reports, for benchmark runs."""
+    # With several sensors the first one stands in wherever a single sensor is needed
+    imus = [open_sensor(source, speed) for source in sensors] if sensors else [open_sensor(sensor, speed)]
+    sox = imus[0]
+    sample_clock = sensor_clock(sox)
+
+    # Samples fused per frame, adapted as the read and render costs are measured
+    if samples_per_frame is None:
+        budget = SampleBudget(sensor_rate(sox), target_frame=1.0 / fps)
+    else:
+        budget = SampleBudget(sensor_rate(sox), target_frame=1.0 / fps,
+                              min_samples=samples_per_frame, max_samples=samples_per_frame)
+    
+    # Stored bias for this sensor if it is still good, otherwise a fresh (early stopping) measurement
+    gyro_bias = load_or_calibrate_gyro(sox, force=recalibrate)
+
+    temp_table = None
+    if temp_comp:
+        # Bias per temperature bin, learned whenever the rover sits still and saved for next time
+        temp_table = load_temp_bias_table(sox)
+        temperature = sox.temperature
+        if temp_table.weight[temp_table.bin_index(temperature)] == 0:
+            temp_table.add(temperature, gyro_bias, 1)
+        atexit.register(save_temp_bias_table, sox, temp_table)
+    
+    # Madgwick from the ahrs package by default, 'builtin' is the same filter on plain floats
+    madgwick = make_backend(fusion)
+
+    recorder = None
+    if record:
+        # Raw samples go to a memory-mappable log, the disk writes happen on the recorder's own thread
+        recorder = ImuRecorder(record)
+        atexit.register(recorder.close)
+
+    fifo = None
+    if use_fifo:
+        # Burst reads from the hardware FIFO, decoded into one preallocated gyro+accel block
+        fifo = FifoReader.from_sensor(sox)
+        fifo.enable()
+        imu_block = np.zeros((FIFO_MAX_WORDS, 6))
+
+    publisher = None
+    if telemetry:
+        # Every fused sample goes out as a UDP packet to each (host, port), unicast or multicast
+        publisher = TelemetryPublisher(telemetry, telemetry_ttl)
+
+    # Where each frame's time goes, the sensor stages only when this loop reads the sensor itself
+    inline = not (threaded or use_async)
+    stages = SENSOR_STAGES + DISPLAY_STAGES if inline else DISPLAY_STAGES
+    timing_log = None
+    if timing_csv:
+        timing_log = FrameTimingLog(timing_csv, stages)
+        atexit.register(timing_log.close)
+    frame_timer = FrameTimer(stages, log=timing_log)
+
+    # Accelerometer correction from AccelCal.py, if this sensor has been through it
+    accel_calibration = load_accel_calibration(sox)
+    # In async mode the raw samples reach the recorder through the pipeline's logging stage instead
+    pipeline = SamplePipeline(sox, madgwick, gyro_bias, recorder=None if use_async else recorder,
+                              temp_table=temp_table, accel_calibration=accel_calibration,
+                              track_temperature=recorder is not None, publisher=publisher,
+                              timer=frame_timer if inline else None)
+    multi = None
+    if len(imus) > 1:
+        # All sensors advance together in one batched filter step, the display shows their combined attitude
+        gyro_biases = [gyro_bias] + [load_or_calibrate_gyro(imu, force=recalibrate) for imu in imus[1:]]
+        multi = MultiSensorPipeline(imus, gyro_biases, [load_accel_calibration(imu) for imu in imus],
+                                    publisher=publisher)
+        pipeline = multi
+    sample_rate = pipeline.rate
+    frame_timer.sample_rate = sample_rate
+    # Timestamped quaternions of the latest samples, each frame is drawn slerped between the two
+    # around its presentation time instead of jumping to whatever sample came last
+    ring = SampleRing()
+    interpolator = AttitudeInterpolator(ring, render_delay)
+    if threaded:
+        # Sampling and fusion run on their own thread, the render loop only reads the ring
+        worker = AcquisitionWorker(sox, pipeline, ring, fifo=fifo, clock=sample_clock)
+        worker.start()
+    last_report = time.perf_counter()
+    
+    screen, back_buffer, left_rotations, right_rotations, scales, readout, dirty = open_display(
+        rotation_step, rotation_cache_mb, warm_rotations, full_flip)
+    # p50/p99 of every stage and the achieved rates, toggled with HUD_KEY
+    hud = TimingHUD(frame_timer, [('sensor', worker.timer)] if threaded else [], visible=hud)
+
+    def render(q, now):
+        """Draw the attitude q and push it to the screen, timing each stage."""
+        start = time.perf_counter()
+        roll_angle, pitch_angle = quaternion_to_euler(q)
+        frame_timer.add('euler', time.perf_counter() - start)
+        draw_frame(back_buffer, left_rotations, right_rotations, scales, readout, roll_angle, pitch_angle, dirty, frame_timer)
+        hud_rect = hud.draw(back_buffer, now)
+        if hud_rect is not None:
+            dirty.mark('hud', hud.surface, hud_rect)
+        present_start = time.perf_counter()
+        # Copy what changed from the back buffer to the screen and update the display
+        dirty.present(screen, back_buffer)
+        frame_timer.add('present', time.perf_counter() - present_start)
 
     # Initial pitch and roll angles
     pitch_angle = 0
     roll_angle = 0
 
-    # Font for data boxes and angle markers
-    font = pygame.font.Font(None, 24)
-
     clock = pygame.time.Clock()
 
     '''while True:
@@ -181,65 +418,157 @@ def ahrs_main():
                     roll_angle += PITCH_ROLL_SPEED
 '''
 
+    if use_async:
+        async def display(frames):
+            no_rates = np.zeros(3)
+            last_report = time.perf_counter()
+            while True:
+                frame_start = time.perf_counter()
+                while not frames.empty():
+                    t, q = frames.get_nowait()
+                    ring.push(t, no_rates, no_rates, q)
+                handle_events(hud, dirty)
+                q = interpolator.attitude(frame_start, frame_start + budget.render_cost)
+                render(q, frame_start)
+                frame_end = time.perf_counter()
+                budget.add_render(frame_end - frame_start)
+                frame_timer.end_frame(frame_end)
+                if report_interval is not None and frame_end - last_report > report_interval:
+                    last_report = frame_end
+                    print("sample rate", sample_rate.summary())
+                    print("frame", frame_timer.summary(), f"(frames dropped: {frames.dropped})")
+                    if publisher is not None:
+                        print("telemetry", publisher.summary())
+                frame_done()
+                # Wait out the rest of the frame on the event loop, the other stages run meanwhile
+                await asyncio.sleep(max(0.0, 1 / fps - (time.perf_counter() - frame_start)))
+
+        asyncio.run(run_pipeline(sox, pipeline, sample_clock, fifo, display, recorder=recorder))
+        return
+
+    read_done = time.perf_counter()
     while True:
-        for t in range(num_samples):
-            gyro_tuple = sox.gyro
-            gyro_data[t] = np.array(gyro_tuple) - gyro_bias - manual_gyro_bias
-            accel_tuple = sox.acceleration
-            accel_data[t] = np.array(accel_tuple)
-            Q[t] = madgwick.updateIMU(Q[t - 1], gyr=gyro_data[t], acc=accel_data[t])
-        
-        roll_angle, pitch_angle = quaternion_to_euler(Q[-1])
-       # Clear the back buffer
-        back_buffer.fill(WHITE)
-
-        # Define circle properties
-        circle_radius = 100
-        left_circle_center = (WIDTH // 4, HEIGHT // 2)  # Center for the left image (Roll)
-        right_circle_center = (3 * WIDTH // 4, HEIGHT // 2)  # Center for the right image (Pitch)
-        right_circle_center_adjust = (3 * WIDTH // 4, (HEIGHT // 2) + 10)
-
-        # Rotate and blit the images to the back buffer, negating the angles to correct rotation direction
-        rotated_left_image, new_position_left = rotate_image(left_image, -roll_angle, left_circle_center)
-        back_buffer.blit(rotated_left_image, new_position_left)
-
-        rotated_right_image, new_position_right = rotate_image(right_image, pitch_angle, right_circle_center)
-        back_buffer.blit(rotated_right_image, new_position_right)
-
-
-        pitch_color = pitch_angle_to_color(pitch_angle)
-        roll_color = roll_angle_to_color(roll_angle)
-        # Draw circles around the images
-        pygame.draw.circle(back_buffer, roll_color, left_circle_center, circle_radius, 4)
-        pygame.draw.circle(back_buffer, pitch_color, right_circle_center, circle_radius, 4)
-
-        # Draw angle markers and moving marker for roll and pitch
-        draw_angle_markers(back_buffer, left_circle_center, circle_radius, roll_angle, is_pitch=False)
-        draw_angle_markers(back_buffer, right_circle_center, circle_radius, -pitch_angle, is_pitch=True)
-
-        # Draw data boxes for roll and pitch under the circles
-        roll_text = font.render(f"Roll: {roll_angle:.3f}°", True, RED)
-        pitch_text = font.render(f"Pitch: {pitch_angle:.3f}°", True, RED)
-
-        # Position data boxes below the circles
-        roll_text_rect = roll_text.get_rect(midtop=(left_circle_center[0], left_circle_center[1] + circle_radius + 20))
-        pitch_text_rect = pitch_text.get_rect(midtop=(right_circle_center[0], right_circle_center[1] + circle_radius + 20))
-
-        # Blit data boxes onto the back buffer
-        back_buffer.blit(roll_text, roll_text_rect)
-        back_buffer.blit(pitch_text, pitch_text_rect)
-
-        # Blit the back buffer to the screen
-        screen.blit(back_buffer, (0, 0))
-
-        # Update the display
-        pygame.display.flip()
+        frame_start = time.perf_counter()
+        # With --threaded the worker fills the ring on its own
+        if use_fifo and not threaded:
+            n = fifo.drain(imu_block)
+            drained = time.perf_counter()
+            frame_timer.add('read', drained - frame_start)
+            pipeline.process_block(imu_block, n, drained, ring)
+        elif multi is not None:
+            num_samples = budget.next(frame_start - read_done)
+            for t in range(num_samples):
+                read_start = time.perf_counter()
+                multi.read()
+                sample_time = sample_clock()
+                update_start = time.perf_counter()
+                q = multi.process(sample_time)
+                # The bias comes off inside the array update, so all of it counts as 'update'
+                frame_timer.add('read', update_start - read_start)
+                frame_timer.add('update', time.perf_counter() - update_start)
+                ring.push(sample_time, multi.gyro.mean(axis=0), multi.accel.mean(axis=0), q)
+            read_done = time.perf_counter()
+            budget.add_samples(read_done - frame_start, num_samples)
+        elif not threaded:
+            num_samples = budget.next(frame_start - read_done)
+            for t in range(num_samples):
+                read_start = time.perf_counter()
+                gyro_tuple = sox.gyro
+                sample_time = sample_clock()
+                accel_tuple = sox.acceleration
+                frame_timer.add('read', time.perf_counter() - read_start)
+                # Integrated over the measured interval, which includes any time spent rendering
+                q = pipeline.process(sample_time, gyro_tuple, accel_tuple)
+                ring.push(sample_time, pipeline.gyro, pipeline.accel, q)
+            read_done = time.perf_counter()
+            budget.add_samples(read_done - frame_start, num_samples)
+
+        handle_events(hud, dirty)
+        render_start = time.perf_counter()
+        # The attitude at the time this frame will be on screen
+        q = interpolator.attitude(render_start, render_start + budget.render_cost)
+        render(q, render_start)
+        frame_end = time.perf_counter()
+        budget.add_render(frame_end - render_start)
+        frame_timer.end_frame(frame_end)
+
+        # Report where the time goes every few seconds
+        if report_interval is not None and frame_end - last_report > report_interval:
+            last_report = frame_end
+            print("sample rate", sample_rate.summary())
+            if threaded:
+                print("sensor", worker.timer.summary())
+            print("frame", frame_timer.summary())
+            print("rotations", left_rotations.summary(), "/", right_rotations.summary())
+            print("screen updates", dirty.summary())
+            if publisher is not None:
+                print("telemetry", publisher.summary())
+            if not (threaded or use_fifo):
+                print("budget", budget.summary())
 
         # Cap the frame rate
-        clock.tick(60)
+        clock.tick(fps)
+        frame_done()
 
 
 if __name__ == "__main__":
-    ahrs_main()
+    parser = argparse.ArgumentParser(description='AHRS visualization')
+    parser.add_argument('--fifo', action='store_true', help='drain the sensor FIFO in bursts instead of polling each sample')
+    parser.add_argument('--threaded', action='store_true', help='sample and fuse on a background thread, independent of the frame rate')
+    parser.add_argument('--filter', choices=BACKENDS, default='madgwick',
+                        help="fusion filter, 'builtin' is the allocation-free Madgwick kernel (see bench_fusion.py)")
+    parser.add_argument('--recalibrate', action='store_true', help='measure the gyro bias even if a stored one is still valid')
+    parser.add_argument('--temp-comp', action='store_true',
+                        help='correct the gyro bias for die temperature with a table learned while stationary')
+    parser.add_argument('--record', metavar='PATH', help='append raw gyro/accel/temperature samples to an .imulog file')
+    add_sensor_arguments(parser)
+    add_profile_arguments(parser)
+    parser.add_argument('--fps', type=int, default=60, help='target frame rate, the samples fused per frame adapt to it')
+    parser.add_argument('--rotation-step', type=float, default=ROTATION_STEP,
+                        help='degrees between cached rotations of the rover images')
+    parser.add_argument('--rotation-cache-mb', type=float, default=ROTATION_CACHE_MB,
+                        help='memory budget for the cached rotations of each image')
+    parser.add_argument('--warm-rotations', action='store_true',
+                        help='pre-render the rotations on a background pool at startup instead of on first use')
+    parser.add_argument('--render-delay', type=float, default=RENDER_DELAY,
+                        help='seconds the display runs behind the newest sample, to interpolate between samples; '
+                             '0 shows the newest one')
+    parser.add_argument('--hud', action='store_true',
+                        help='start with the timing overlay shown (p50/p99 per stage, frame and sample rates), h toggles it')
+    parser.add_argument('--timing-csv', metavar='PATH', help='write the time of every stage in every frame to a CSV file')
+    parser.add_argument('--full-flip', action='store_true',
+                        help='push the whole frame every time instead of only the regions that changed')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='run sensor, fusion, logging and display as asyncio tasks in one thread')
+    parser.add_argument('--telemetry', metavar='HOST:PORT', action='append',
+                        help='send every fused sample to this UDP address, a host or a multicast group; '
+                             'repeat for more unicast subscribers')
+    parser.add_argument('--telemetry-ttl', type=int, default=TELEMETRY_TTL, help='hops for multicast telemetry')
+    parser.add_argument('--subscribe', metavar='[GROUP:]PORT',
+                        help='show the attitude from a telemetry stream instead of reading a sensor')
+    parser.add_argument('--sensors', nargs='+', metavar='SOURCE',
+                        help='fuse several IMUs, e.g. hw:1:0x6a hw:1:0x6b or synthetic:0 synthetic:1')
+    args = parser.parse_args()
+    if args.fifo and args.sensor != 'hw':
+        parser.error('--fifo needs the hardware sensor')
+    if args.sensors and (args.fifo or args.threaded or args.record or args.temp_comp):
+        parser.error('--sensors polls inline and cannot be combined with --fifo, --threaded, --record or --temp-comp')
+    if args.sensors and args.filter not in ('madgwick', 'builtin'):
+        parser.error('--sensors fuses with the batched Madgwick kernel, --filter can only be madgwick or builtin')
+    if args.use_async and (args.threaded or args.sensors):
+        parser.error('--async cannot be combined with --threaded or --sensors')
+    display_options = dict(rotation_step=args.rotation_step, rotation_cache_mb=args.rotation_cache_mb,
+                           warm_rotations=args.warm_rotations, full_flip=args.full_flip)
+    if args.subscribe:
+        group, _, port = args.subscribe.rpartition(':')
+        run_main(args, subscriber_main, int(port), group or None, args.fps, args.render_delay, **display_options)
+        sys.exit()
+    telemetry = [parse_address(address) for address in args.telemetry] if args.telemetry else None
+    run_main(args, ahrs_main, use_fifo=args.fifo, threaded=args.threaded, sensor=args.sensor, speed=args.speed,
+             record=args.record, fusion=args.filter,
+             recalibrate=args.recalibrate, temp_comp=args.temp_comp, sensors=args.sensors,
+             use_async=args.use_async, telemetry=telemetry, fps=args.fps,
+             telemetry_ttl=args.telemetry_ttl, render_delay=args.render_delay, hud=args.hud,
+             timing_csv=args.timing_csv, **display_options)
 
 #((WIDTH - rotated_left_image.get_width()) // 4, (HEIGHT - rotated_left_image.get_height()) // 2))
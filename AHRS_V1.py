@@ -1,11 +1,11 @@
 import pygame
 import sys
 import math
-import board
-import busio
-from adafruit_lsm6ds.ism330dhcx import ISM330DHCX
+import argparse
 from ahrs.filters import Madgwick
 import numpy as np
+from sim_sensor import open_sensor, add_sensor_arguments
+from profiling import frame_done, add_profile_arguments, run_main
 
 # Initialize Pygame
 pygame.init()
@@ -54,9 +54,8 @@ def quaternion_to_euler(q):
     pitch = np.arcsin(2.0 * (w * y - z * x))
     return np.degrees(roll), np.degrees(pitch)
 
-def ahrs_main():
-    i2c = board.I2C()
-    sox = ISM330DHCX(i2c)
+def ahrs_main(sensor='hw', speed=1.0):
+    sox = open_sensor(sensor, speed)
     
     num_samples = 1
     
@@ -104,6 +103,11 @@ def ahrs_main():
 
         # Control the speed of the visualization
         pygame.time.Clock().tick(60)
+        frame_done()
 
 if __name__ == "__main__":
-    ahrs_main()
+    parser = argparse.ArgumentParser(description='AHRS visualization')
+    add_sensor_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    run_main(args, ahrs_main, sensor=args.sensor, speed=args.speed)
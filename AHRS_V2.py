@@ -1,11 +1,12 @@
 import pygame
 import sys
 import math
-import board
-import busio
-from adafruit_lsm6ds.ism330dhcx import ISM330DHCX
+import argparse
 from ahrs.filters import Madgwick
 import numpy as np
+from text_cache import render_text
+from sim_sensor import open_sensor, add_sensor_arguments
+from profiling import frame_done, add_profile_arguments, run_main
 
 # Initialize Pygame
 pygame.init()
@@ -30,8 +31,7 @@ def draw_horizon(screen, roll, pitch):
     for angle in range(-90, 91, pitch_interval):
         pitch_line_y = CENTER[1] - int((pitch_ruler_height / 180) * angle)
         pygame.draw.line(screen, BLUE, (pitch_ruler_width, pitch_line_y), (pitch_ruler_width * 2, pitch_line_y), 2)
-        font = pygame.font.Font(None, 24)
-        text = font.render(str(angle), True, BLUE)
+        text = render_text(str(angle), BLUE)
         text_rect = text.get_rect(center=(pitch_ruler_width * 3, pitch_line_y))
         screen.blit(text, text_rect)
 
@@ -50,8 +50,7 @@ def draw_horizon(screen, roll, pitch):
     for angle in range(-90, 91, roll_interval):
         roll_line_x = CENTER[0] + int((roll_ruler_width / 180) * angle)
         pygame.draw.line(screen, BLUE, (roll_line_x, roll_ruler_height), (roll_line_x, roll_ruler_height * 2), 2)
-        font = pygame.font.Font(None, 24)
-        text = font.render(str(angle), True, BLUE)
+        text = render_text(str(angle), BLUE)
         text_rect = text.get_rect(center=(roll_line_x, roll_ruler_height * 3))
         screen.blit(text, text_rect)
 
@@ -77,9 +76,8 @@ def quaternion_to_euler(q):
     pitch = np.arcsin(2.0 * (w * y - z * x))
     return np.degrees(roll), np.degrees(pitch)
 
-def ahrs_main():
-    i2c = board.I2C()
-    sox = ISM330DHCX(i2c)
+def ahrs_main(sensor='hw', speed=1.0):
+    sox = open_sensor(sensor, speed)
     
     num_samples = 100
     
@@ -129,6 +127,11 @@ def ahrs_main():
 
         # Control the speed of the visualization
         pygame.time.Clock().tick(60)
+        frame_done()
 
 if __name__ == "__main__":
-    ahrs_main()
+    parser = argparse.ArgumentParser(description='AHRS visualization')
+    add_sensor_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    run_main(args, ahrs_main, sensor=args.sensor, speed=args.speed)
@@ -1,11 +1,12 @@
 import pygame
 import sys
-import math
-import board
-import busio
-from adafruit_lsm6ds.ism330dhcx import ISM330DHCX
+import argparse
 from ahrs.filters import Madgwick
 import numpy as np
+from text_cache import render_text
+from mesh_render import MeshRenderer, cube_mesh, attitude_matrix
+from sim_sensor import open_sensor, add_sensor_arguments
+from profiling import frame_done, add_profile_arguments, run_main
 
 # Initialize Pygame
 pygame.init()
@@ -84,8 +85,7 @@ def draw_horizon(screen, roll, pitch, pitch_block_pos, roll_block_pos):
             rotated_angle = angle - roll
             pitch_line_y = CENTER[1] - int((pitch_ruler_height / 180) * rotated_angle)
             alpha = int(255 * (1 - abs(angle) / 40))  # Fade in/out based on distance from current pitch
-            font = pygame.font.Font(None, 24)
-            text = font.render(str(angle), True, (BLUE[0], BLUE[1], BLUE[2], alpha))
+            text = render_text(str(angle), (BLUE[0], BLUE[1], BLUE[2], alpha))
             text_rect = text.get_rect(center=(pitch_ruler_width * 3, pitch_line_y))
             screen.blit(text, text_rect)
 
@@ -111,8 +111,7 @@ def draw_horizon(screen, roll, pitch, pitch_block_pos, roll_block_pos):
             rotated_angle = angle + pitch
             roll_line_x = CENTER[0] + int((roll_ruler_width / 180) * rotated_angle)
             alpha = int(255 * (1 - abs(angle) / 40))  # Fade in/out based on distance from current roll
-            font = pygame.font.Font(None, 24)
-            text = font.render(str(angle), True, (BLUE[0], BLUE[1], BLUE[2], alpha))
+            text = render_text(str(angle), (BLUE[0], BLUE[1], BLUE[2], alpha))
             text_rect = text.get_rect(center=(roll_line_x, roll_ruler_height * 3))
             screen.blit(text, text_rect)
 
@@ -122,8 +121,6 @@ def draw_horizon(screen, roll, pitch, pitch_block_pos, roll_block_pos):
                                         (roll_marker_x + 10, roll_ruler_height * 4),
                                         (roll_marker_x, roll_ruler_height * 3)])
 
-    pygame.display.flip()
-
 def calibrate_sensor(sox, num_samples=1000):
     """Calibrate gyroscope bias."""
     gyro_bias = np.zeros(3)
@@ -139,61 +136,11 @@ def quaternion_to_euler(q):
     roll = np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x**2 + y**2))
     pitch = np.arcsin(2.0 * (w * y - z * x))
     return np.degrees(roll), np.degrees(pitch)
-def draw_cube(screen, roll, pitch):
-  
-    cube_size = 50  # Adjust the cube size
-
-    # Cube center at the center of the screen
-    cube_center = (CENTER[0], CENTER[1])
-
-    # Define cube vertices
-    vertices = [
-        (-cube_size / 2, -cube_size / 2, -cube_size / 2),
-        (-cube_size / 2, cube_size / 2, -cube_size / 2),
-        (cube_size / 2, cube_size / 2, -cube_size / 2),
-        (cube_size / 2, -cube_size / 2, -cube_size / 2),
-        (-cube_size / 2, -cube_size / 2, cube_size / 2),
-        (-cube_size / 2, cube_size / 2, cube_size / 2),
-        (cube_size / 2, cube_size / 2, cube_size / 2),
-        (cube_size / 2, -cube_size / 2, cube_size / 2)
-    ]
-
-    # Rotate and project the cube vertices
-    rotated_vertices = []
-    for vertex in vertices:
-        x, y, z = vertex
-
-        # Rotate around the X-axis (pitch)
-        y_rotated = y * math.cos(pitch) - z * math.sin(pitch)
-        z_rotated = y * math.sin(pitch) + z * math.cos(pitch)
-
-        # Rotate around the Y-axis (roll)
-        x_rotated = x * math.cos(roll) + z_rotated * math.sin(roll)
-        z_rotated = -x * math.sin(roll) + z_rotated * math.cos(roll)
-
-        # Perspective projection
-        depth = 500  # Arbitrary depth value
-        scale = depth / (depth + z_rotated)
-        x_projected = int(cube_center[0] + scale * x_rotated)
-        y_projected = int(cube_center[1] + scale * y_rotated)
-
-        rotated_vertices.append((x_projected, y_projected))
-
-    # Draw cube edges
-    edges = [
-        (0, 1), (1, 2), (2, 3), (0, 3),
-        (4, 5), (5, 6), (6, 7), (4, 7),
-        (0, 4), (1, 5), (2, 6), (3, 7)
-    ]
-
-    for edge in edges:
-        start = rotated_vertices[edge[0]]
-        end = rotated_vertices[edge[1]]
-        pygame.draw.line(screen, RED, start, end, 2)
-
-def ahrs_main():
-    i2c = board.I2C()
-    sox = ISM330DHCX(i2c)
+# Wireframe cube, turned by the fused attitude with one rotation matrix per frame
+cube = MeshRenderer(cube_mesh(25), CENTER, edge_color=RED)
+
+def ahrs_main(sensor='hw', speed=1.0):
+    sox = open_sensor(sensor, speed)
     
     num_samples = 10  # Increase the number of samples
     
@@ -242,9 +189,15 @@ def ahrs_main():
 
         # Pygame-based AHRS visualization
         draw_horizon(screen, roll, pitch, pitch_block_pos, roll_block_pos)
-        draw_cube(screen, roll, pitch)
+        cube.draw(screen, attitude_matrix(Q[-1]))
+        pygame.display.flip()
         # Control the speed of the visualization
         pygame.time.Clock().tick(60)
+        frame_done()
 
 if __name__ == "__main__":
-    ahrs_main()
+    parser = argparse.ArgumentParser(description='AHRS visualization')
+    add_sensor_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    run_main(args, ahrs_main, sensor=args.sensor, speed=args.speed)
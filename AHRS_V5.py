@@ -1,11 +1,12 @@
 import pygame
 import sys
-import math
-import board
-import busio
-from adafruit_lsm6ds.ism330dhcx import ISM330DHCX
+import argparse
 from ahrs.filters import Madgwick
 import numpy as np
+from text_cache import render_text
+from mesh_render import MeshRenderer, cube_mesh, attitude_matrix
+from sim_sensor import open_sensor, add_sensor_arguments
+from profiling import frame_done, add_profile_arguments, run_main
 
 # Initialize Pygame
 pygame.init()
@@ -78,8 +79,7 @@ def draw_horizon(screen, roll, pitch):
             rotated_angle = angle - roll
             pitch_line_y = CENTER[1] - int((pitch_ruler_height / 180) * rotated_angle)
             alpha = int(255 * (1 - abs(angle) / 40))
-            font = pygame.font.Font(None, 24)
-            text = font.render(str(angle), True, (RED[0], RED[1], RED[2], alpha))
+            text = render_text(str(angle), (RED[0], RED[1], RED[2], alpha))
             text_rect = text.get_rect(center=(pitch_ruler_width * 3, pitch_line_y))
             screen.blit(text, text_rect)
 
@@ -101,8 +101,7 @@ def draw_horizon(screen, roll, pitch):
             rotated_angle = angle + pitch
             roll_line_x = CENTER[0] + int((roll_ruler_width / 180) * rotated_angle)
             alpha = int(255 * (1 - abs(angle) / 40))
-            font = pygame.font.Font(None, 24)
-            text = font.render(str(angle), True, (RED[0], RED[1], RED[2], alpha))
+            text = render_text(str(angle), (RED[0], RED[1], RED[2], alpha))
             text_rect = text.get_rect(center=(roll_line_x, roll_ruler_height * 3))
             screen.blit(text, text_rect)
 
@@ -111,96 +110,20 @@ def draw_horizon(screen, roll, pitch):
                                         (roll_marker_x + 10, roll_ruler_height * 4),
                                         (roll_marker_x, roll_ruler_height * 3)])
 
-    pygame.display.flip()
-
-def draw_cube(screen, roll, pitch):
-    cube_size = 50  # Adjust the cube size
-    cube_center = (CENTER[0], CENTER[1] + cube_size)  # Adjust cube center
-
-    # Calculate cube rotation angles based on pitch and roll
-    roll_angle = math.radians(roll)
-    pitch_angle = math.radians(pitch)
-
-    # Define cube vertices
-    vertices = [
-        (-cube_size, -cube_size, -cube_size),
-        (-cube_size, cube_size, -cube_size),
-        (cube_size, cube_size, -cube_size),
-        (cube_size, -cube_size, -cube_size),
-        (-cube_size, -cube_size, cube_size),
-        (-cube_size, cube_size, cube_size),
-        (cube_size, cube_size, cube_size),
-        (cube_size, -cube_size, cube_size)
-    ]
-
-    # Define colors for each face
-    face_colors = [
-        (255, 0, 0),    # Red
-        (0, 255, 0),    # Green
-        (0, 0, 255),    # Blue
-        (255, 255, 0),  # Yellow
-        (255, 0, 255),  # Magenta
-        (0, 255, 255),  # Cyan
-    ]
-
-    # Rotate and project the cube vertices
-    rotated_vertices = []
-    for vertex in vertices:
-        x, y, z = vertex
-
-        # Rotate around the X-axis (pitch)
-        y_rotated = y * math.cos(pitch_angle) - z * math.sin(pitch_angle)
-        z_rotated = y * math.sin(pitch_angle) + z * math.cos(pitch_angle)
-
-        # Rotate around the Y-axis (roll)
-        x_rotated = x * math.cos(roll_angle) + z_rotated * math.sin(roll_angle)
-        z_rotated = -x * math.sin(roll_angle) + z_rotated * math.cos(roll_angle)
-
-        # Perspective projection
-        depth = 500  # Arbitrary depth value
-        scale = depth / (depth + z_rotated)
-        x_projected = int(cube_center[0] + scale * x_rotated)
-        y_projected = int(cube_center[1] + scale * y_rotated)
-
-        rotated_vertices.append((x_projected, y_projected))
-
-    # Draw each face of the cube with backface culling
-    faces = [
-        (0, 1, 2, 3),
-        (4, 5, 6, 7),
-        (0, 4, 7, 3),
-        (1, 5, 6, 2),
-        (0, 1, 5, 4),
-        (2, 3, 7, 6),
-    ]
-
-    viewer_vector = np.array([0, 0, -1])  # Vector pointing towards the viewer
-
-    for i, face in enumerate(faces):
-        # Calculate the normal vector of the face
-        normal_vector = np.cross(np.array(vertices[face[1]]) - np.array(vertices[face[0]]),
-                                 np.array(vertices[face[2]]) - np.array(vertices[face[0]]))
-        
-        # Check the sign of the dot product with the viewer vector
-        dot_product = np.dot(normal_vector, viewer_vector)
-        
-        if dot_product < 0:
-            pygame.draw.polygon(screen, face_colors[i], [rotated_vertices[j] for j in face])
-
-    # Draw cube edges
-    edges = [
-        (0, 1), (1, 2), (2, 3), (0, 3),
-        (4, 5), (5, 6), (6, 7), (4, 7),
-        (0, 4), (1, 5), (2, 6), (3, 7)
-    ]
-
-    for edge in edges:
-        start = rotated_vertices[edge[0]]
-        end = rotated_vertices[edge[1]]
-        pygame.draw.line(screen, (0, 0, 0), start, end, 2)  # Black lines for edges
-
-
-
+# Define colors for each face
+face_colors = [
+    (255, 0, 0),    # Red
+    (0, 255, 0),    # Green
+    (0, 0, 255),    # Blue
+    (255, 255, 0),  # Yellow
+    (255, 0, 255),  # Magenta
+    (0, 255, 255),  # Cyan
+]
+
+# Cube turned by the fused attitude with one rotation matrix per frame, hidden faces culled
+# and the rest drawn back to front with black edges
+cube_size = 50
+cube = MeshRenderer(cube_mesh(cube_size, face_colors), (CENTER[0], CENTER[1] + cube_size), edge_color=(0, 0, 0))
 
 def calibrate_sensor(sox, num_samples=1000):
     gyro_bias = np.zeros(3)
@@ -217,9 +140,8 @@ def quaternion_to_euler(q):
     pitch = np.arcsin(2.0 * (w * y - x * z))
     return np.degrees(roll), np.degrees(pitch)
 
-def ahrs_main():
-    i2c = board.I2C()
-    sox = ISM330DHCX(i2c)
+def ahrs_main(sensor='hw', speed=1.0):
+    sox = open_sensor(sensor, speed)
     
     num_samples = 10
     
@@ -246,9 +168,14 @@ def ahrs_main():
 
         # Pygame-based AHRS visualization
         draw_horizon(screen, roll, pitch)
-        draw_cube(screen, roll, pitch)
+        cube.draw(screen, attitude_matrix(Q[-1]))
         pygame.time.Clock().tick(60)
         pygame.display.flip()
+        frame_done()
 
 if __name__ == "__main__":
-    ahrs_main()
+    parser = argparse.ArgumentParser(description='AHRS visualization')
+    add_sensor_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    run_main(args, ahrs_main, sensor=args.sensor, speed=args.speed)
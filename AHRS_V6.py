@@ -1,11 +1,12 @@
 import pygame
 import sys
 import math
-import board
-import busio
-from adafruit_lsm6ds.ism330dhcx import ISM330DHCX
+import argparse
 from ahrs.filters import Madgwick
 import numpy as np
+from text_cache import render_text
+from sim_sensor import open_sensor, add_sensor_arguments
+from profiling import frame_done, add_profile_arguments, run_main
 
 # Initialize Pygame
 pygame.init()
@@ -79,8 +80,7 @@ def draw_horizon(screen, roll, pitch):
             rotated_angle = angle - roll
             pitch_line_y = CENTER[1] - int((pitch_ruler_height / 180) * rotated_angle)
             alpha = int(255 * (1 - abs(angle) / 40))
-            font = pygame.font.Font(None, 24)
-            text = font.render(str(angle), True, (RED[0], RED[1], RED[2], alpha))
+            text = render_text(str(angle), (RED[0], RED[1], RED[2], alpha))
             text_rect = text.get_rect(center=(pitch_ruler_width * 3, pitch_line_y))
             screen.blit(text, text_rect)
 
@@ -102,8 +102,7 @@ def draw_horizon(screen, roll, pitch):
             rotated_angle = angle + pitch
             roll_line_x = CENTER[0] + int((roll_ruler_width / 180) * rotated_angle)
             alpha = int(255 * (1 - abs(angle) / 40))
-            font = pygame.font.Font(None, 24)
-            text = font.render(str(angle), True, (RED[0], RED[1], RED[2], alpha))
+            text = render_text(str(angle), (RED[0], RED[1], RED[2], alpha))
             text_rect = text.get_rect(center=(roll_line_x, roll_ruler_height * 3))
             screen.blit(text, text_rect)
 
@@ -141,9 +140,8 @@ def calibrate_sensor(sox, num_samples=1000):
     return gyro_bias / num_samples
 
 manual_gyro_bias = np.array([0.006795875774952921, -0.0014508049407202864, -0.002443460952792061])
-def ahrs_main():
-    i2c = board.I2C()
-    sox = ISM330DHCX(i2c)
+def ahrs_main(sensor='hw', speed=1.0):
+    sox = open_sensor(sensor, speed)
     
     num_samples = 10
     
@@ -159,7 +157,7 @@ def ahrs_main():
     pygame.display.set_caption('AHRS Visualization')
 
     # Load image
-    image = pygame.image.load("/home/raspberry/Accel/Rover GUI Images/Ortho_Rear_PNG.PNG")  # Replace "image.png" with the path to your image
+    image = pygame.image.load("Rover GUI Images/Ortho_Rear_PNG.PNG")  # Replace "image.png" with the path to your image
     scaled_image = scale_image(image, IMAGE_SCALE)
     while True:
         for t in range(num_samples):
@@ -177,10 +175,15 @@ def ahrs_main():
         
         # Rotate the image and draw it on the screen
         rotated_image = rotate_image(scaled_image, roll)  # Rotate based on roll angle
-        screen.blit(rotated_image, (WIDTH + rotated_image.get_width())// 2, (HEIGHT - rotated_image.get_height()) // 2)
+        screen.blit(rotated_image, ((WIDTH - rotated_image.get_width()) // 2, (HEIGHT - rotated_image.get_height()) // 2))
         
         pygame.time.Clock().tick(60)
         pygame.display.flip()
+        frame_done()
 
 if __name__ == "__main__":
-    ahrs_main()
+    parser = argparse.ArgumentParser(description='AHRS visualization')
+    add_sensor_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    run_main(args, ahrs_main, sensor=args.sensor, speed=args.speed)
@@ -0,0 +1,65 @@
+import time
+import argparse
+import numpy as np
+from sim_sensor import open_sensor, add_sensor_arguments, GRAVITY
+from calibration import fit_accel_calibration, save_accel_calibration, CALIBRATION_FILE
+
+# How many accelerometer samples to average in each orientation
+SAMPLES_PER_POSITION = 500
+
+# Reject a position if the board moved while it was being sampled
+MAX_STD = 0.05  # m/s^2
+
+# The six orientations and the reading a perfect sensor would give in each
+POSITIONS = [
+    ("Z axis up (board flat)", (0.0, 0.0, GRAVITY)),
+    ("Z axis down (board upside down)", (0.0, 0.0, -GRAVITY)),
+    ("Y axis up", (0.0, GRAVITY, 0.0)),
+    ("Y axis down", (0.0, -GRAVITY, 0.0)),
+    ("X axis up", (GRAVITY, 0.0, 0.0)),
+    ("X axis down", (-GRAVITY, 0.0, 0.0)),
+]
+
+
+def collect_position(sox, num_samples=SAMPLES_PER_POSITION):
+    samples = np.zeros((num_samples, 3))
+    for i in range(num_samples):
+        samples[i] = sox.acceleration
+        time.sleep(0.002)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Six-position accelerometer calibration')
+    add_sensor_arguments(parser)
+    parser.add_argument('--calibration-file', default=CALIBRATION_FILE)
+    args = parser.parse_args()
+    sox = open_sensor(args.sensor, args.speed)
+
+    all_samples = []
+    all_targets = []
+    for name, target in POSITIONS:
+        while True:
+            input(f"Place the board {name}, hold it still and press Enter")
+            samples = collect_position(sox)
+            std = samples.std(axis=0)
+            if std.max() < MAX_STD:
+                break
+            print(f"Board moved (std {std.max():.3f} m/s^2), try again")
+        print("Mean reading:", samples.mean(axis=0))
+        all_samples.append(samples)
+        all_targets.append(np.tile(target, (len(samples), 1)))
+
+    matrix, offset, residual = fit_accel_calibration(np.vstack(all_samples), np.vstack(all_targets))
+    print("Scale/misalignment matrix:")
+    print(matrix)
+    print("Offset (m/s^2):", offset)
+    print(f"RMS residual: {residual:.4f} m/s^2")
+    if save_accel_calibration(sox, matrix, offset, residual, args.calibration_file):
+        print("Saved to", args.calibration_file)
+    else:
+        print("Simulated sensor, calibration not saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,12 +6,11 @@ import datetime
 import matplotlib.dates as mdates
 from collections import deque
 import numpy as np
-import board
-import busio
-from adafruit_lsm6ds.ism330dhcx import ISM330DHCX
+import argparse
 from ahrs.filters import Madgwick
 import serial
 import re
+from sim_sensor import open_sensor, add_sensor_arguments
 
 PORT = "COM43"
 
@@ -20,8 +19,10 @@ HISTORY_SIZE = 100
 
 # Pause re-sampling the sensor and drawing for INTERVAL seconds
 INTERVAL = 0.01
-i2c = board.I2C()
-sox = ISM330DHCX(i2c)
+parser = argparse.ArgumentParser(description='Gyro bias calibration')
+add_sensor_arguments(parser)
+args = parser.parse_args()
+sox = open_sensor(args.sensor, args.speed)
 print("Put down the board and do not touch or move it!")
 for s in range(3, 0, -1):
     print(s, end='...')
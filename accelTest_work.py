@@ -1,12 +1,13 @@
 import time
-import board
-import busio
-from adafruit_lsm6ds.ism330dhcx import ISM330DHCX
+import argparse
 from ahrs.filters import Madgwick
 import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from multiprocessing import Process,Queue
+from ism330_fifo import FifoReader, FIFO_MAX_WORDS
+from sim_sensor import open_sensor, add_sensor_arguments
+from profiling import frame_done, add_profile_arguments, run_main
 
 def calibrate_sensor(sox, num_samples=1000):
     """Calibrate gyroscope bias."""
@@ -57,9 +58,8 @@ def plot_ahrs(q):
         plt.show()
         
 
-def main():
-    i2c = board.I2C()
-    sox = ISM330DHCX(i2c)
+def main(use_fifo=False, sensor='hw', speed=1.0):
+    sox = open_sensor(sensor, speed)
     
     num_samples = 1
     
@@ -74,11 +74,30 @@ def main():
     Q = np.tile([1., 0., 0., 0.], (num_samples, 1))  # Allocate for quaternions
     
     q = Queue()
+    # Whatever is still queued when the loop ends (say after a profiled run) is dropped instead of waited on
+    q.cancel_join_thread()
     
-    visualization_process = Process(target = plot_ahrs, args = (q,))
+    # Daemonic, so the plot goes away with the loop
+    visualization_process = Process(target = plot_ahrs, args = (q,), daemon = True)
     visualization_process.start()
+
+    if use_fifo:
+        # Burst reads from the hardware FIFO, decoded into one preallocated gyro+accel block
+        fifo = FifoReader.from_sensor(sox)
+        fifo.enable()
+        imu_block = np.zeros((FIFO_MAX_WORDS, 6))
  
     while True:
+        if use_fifo:
+            n = fifo.drain(imu_block)
+            imu_block[:n, 0:3] -= gyro_bias
+            for t in range(n):
+                Q[-1] = madgwick.updateIMU(Q[-1], gyr=imu_block[t, 0:3], acc=imu_block[t, 3:6])
+            if n:
+                q.put(Q)
+            frame_done()
+            continue
+
         for t in range(num_samples):
             # Get the raw gyroscope data as a tuple
             gyro_tuple = sox.gyro
@@ -103,9 +122,17 @@ def main():
         roll, pitch = quaternion_to_euler(Q[-1])
         """print("Roll:", roll, "degrees")
         print("Pitch:", pitch, "degrees") """
+        frame_done()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='AHRS roll/pitch plot')
+    parser.add_argument('--fifo', action='store_true', help='drain the sensor FIFO in bursts instead of polling each sample')
+    add_sensor_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if args.fifo and args.sensor != 'hw':
+        parser.error('--fifo needs the hardware sensor')
+    run_main(args, main, use_fifo=args.fifo, sensor=args.sensor, speed=args.speed)
 
 
 
@@ -0,0 +1,430 @@
+import math
+import threading
+import time
+from collections import deque
+import numpy as np
+from fusion_kernels import MadgwickIMUArray, average_quaternion, slerp
+
+MAX_DT = 0.1  # Longest gap (s) integrated in one filter step
+TEMPERATURE_EVERY = 100  # Read the die temperature once per this many samples when recording
+RENDER_DELAY = 0.01  # s the display runs behind the newest sample, so it interpolates rather than holds
+OFFSET_WINDOW = 120  # Frames over which the sample clock to render clock offset is taken
+
+
+class SampleRing:
+    """Preallocated ring of timestamped gyro/accel samples and the quaternion fused from each.
+
+    There is one writer (the acquisition thread) and any number of readers. The writer fills
+    a row completely before bumping count, so readers only ever look at finished rows.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.t = np.zeros(capacity)
+        self.gyro = np.zeros((capacity, 3))
+        self.accel = np.zeros((capacity, 3))
+        self.q = np.tile([1., 0., 0., 0.], (capacity, 1))
+        self.count = 0
+
+    def push(self, t, gyro, accel, q):
+        i = self.count % self.capacity
+        self.t[i] = t
+        self.gyro[i] = gyro
+        self.accel[i] = accel
+        self.q[i] = q
+        self.count += 1
+
+    def latest(self):
+        """Return (timestamp, quaternion) of the newest sample, or None before the first one."""
+        count = self.count
+        if count == 0:
+            return None
+        i = (count - 1) % self.capacity
+        return self.t[i], self.q[i].copy()
+
+    def attitude_at(self, t, out):
+        """Quaternion at time t into out, slerped between the two samples either side of it.
+
+        Past the newest sample this is the newest quaternion, before the oldest one kept the oldest.
+        """
+        count = self.count
+        if count == 0:
+            return None
+        capacity = self.capacity
+        k = count - 1
+        if t >= self.t[k % capacity]:
+            out[:] = self.q[k % capacity]
+            return out
+        # Walk back from the newest sample, one row is left as slack for the writer
+        oldest = max(count - capacity + 1, 0)
+        while k > oldest and self.t[(k - 1) % capacity] > t:
+            k -= 1
+        if k == oldest:
+            out[:] = self.q[k % capacity]
+            return out
+        i0 = (k - 1) % capacity
+        i1 = k % capacity
+        span = self.t[i1] - self.t[i0]
+        u = (t - self.t[i0]) / span if span > 0 else 1.0
+        return slerp(self.q[i0], self.q[i1], u, out)
+
+
+class AttitudeInterpolator:
+    """Attitude to draw for a frame, slerped between the fused samples around its presentation time.
+
+    The display runs `delay` seconds behind the samples, so the frame time nearly always falls
+    between two of them and the dials move smoothly whatever the frame and fusion rates.
+    Sample timestamps may be on another clock than the renderer (the simulated timeline, a
+    remote publisher), so they are placed on the render clock by the smallest gap between a
+    sample's timestamp and when the renderer saw it, over the last `window` frames.
+    """
+
+    def __init__(self, ring, delay=RENDER_DELAY, window=OFFSET_WINDOW):
+        self.ring = ring
+        self.delay = delay
+        self.offsets = deque(maxlen=window)
+        self.q = np.array([1., 0., 0., 0.])
+
+    def attitude(self, now, present):
+        """Quaternion for a frame that will be on screen at `present`, both times on the render clock."""
+        latest = self.ring.latest()
+        if latest is None:
+            return self.q
+        self.offsets.append(now - latest[0])
+        self.ring.attitude_at(present - min(self.offsets) - self.delay, self.q)
+        return self.q
+
+
+class StageTimer:
+    """Keep the last `window` durations of each named stage in preallocated arrays."""
+
+    def __init__(self, stages, window=1024):
+        self.window = window
+        self.samples = {name: np.zeros(window) for name in stages}
+        self.counts = dict.fromkeys(stages, 0)
+
+    def add(self, stage, seconds):
+        count = self.counts[stage]
+        self.samples[stage][count % self.window] = seconds
+        self.counts[stage] = count + 1
+
+    def recent(self, stage):
+        count = self.counts[stage]
+        return self.samples[stage][:min(count, self.window)]
+
+    def percentiles(self, stage, q=(50, 99)):
+        """Percentiles q of a stage's durations over the window, in seconds (zeros before the first one)."""
+        recent = self.recent(stage)
+        if not len(recent):
+            return np.zeros(len(q))
+        return np.percentile(recent, q)
+
+    def summary(self):
+        """Mean and max of each stage over the window, in microseconds."""
+        lines = []
+        for stage in self.samples:
+            recent = self.recent(stage)
+            if len(recent):
+                lines.append(f"{stage}: mean {recent.mean() * 1e6:.1f} us, max {recent.max() * 1e6:.1f} us")
+        return ", ".join(lines)
+
+
+class RateStats:
+    """Achieved sample rate and jitter from the intervals between monotonic timestamps."""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.intervals = np.zeros(window)
+        self.count = 0
+        self.last_t = None
+
+    def tick(self, t):
+        """Record a sample taken at time t, returns the interval since the previous one (None for the first)."""
+        last_t = self.last_t
+        self.last_t = t
+        if last_t is None:
+            return None
+        dt = t - last_t
+        self.intervals[self.count % self.window] = dt
+        self.count += 1
+        return dt
+
+    def recent(self):
+        return self.intervals[:min(self.count, self.window)]
+
+    def rate(self):
+        recent = self.recent()
+        return 1.0 / recent.mean() if len(recent) else 0.0
+
+    def jitter(self):
+        """Standard deviation of the sample interval, in seconds."""
+        recent = self.recent()
+        return recent.std() if len(recent) else 0.0
+
+    def summary(self):
+        recent = self.recent()
+        if not len(recent):
+            return "no samples"
+        return (f"{self.rate():.1f} Hz, dt mean {recent.mean() * 1e3:.3f} ms, "
+                f"jitter {self.jitter() * 1e3:.3f} ms, max {recent.max() * 1e3:.3f} ms")
+
+
+def measured_dt(dt, nominal_dt, max_dt=MAX_DT):
+    """Interval to integrate over, falling back to the nominal period for the first sample and
+    clamping long stalls so one late sample cannot swing the attitude."""
+    if dt is None or dt <= 0:
+        return nominal_dt
+    return min(dt, max_dt)
+
+
+def burst_timing(last_burst, read_done, n, nominal_dt):
+    """Timestamp of the first of n FIFO samples drained at read_done, and the spacing between them.
+
+    The FIFO samples at a fixed rate, so the time since the last burst is spread evenly across this one.
+    """
+    step = nominal_dt if last_burst is None else (read_done - last_burst) / n
+    return read_done - step * (n - 1), step
+
+
+class SampleBudget:
+    """How many samples to read and fuse before drawing the next frame.
+
+    Running averages of the cost of one sample (read + fuse) and of one frame's render set
+    the budget: as many samples as fit in target_frame next to the render, but never fewer
+    than the sensor produced since the last one was read. On a loaded machine the frames get
+    longer (the display drops frames) while the filter still sees every sample.
+    """
+
+    def __init__(self, sensor_rate, target_frame=1 / 60, min_samples=1, max_samples=1000, smoothing=0.1):
+        self.sensor_rate = sensor_rate
+        self.target_frame = target_frame
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.smoothing = smoothing
+        self.sample_cost = 1.0 / sensor_rate
+        self.render_cost = 0.0
+        self.samples = min_samples
+
+    def add_samples(self, seconds, n):
+        if n:
+            self.sample_cost += self.smoothing * (seconds / n - self.sample_cost)
+
+    def add_render(self, seconds):
+        self.render_cost += self.smoothing * (seconds - self.render_cost)
+
+    def next(self, since_last_read):
+        """Budget for the coming frame, given the time since the previous frame's last sample was read."""
+        due = math.ceil(self.sensor_rate * since_last_read)
+        fits = int((self.target_frame - self.render_cost) / self.sample_cost)
+        self.samples = min(max(due, fits, self.min_samples), self.max_samples)
+        return self.samples
+
+    def summary(self):
+        return (f"{self.samples} samples/frame, sample {self.sample_cost * 1e6:.1f} us, "
+                f"render {self.render_cost * 1e3:.2f} ms")
+
+
+class SamplePipeline:
+    """Per-sample work shared by the inline loops and the acquisition thread.
+
+    Each raw sample is optionally recorded and fed to the temperature bias table, then the
+    gyro bias is subtracted and the filter runs over the measured interval. The die
+    temperature is read once every TEMPERATURE_EVERY samples, and only when something uses it.
+    With a TelemetryPublisher every fused sample is sent out as well. With a timer (anything
+    with add(stage, seconds), like a StageTimer) each sample's corrections are timed as 'bias'
+    and the filter step as 'update'.
+    """
+
+    def __init__(self, sox, madgwick, gyro_bias, recorder=None, temp_table=None, accel_calibration=None,
+                 track_temperature=False, publisher=None, timer=None):
+        self.sox = sox
+        self.madgwick = madgwick
+        self.gyro_bias = gyro_bias
+        self.startup_bias = gyro_bias
+        self.recorder = recorder
+        self.temp_table = temp_table
+        self.publisher = publisher
+        self.timer = timer
+        self.rate = RateStats()
+        self.temperature = np.nan
+        self.count = 0
+        self.q = np.array([1., 0., 0., 0.])
+        self.gyro = np.zeros(3)
+        self.accel = np.zeros(3)
+        self._accel_raw = np.zeros(3)
+        # Accelerometer scale, misalignment and offset from AccelCal.py, applied as M @ a + b
+        self.accel_matrix, self.accel_offset = accel_calibration if accel_calibration is not None else (None, None)
+        self._last_burst = None
+        self._wants_temperature = recorder is not None or temp_table is not None or track_temperature
+
+    def _read_temperature(self):
+        self.temperature = self.sox.temperature
+        if self.temp_table is not None:
+            # Recomputed here rather than per sample, the temperature moves far slower than that
+            self.gyro_bias = self.temp_table.bias_at(self.temperature, self.startup_bias)
+
+    def process(self, t, gyro, accel):
+        """Fuse one raw sample taken at time t, returns the updated quaternion."""
+        timer = self.timer
+        if timer is not None:
+            start = time.perf_counter()
+        if self._wants_temperature and self.count % TEMPERATURE_EVERY == 0:
+            self._read_temperature()
+        self.count += 1
+        if self.recorder is not None:
+            self.recorder.append(t, gyro, accel, self.temperature)
+
+        if self.accel_matrix is None:
+            self.accel[:] = accel
+        else:
+            self._accel_raw[:] = accel
+            np.dot(self.accel_matrix, self._accel_raw, out=self.accel)
+            self.accel += self.accel_offset
+        if self.temp_table is not None:
+            self.temp_table.observe(gyro, self.accel, self.temperature)
+
+        self.gyro[:] = gyro
+        self.gyro -= self.gyro_bias
+        # Integrate over the real time since the last sample, not the filter's nominal period
+        dt = measured_dt(self.rate.tick(t), self.madgwick.Dt)
+        if timer is not None:
+            update_start = time.perf_counter()
+            timer.add('bias', update_start - start)
+        self.q = self.madgwick.updateIMU(self.q, gyr=self.gyro, acc=self.accel, dt=dt)
+        if timer is not None:
+            timer.add('update', time.perf_counter() - update_start)
+        if self.publisher is not None:
+            self.publisher.publish(t, self.q, self.gyro, self.accel)
+        return self.q
+
+    def process_block(self, block, n, read_done, ring=None, timer=None):
+        """Fuse n gyro+accel rows drained from the FIFO at time read_done.
+
+        With a timer the ring pushes are timed as 'store' and the rest of the block as
+        'fuse', each summed over the block.
+        """
+        if n == 0:
+            return self.q
+        start = time.perf_counter()
+        first_t, step = burst_timing(self._last_burst, read_done, n, self.madgwick.Dt)
+        self._last_burst = read_done
+        store = 0.0
+        for i in range(n):
+            sample_t = first_t + step * i
+            self.process(sample_t, block[i, 0:3], block[i, 3:6])
+            if ring is not None:
+                push_start = time.perf_counter()
+                ring.push(sample_t, self.gyro, self.accel, self.q)
+                store += time.perf_counter() - push_start
+        if timer is not None:
+            timer.add('fuse', time.perf_counter() - start - store)
+            timer.add('store', store)
+        return self.q
+
+
+class MultiSensorPipeline:
+    """Several IMUs fused together: all quaternions are advanced by one MadgwickIMUArray update.
+
+    read() polls every sensor into (N, 3) arrays, process(t) subtracts each sensor's bias,
+    applies each sensor's accelerometer correction and returns the combined attitude.
+    The sensors are assumed to be mounted with their axes aligned. A TelemetryPublisher gets
+    the combined attitude with the rates averaged over the sensors.
+    """
+
+    def __init__(self, sensors, gyro_biases, accel_calibrations=None, gain=None, publisher=None):
+        n = len(sensors)
+        self.sensors = sensors
+        self.madgwick = MadgwickIMUArray(n) if gain is None else MadgwickIMUArray(n, gain=gain)
+        self.gyro_bias = np.array(gyro_biases, dtype=float)
+        self.accel_matrix = np.tile(np.eye(3), (n, 1, 1))
+        self.accel_offset = np.zeros((n, 3))
+        for i, calibration in enumerate(accel_calibrations or ()):
+            if calibration is not None:
+                self.accel_matrix[i], self.accel_offset[i] = calibration
+        self.publisher = publisher
+        self.rate = RateStats()
+        self.gyro = np.zeros((n, 3))
+        self.accel = np.zeros((n, 3))
+        self._accel_raw = np.zeros((n, 3))
+        self.q = np.array([1., 0., 0., 0.])
+
+    @property
+    def Q(self):
+        return self.madgwick.Q
+
+    def read(self):
+        for i, sox in enumerate(self.sensors):
+            self.gyro[i] = sox.gyro
+            self._accel_raw[i] = sox.acceleration
+
+    def process(self, t):
+        """Fuse the samples from the last read(), taken at time t, returns the combined quaternion."""
+        self.gyro -= self.gyro_bias
+        np.einsum('nij,nj->ni', self.accel_matrix, self._accel_raw, out=self.accel)
+        self.accel += self.accel_offset
+        dt = measured_dt(self.rate.tick(t), self.madgwick.Dt)
+        self.madgwick.update(self.gyro, self.accel, dt)
+        self.q = average_quaternion(self.madgwick.Q)
+        if self.publisher is not None:
+            self.publisher.publish(t, self.q, self.gyro.mean(axis=0), self.accel.mean(axis=0))
+        return self.q
+
+
+class AcquisitionWorker(threading.Thread):
+    """Read the sensor and run the SamplePipeline on a thread of its own.
+
+    Results go into a SampleRing so the render loop only has to pick up the newest
+    quaternion each frame and never holds up sampling.
+    """
+
+    def __init__(self, sox, pipeline, ring, fifo=None, block_size=512, clock=time.perf_counter):
+        super().__init__(daemon=True)
+        self.sox = sox
+        self.pipeline = pipeline
+        self.clock = clock
+        self.ring = ring
+        self.fifo = fifo
+        self.timer = StageTimer(('read', 'fuse', 'store'))
+        self.rate = pipeline.rate
+        self._stop_event = threading.Event()
+        self._block = np.zeros((block_size, 6))
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        if self.fifo is not None:
+            self._run_fifo()
+        else:
+            self._run_polled()
+
+    def _run_polled(self):
+        pipeline = self.pipeline
+        timer = self.timer
+        while not self._stop_event.is_set():
+            start = time.perf_counter()
+            gyro = self.sox.gyro
+            sample_t = self.clock()
+            accel = self.sox.acceleration
+            read_done = time.perf_counter()
+            q = pipeline.process(sample_t, gyro, accel)
+            fuse_done = time.perf_counter()
+            self.ring.push(sample_t, pipeline.gyro, pipeline.accel, q)
+            store_done = time.perf_counter()
+
+            timer.add('read', read_done - start)
+            timer.add('fuse', fuse_done - read_done)
+            timer.add('store', store_done - fuse_done)
+
+    def _run_fifo(self):
+        block = self._block
+        timer = self.timer
+        while not self._stop_event.is_set():
+            start = time.perf_counter()
+            n = self.fifo.drain(block)
+            read_done = time.perf_counter()
+            if n == 0:
+                time.sleep(0.001)
+                continue
+            timer.add('read', read_done - start)
+            self.pipeline.process_block(block, n, read_done, self.ring, timer)
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from acquisition import burst_timing
+
+SAMPLE_QUEUE_SIZE = 8  # Raw sample batches waiting for fusion, the sensor waits when it is full
+LOG_QUEUE_SIZE = 64  # Batches waiting for the logger, fusion waits when it is full
+POLL_BATCH = 10  # Samples a polled source reads back to back on the sensor thread per batch
+FIFO_POLL_INTERVAL = 0.005  # s between FIFO drains, the FIFO holds the samples in between
+
+
+class DropOldestQueue(asyncio.Queue):
+    """Bounded queue for consumers that only want recent items, like the display.
+
+    Putting into a full queue throws the oldest item away instead of waiting, so a slow
+    consumer never holds up the producer. The number of discarded items is kept in dropped.
+    """
+
+    def __init__(self, maxsize=1):
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put_nowait(self, item):
+        if self.full():
+            self.get_nowait()
+            self.dropped += 1
+        super().put_nowait(item)
+
+    async def put(self, item):
+        self.put_nowait(item)
+
+
+def read_batch(sox, clock, batch):
+    """Poll `batch` samples back to back, returns (t, block). Blocks, so it runs on the sensor thread."""
+    t = np.zeros(batch)
+    block = np.zeros((batch, 6))
+    for i in range(batch):
+        block[i, 0:3] = sox.gyro
+        t[i] = clock()
+        block[i, 3:6] = sox.acceleration
+    return t, block
+
+
+async def sensor_source(sox, samples, clock=time.perf_counter, fifo=None, batch=POLL_BATCH,
+                        poll_interval=FIFO_POLL_INTERVAL, nominal_dt=0.01):
+    """Read the sensor and put (t, block) batches on samples: t is (n,), block is (n, 6) gyro+accel.
+
+    Every read blocks (on the I2C bus, or in the simulators' pacing), so they all run on one
+    sensor thread and the event loop only awaits the results. A polled source reads `batch`
+    samples per hand-off, a FIFO source drains the hardware FIFO every poll_interval.
+    samples is an ordinary bounded queue, so when fusion falls behind the source waits.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sensor')
+    try:
+        if fifo is None:
+            while True:
+                await samples.put(await loop.run_in_executor(executor, read_batch, sox, clock, batch))
+
+        drain_block = np.zeros((fifo.max_words, 6))
+        last_burst = None
+        while True:
+            n = await loop.run_in_executor(executor, fifo.drain, drain_block)
+            read_done = time.perf_counter()
+            if n:
+                first_t, step = burst_timing(last_burst, read_done, n, nominal_dt)
+                last_burst = read_done
+                await samples.put((first_t + step * np.arange(n), drain_block[:n].copy()))
+            await asyncio.sleep(poll_interval)
+    finally:
+        # A read still running finishes on its own, nothing waits for it
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def fusion_stage(samples, pipeline, latest=(), log=None):
+    """Fuse every sample batch through the SamplePipeline, which also sends the telemetry
+    of each sample if it has a publisher.
+
+    The newest (t, q) after each batch goes to each queue in latest (the display), which
+    are DropOldestQueues. The raw batch goes to log, which is bounded but never
+    drops: when the logger falls behind, fusion waits for it.
+    """
+    while True:
+        t, block = await samples.get()
+        for i in range(len(t)):
+            q = pipeline.process(t[i], block[i, 0:3], block[i, 3:6])
+        if log is not None:
+            await log.put((t, block, pipeline.temperature))
+        for queue in latest:
+            queue.put_nowait((t[-1], q.copy()))
+
+
+async def logging_stage(log, recorder):
+    """Append every logged batch to an ImuRecorder."""
+    while True:
+        t, block, temperature = await log.get()
+        for i in range(len(t)):
+            recorder.append(t[i], block[i, 0:3], block[i, 3:6], temperature)
+        log.task_done()
+
+
+async def run_pipeline(sox, pipeline, clock=time.perf_counter, fifo=None, display=None, recorder=None):
+    """Run the sensor, fusion and logging stages as tasks on one event loop.
+
+    display, if given, is a coroutine function called with the DropOldestQueue of newest
+    attitudes. The pipeline stops when the display returns (or when cancelled).
+    """
+    samples = asyncio.Queue(SAMPLE_QUEUE_SIZE)
+    latest = []
+    log = asyncio.Queue(LOG_QUEUE_SIZE) if recorder is not None else None
+    producers = [asyncio.create_task(sensor_source(sox, samples, clock, fifo, nominal_dt=pipeline.madgwick.Dt))]
+    tasks = []
+    if recorder is not None:
+        tasks.append(asyncio.create_task(logging_stage(log, recorder)))
+    frames = None
+    if display is not None:
+        frames = DropOldestQueue(1)
+        latest.append(frames)
+    producers.append(asyncio.create_task(fusion_stage(samples, pipeline, latest, log)))
+    try:
+        if display is not None:
+            await display(frames)
+        else:
+            await asyncio.gather(*producers, *tasks)
+    finally:
+        for task in producers:
+            task.cancel()
+        await asyncio.gather(*producers, return_exceptions=True)
+        # Whatever fusion already handed to the logger still gets written
+        if log is not None and not tasks[0].done():
+            await log.join()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
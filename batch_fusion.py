@@ -0,0 +1,116 @@
+import argparse
+import time
+import numpy as np
+from ahrs.filters import Madgwick
+from acquisition import MAX_DT
+from fusion_kernels import MADGWICK_GAIN, madgwick_imu_batch, madgwick_imu_batch_jit, quaternions_to_roll_pitch
+from fusion_backends import BACKENDS, make_backend, backend_batch
+from sim_sensor import load_recording
+
+CHUNK_SIZE = 65536
+NOMINAL_DT = 1.0 / 833.0
+
+
+def sample_intervals(t, prev_t, out, nominal_dt=NOMINAL_DT, max_dt=MAX_DT):
+    """Per-sample dt for one chunk, the same rule the live loop uses (see acquisition.measured_dt)."""
+    out[0] = t[0] - prev_t if prev_t is not None else nominal_dt
+    np.subtract(t[1:], t[:-1], out=out[1:len(t)])
+    dt = out[:len(t)]
+    dt[dt <= 0] = nominal_dt
+    np.minimum(dt, max_dt, out=dt)
+    return dt
+
+
+def ahrs_batch(q0, gyr, acc, dt, gain, out):
+    """Reference path through ahrs.filters.Madgwick.updateIMU, one call per sample."""
+    madgwick = Madgwick(gain=gain)
+    q = np.array(q0, dtype=float)
+    for i in range(len(gyr)):
+        q = madgwick.updateIMU(q, gyr=gyr[i], acc=acc[i], dt=dt[i])
+        out[i] = q
+    return q
+
+
+def fuse_recording(t, gyr, acc, Q, roll, pitch, gyro_bias=np.zeros(3), gain=MADGWICK_GAIN,
+                   engine='python', chunk_size=CHUNK_SIZE, nominal_dt=NOMINAL_DT, fusion='madgwick'):
+    """Fuse a whole recording chunk by chunk into the preallocated Q (N, 4), roll and pitch (N,) outputs.
+
+    engine picks the Madgwick implementation. Any other fusion backend runs sample by sample
+    through make_backend, and keeps its state from one chunk to the next.
+    """
+    if fusion != 'madgwick':
+        backend = make_backend(fusion, frequency=1.0 / nominal_dt)
+        kernel = lambda q0, gyr, acc, dt, gain, out: backend_batch(backend, q0, gyr, acc, dt, out)
+    else:
+        kernels = {'python': madgwick_imu_batch, 'numba': madgwick_imu_batch_jit, 'ahrs': ahrs_batch}
+        kernel = kernels[engine]
+    if kernel is None:
+        raise RuntimeError(f"the {engine} engine is not available, is the package installed?")
+
+    # Scratch buffers reused for every chunk
+    gyr_chunk = np.zeros((chunk_size, 3))
+    acc_chunk = np.zeros((chunk_size, 3))
+    dt_chunk = np.zeros(chunk_size)
+
+    q = np.array([1., 0., 0., 0.])
+    prev_t = None
+    for start in range(0, len(gyr), chunk_size):
+        end = min(start + chunk_size, len(gyr))
+        n = end - start
+        np.subtract(gyr[start:end], gyro_bias, out=gyr_chunk[:n])
+        acc_chunk[:n] = acc[start:end]
+        if t is None:
+            dt_chunk[:n] = nominal_dt
+            dt = dt_chunk[:n]
+        else:
+            dt = sample_intervals(t[start:end], prev_t, dt_chunk, nominal_dt)
+            prev_t = t[end - 1]
+        q = kernel(q, gyr_chunk[:n], acc_chunk[:n], dt, gain, Q[start:end])
+        quaternions_to_roll_pitch(Q[start:end], roll[start:end], pitch[start:end])
+    return q
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run Madgwick fusion over a recorded IMU stream')
+    parser.add_argument('recording', help='.imulog, .npy or .csv recording')
+    parser.add_argument('output', help='output prefix, writes <prefix>_q.npy, <prefix>_roll.npy and <prefix>_pitch.npy')
+    parser.add_argument('--engine', choices=('python', 'numba', 'ahrs'), default='python',
+                        help='fusion kernel: plain Python floats, numba JIT, or the ahrs package per sample')
+    parser.add_argument('--filter', choices=BACKENDS, default='madgwick',
+                        help='fusion backend, --engine only applies to madgwick')
+    parser.add_argument('--gain', type=float, default=MADGWICK_GAIN)
+    parser.add_argument('--gyro-bias', type=float, nargs=3, metavar=('X', 'Y', 'Z'),
+                        help='gyro bias to subtract (rad/s), default is the mean of the first --bias-samples')
+    parser.add_argument('--bias-samples', type=int, default=1000)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    t, gyr, acc, _ = load_recording(args.recording)
+    n = len(gyr)
+    if args.gyro_bias is not None:
+        gyro_bias = np.array(args.gyro_bias)
+    elif args.bias_samples:
+        gyro_bias = np.asarray(gyr[:args.bias_samples], dtype=float).mean(axis=0)
+    else:
+        gyro_bias = np.zeros(3)
+
+    # Outputs are memory mapped .npy files, so a day of data never has to fit in RAM
+    Q = np.lib.format.open_memmap(args.output + '_q.npy', mode='w+', dtype=np.float64, shape=(n, 4))
+    roll = np.lib.format.open_memmap(args.output + '_roll.npy', mode='w+', dtype=np.float64, shape=(n,))
+    pitch = np.lib.format.open_memmap(args.output + '_pitch.npy', mode='w+', dtype=np.float64, shape=(n,))
+
+    start = time.perf_counter()
+    fuse_recording(t, gyr, acc, Q, roll, pitch, gyro_bias=gyro_bias, gain=args.gain,
+                   engine=args.engine, chunk_size=args.chunk_size, fusion=args.filter)
+    elapsed = time.perf_counter() - start
+    Q.flush()
+    roll.flush()
+    pitch.flush()
+
+    duration = (t[-1] - t[0]) if t is not None and n > 1 else n * NOMINAL_DT
+    print(f"{n} samples in {elapsed:.2f} s: {n / elapsed:.0f} samples/s, "
+          f"{duration / elapsed:.1f}x real time ({args.engine if args.filter == 'madgwick' else args.filter})")
+
+
+if __name__ == "__main__":
+    main()
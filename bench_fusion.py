@@ -0,0 +1,96 @@
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from batch_fusion import sample_intervals, NOMINAL_DT
+from fusion_backends import BACKENDS, make_backend, backend_batch
+from fusion_kernels import quaternions_to_roll_pitch
+from sim_sensor import SyntheticSensor, load_recording
+
+SETTLE_TIME = 2.0  # s at the start of the stream left out of the error, while the filters converge
+
+
+def synthetic_dataset(n, seed=0):
+    """Synthetic stream with the bias already removed and the true roll/pitch (degrees) of every sample."""
+    sensor = SyntheticSensor(speed=0, seed=seed)
+    t = np.zeros(n)
+    gyr = np.zeros((n, 3))
+    acc = np.zeros((n, 3))
+    truth = np.zeros((n, 2))
+    for i in range(n):
+        gyr[i] = sensor.gyro
+        acc[i] = sensor.acceleration
+        t[i] = sensor.sample_time
+        truth[i] = np.degrees(sensor.attitude(t[i]))
+    gyr -= sensor.gyro_bias
+    return t, gyr, acc, truth
+
+
+def run_backend(name, t, gyr, acc, dt):
+    """Fuse the stream with one backend, returns (us per update, peak traced KiB, Q)."""
+    Q = np.zeros((len(gyr), 4))
+    backend = make_backend(name, frequency=1.0 / NOMINAL_DT)
+    start = time.perf_counter()
+    backend_batch(backend, [1., 0., 0., 0.], gyr, acc, dt, Q)
+    cost = (time.perf_counter() - start) / len(gyr)
+
+    # Memory in a second, shorter run, tracemalloc slows everything down
+    n = min(len(gyr), 2000)
+    out = np.zeros((n, 4))
+    tracemalloc.start()
+    backend = make_backend(name, frequency=1.0 / NOMINAL_DT)
+    backend_batch(backend, [1., 0., 0., 0.], gyr[:n], acc[:n], dt[:n], out)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cost, peak / 1024, Q
+
+
+def attitude_error(Q, truth, settle):
+    """RMS and max roll/pitch error in degrees after the first `settle` samples."""
+    angles = np.zeros((len(Q), 2))
+    roll = np.zeros(len(Q))
+    pitch = np.zeros(len(Q))
+    quaternions_to_roll_pitch(Q, roll, pitch)
+    angles[:, 0] = roll
+    angles[:, 1] = pitch
+    error = (angles - truth)[settle:]
+    return np.sqrt(np.mean(error ** 2)), np.abs(error).max()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cost and accuracy of every fusion backend on the same data')
+    parser.add_argument('--recording', help='.imulog, .npy or .csv to fuse instead of synthetic motion; '
+                                            'without a ground truth the error is measured against --reference')
+    parser.add_argument('--samples', type=int, default=20000, help='length of the synthetic stream')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=BACKENDS)
+    parser.add_argument('--reference', choices=BACKENDS, default='madgwick')
+    parser.add_argument('--gyro-bias', type=float, nargs=3, default=(0.0, 0.0, 0.0), metavar=('X', 'Y', 'Z'),
+                        help='gyro bias to subtract from a recording (rad/s)')
+    args = parser.parse_args()
+
+    if args.recording:
+        t, gyr, acc, _ = load_recording(args.recording)
+        gyr = np.asarray(gyr, dtype=float) - args.gyro_bias
+        acc = np.asarray(acc, dtype=float)
+        truth = None
+    else:
+        t, gyr, acc, truth = synthetic_dataset(args.samples)
+    dt = np.full(len(gyr), NOMINAL_DT) if t is None else sample_intervals(t, None, np.zeros(len(gyr)))
+    settle = int(SETTLE_TIME / NOMINAL_DT)
+
+    if truth is None:
+        # No ground truth in a recording, compare against the reference filter instead
+        _, _, Q_reference = run_backend(args.reference, t, gyr, acc, dt)
+        truth = np.zeros((len(gyr), 2))
+        quaternions_to_roll_pitch(Q_reference, truth[:, 0], truth[:, 1])
+        print(f"errors are relative to {args.reference}")
+
+    print(f"{'backend':<14}{'us/update':>10}{'peak KiB':>10}{'rms deg':>10}{'max deg':>10}")
+    for name in args.backends:
+        cost, peak, Q = run_backend(name, t, gyr, acc, dt)
+        rms, worst = attitude_error(Q, truth, settle)
+        print(f"{name:<14}{cost * 1e6:>10.1f}{peak:>10.1f}{rms:>10.4f}{worst:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
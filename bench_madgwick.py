@@ -0,0 +1,76 @@
+import argparse
+import time
+import numpy as np
+from ahrs.filters import Madgwick
+from fusion_kernels import MadgwickIMU, MadgwickIMUArray
+from sim_sensor import SyntheticSensor
+
+
+def synthetic_stream(n, seed=0):
+    sensor = SyntheticSensor(speed=0, seed=seed)
+    gyr = np.zeros((n, 3))
+    acc = np.zeros((n, 3))
+    for i in range(n):
+        gyr[i] = sensor.gyro
+        acc[i] = sensor.acceleration
+    return gyr, acc
+
+
+def time_updates(update, q, gyr, acc, dt):
+    start = time.perf_counter()
+    for i in range(len(gyr)):
+        q = update(q, gyr[i], acc[i], dt)
+    return (time.perf_counter() - start) / len(gyr), q
+
+
+def time_array_updates(n_sensors, gyr, acc, dt, steps=2000):
+    """Per-sensor cost of one MadgwickIMUArray step over n_sensors copies of the stream."""
+    filters = MadgwickIMUArray(n_sensors)
+    G = np.repeat(gyr[:steps, None, :], n_sensors, axis=1)
+    A = np.repeat(acc[:steps, None, :], n_sensors, axis=1)
+    # The first update compiles (or loads) the numba kernel
+    filters.update(G[0], A[0], dt)
+    start = time.perf_counter()
+    for i in range(steps):
+        filters.update(G[i], A[i], dt)
+    return (time.perf_counter() - start) / steps / n_sensors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-update cost of the ahrs Madgwick filter and the built-in kernel')
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--sensors', type=int, nargs='+', default=(1, 2, 4, 8, 16),
+                        help='sensor counts to time the batched multi-sensor update at')
+    args = parser.parse_args()
+
+    gyr, acc = synthetic_stream(args.samples)
+    dt = 1.0 / 833.0
+    library = Madgwick()
+    builtin = MadgwickIMU()
+
+    # Per-update agreement, both filters starting every step from the same prior
+    worst = 0.0
+    q = np.array([1., 0., 0., 0.])
+    for i in range(len(gyr)):
+        expected = np.asarray(library.updateIMU(q, gyr=gyr[i], acc=acc[i], dt=dt))
+        got = builtin.updateIMU(q.copy(), gyr[i], acc[i], dt)
+        worst = max(worst, np.abs(expected - got).max())
+        q = expected
+
+    library_cost, q_library = time_updates(lambda q, g, a, dt: library.updateIMU(q, gyr=g, acc=a, dt=dt),
+                                           np.array([1., 0., 0., 0.]), gyr, acc, dt)
+    builtin_cost, q_builtin = time_updates(builtin.updateIMU, np.array([1., 0., 0., 0.]), gyr, acc, dt)
+
+    print(f"ahrs.filters.Madgwick.updateIMU: {library_cost * 1e6:.2f} us/update")
+    print(f"fusion_kernels.MadgwickIMU:      {builtin_cost * 1e6:.2f} us/update "
+          f"({library_cost / builtin_cost:.1f}x faster)")
+    print(f"max per-update difference {worst:.2e} (tolerance {MadgwickIMU.UPDATE_TOLERANCE:.0e}), "
+          f"after {len(gyr)} chained updates {np.abs(np.asarray(q_library) - q_builtin).max():.2e}")
+
+    for n_sensors in args.sensors:
+        cost = time_array_updates(n_sensors, gyr, acc, dt)
+        print(f"fusion_kernels.MadgwickIMUArray, {n_sensors:3d} sensors: {cost * 1e6:.2f} us/update per sensor")
+
+
+if __name__ == "__main__":
+    main()
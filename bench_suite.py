@@ -0,0 +1,390 @@
+import os
+# No window: SDL renders into memory, so the suite runs on any Linux box
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import fnmatch
+import gc
+import json
+import math
+import platform
+import sys
+import time
+import numpy as np
+import pygame
+import AHRS_L6
+import AHRS_L8
+import AHRS_V5
+import cubeTest
+from acquisition import SamplePipeline
+from fusion_backends import make_backend
+from mesh_render import MeshRenderer, sphere_mesh, attitude_matrix, LIGHT_DIRECTION
+from profiling import run_frames
+from rotation_cache import RotationCache
+from sim_sensor import SyntheticSensor
+
+BASELINE_FILE = 'bench_baseline.json'
+REPEATS = 5  # Timed repeats per benchmark, the median is what gets compared
+MIN_REPEAT_TIME = 0.2  # Seconds each repeat runs for at least, calls per repeat are scaled up to it
+THRESHOLD = 0.15  # Slowdown of the median flagged as a regression, run-to-run noise reaches about 10%
+FRAME_WARMUP = 120  # Full frames left out at the start of an ahrs_main run, while caches fill
+FRAME_COUNT = 500  # Full frames timed per ahrs_main run, split evenly across the repeats
+FRAME_BENCH_FPS = 10000  # Frame rate cap for ahrs_main, high enough that it never waits
+FRAME_SAMPLES = 14  # Samples fused per benchmark frame, what a 60 fps frame takes at 833 Hz
+ANGLE_STEPS = 512  # Distinct roll/pitch pairs the draw benchmarks cycle through
+SENSOR_SAMPLES = 4096  # Synthetic samples the fusion benchmarks cycle through
+
+
+def sweep_angles(n=ANGLE_STEPS):
+    """(roll, pitch) pairs in degrees, a slow sweep over the range the dials show."""
+    return [(60 * math.sin(i * 2 * math.pi / n), 40 * math.sin(i * 6 * math.pi / n)) for i in range(n)]
+
+
+def sensor_stream(n=SENSOR_SAMPLES, seed=0):
+    """Raw (t, gyro, accel) samples from the synthetic sensor, and the sensor for its bias."""
+    sensor = SyntheticSensor(speed=0, seed=seed)
+    samples = []
+    for _ in range(n):
+        gyro = sensor.gyro
+        samples.append((sensor.sample_time, gyro, sensor.acceleration))
+    return samples, sensor
+
+
+def cycling(values):
+    """Zero-argument function returning the next of values each call, wrapping around."""
+    state = {'i': 0}
+
+    def next_value():
+        i = state['i']
+        state['i'] = (i + 1) % len(values)
+        return values[i]
+    return next_value
+
+
+def rover_image(view="Rear"):
+    return pygame.image.load(f"Rover GUI Images/Ortho_{view}_PNG.PNG").convert_alpha()
+
+
+# Each benchmark sets up its inputs once and returns the call to time
+
+def bench_quaternion_to_euler():
+    rng = np.random.default_rng(0)
+    quaternions = rng.normal(size=(ANGLE_STEPS, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1)[:, None]
+    next_q = cycling(list(quaternions))
+    return lambda: AHRS_L8.quaternion_to_euler(next_q())
+
+
+def bench_fusion(name):
+    samples, sensor = sensor_stream()
+    gyro = cycling([np.subtract(g, sensor.gyro_bias) for _, g, _ in samples])
+    accel = cycling([np.array(a) for _, _, a in samples])
+    backend = make_backend(name, frequency=sensor.rate)
+    q = np.array([1., 0., 0., 0.])
+    dt = 1.0 / sensor.rate
+    return lambda: backend.updateIMU(q, gyr=gyro(), acc=accel(), dt=dt)
+
+
+def bench_sample_pipeline():
+    """Bias subtraction, interval and filter step for one raw sample, the path every live loop takes."""
+    samples, sensor = sensor_stream()
+    pipeline = SamplePipeline(sensor, make_backend('madgwick', frequency=sensor.rate), np.array(sensor.gyro_bias))
+    next_sample = cycling(samples)
+    state = {'t': 0.0}
+
+    def process():
+        _, gyro, accel = next_sample()
+        # Monotonic timestamps across wrap-arounds, so every interval is the nominal one
+        state['t'] += 1.0 / sensor.rate
+        return pipeline.process(state['t'], gyro, accel)
+    return process
+
+
+def bench_calibrate(calibrate):
+    sensor = SyntheticSensor(speed=0)
+    return lambda: calibrate(sensor)
+
+
+def bench_rotate_image():
+    image = AHRS_L8.scale_image(rover_image(), AHRS_L8.IMAGE_SCALE_FACTOR)
+    next_angle = cycling(sweep_angles())
+    return lambda: AHRS_L8.rotate_image(image, next_angle()[0], AHRS_L8.LEFT_CIRCLE_CENTER)
+
+
+def bench_rotation_cache():
+    rotations = RotationCache(AHRS_L8.scale_image(rover_image(), AHRS_L8.IMAGE_SCALE_FACTOR))
+    angles = sweep_angles()
+    for roll, _ in angles:
+        rotations.get(roll)
+    next_angle = cycling(angles)
+    return lambda: rotations.rotate(next_angle()[0], AHRS_L8.LEFT_CIRCLE_CENTER)
+
+
+def bench_scale_image():
+    image = rover_image()
+    return lambda: AHRS_L8.scale_image(image, AHRS_L8.IMAGE_SCALE_FACTOR)
+
+
+def bench_angle_markers():
+    screen = pygame.Surface((AHRS_L6.WIDTH, AHRS_L6.HEIGHT)).convert()
+    next_angle = cycling(sweep_angles())
+    left_scale, right_scale = AHRS_L6.make_angle_scales()
+
+    def draw():
+        roll, pitch = next_angle()
+        left_scale.blit(screen)
+        right_scale.blit(screen)
+        AHRS_L6.draw_moving_marker(screen, AHRS_L6.LEFT_CIRCLE_CENTER, AHRS_L6.CIRCLE_RADIUS, roll, is_pitch=False)
+        AHRS_L6.draw_moving_marker(screen, AHRS_L6.RIGHT_CIRCLE_CENTER, AHRS_L6.CIRCLE_RADIUS, -pitch, is_pitch=True)
+    return draw
+
+
+def bench_horizon():
+    screen = pygame.Surface((AHRS_L6.WIDTH, AHRS_L6.HEIGHT)).convert()
+    next_angle = cycling(sweep_angles())
+    return lambda: AHRS_L6.draw_horizon(screen, *next_angle())
+
+
+def bench_dials():
+    """AHRS_L8.draw_frame into the back buffer, everything but pushing it to the screen."""
+    back_buffer = pygame.Surface((AHRS_L8.WIDTH, AHRS_L8.HEIGHT)).convert()
+    left_rotations = RotationCache(AHRS_L8.scale_image(rover_image("Rear"), AHRS_L8.IMAGE_SCALE_FACTOR))
+    right_rotations = RotationCache(AHRS_L8.scale_image(rover_image("Right"), AHRS_L8.IMAGE_SCALE_FACTOR))
+    scales = AHRS_L8.make_angle_scales()
+    readout = AHRS_L8.GlyphAtlas(AHRS_L8.RED)
+    angles = sweep_angles()
+    # Every rotation the sweep needs is cached first, as they are in a running GUI
+    for roll, pitch in angles:
+        AHRS_L8.draw_frame(back_buffer, left_rotations, right_rotations, scales, readout, roll, pitch)
+    next_angle = cycling(angles)
+    return lambda: AHRS_L8.draw_frame(back_buffer, left_rotations, right_rotations, scales, readout, *next_angle())
+
+
+def bench_cube():
+    """cubeTest.draw_cube, flip of the (dummy) display included."""
+    screen = pygame.display.set_mode((cubeTest.WIDTH, cubeTest.HEIGHT))
+    next_angle = cycling([(math.radians(roll), math.radians(pitch)) for roll, pitch in sweep_angles()])
+    return lambda: cubeTest.draw_cube(screen, *next_angle())
+
+
+def bench_cube_attitude():
+    """The AHRS_V5 cube drawn from a quaternion, as the V scripts and render_headless do."""
+    screen = pygame.Surface((AHRS_V5.WIDTH, AHRS_V5.HEIGHT)).convert()
+    rng = np.random.default_rng(0)
+    quaternions = rng.normal(size=(ANGLE_STEPS, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1)[:, None]
+    next_q = cycling(list(quaternions))
+    return lambda: AHRS_V5.cube.draw(screen, AHRS_V5.attitude_matrix(next_q()))
+
+
+def bench_mesh(edge_color=None):
+    """A shaded 4800 triangle sphere, the size of a detailed rover model, at random attitudes."""
+    screen = pygame.Surface((cubeTest.WIDTH, cubeTest.HEIGHT)).convert()
+    renderer = MeshRenderer(sphere_mesh(150), cubeTest.CENTER, light=LIGHT_DIRECTION, edge_color=edge_color)
+    rng = np.random.default_rng(0)
+    quaternions = rng.normal(size=(ANGLE_STEPS, 4))
+    quaternions /= np.linalg.norm(quaternions, axis=1)[:, None]
+    next_q = cycling(list(quaternions))
+
+    def draw():
+        screen.fill(cubeTest.WHITE)
+        renderer.draw(screen, attitude_matrix(next_q()))
+    return draw
+
+
+MICRO_BENCHMARKS = {
+    'convert.quaternion_to_euler': bench_quaternion_to_euler,
+    'fusion.madgwick': lambda: bench_fusion('madgwick'),
+    'fusion.builtin': lambda: bench_fusion('builtin'),
+    'fusion.sample_pipeline': bench_sample_pipeline,
+    'calibrate.early_stopping': lambda: bench_calibrate(AHRS_L8.calibrate_sensor),
+    'calibrate.fixed_1000': lambda: bench_calibrate(AHRS_V5.calibrate_sensor),
+    'image.rotate_image': bench_rotate_image,
+    'image.rotation_cache': bench_rotation_cache,
+    'image.scale_image': bench_scale_image,
+    'draw.angle_markers': bench_angle_markers,
+    'draw.horizon': bench_horizon,
+    'draw.dials': bench_dials,
+    'draw.cube': bench_cube,
+    'draw.cube_attitude': bench_cube_attitude,
+    'draw.mesh': bench_mesh,
+    'draw.mesh_edges': lambda: bench_mesh(edge_color=(0, 0, 0)),
+}
+
+# Whole ahrs_main iterations on the synthetic sensor: sample, fuse, draw and present
+FRAME_BENCHMARKS = {
+    'frame.ahrs_l8': dict(),
+    'frame.ahrs_l8_full_flip': dict(full_flip=True),
+}
+
+
+def time_call(run, repeats=REPEATS, min_time=MIN_REPEAT_TIME):
+    """Seconds per call of run(), one mean per repeat, with the number of calls in each repeat.
+
+    Like timeit, the calls per repeat grow until a repeat lasts min_time, and the garbage
+    collector is off while timing.
+    """
+    number = 1
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+            number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+        results = [elapsed / number]
+        for _ in range(repeats - 1):
+            start = time.perf_counter()
+            for _ in range(number):
+                run()
+            results.append((time.perf_counter() - start) / number)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return results, number
+
+
+def time_frames(options, repeats=REPEATS, warmup=FRAME_WARMUP, frames=FRAME_COUNT):
+    """Seconds per ahrs_main frame after the warmup, one mean per equal slice of the timed frames."""
+    frame_times = run_frames(warmup + frames + 1, AHRS_L8.ahrs_main, sensor='synthetic', speed=0,
+                             fps=FRAME_BENCH_FPS, warm_rotations=True, samples_per_frame=FRAME_SAMPLES,
+                             report_interval=None, **options)
+    intervals = np.diff(frame_times[warmup:])
+    if len(intervals) < repeats:
+        raise RuntimeError(f"ahrs_main stopped after {len(frame_times)} frames")
+    return [chunk.mean() for chunk in np.array_split(intervals, repeats)], len(intervals) // repeats
+
+
+def run_suite(patterns=None, repeats=REPEATS, report=sys.stdout):
+    """Run every benchmark matching one of the fnmatch patterns (all without), returns the results."""
+    results = {}
+    for name in list(MICRO_BENCHMARKS) + list(FRAME_BENCHMARKS):
+        if patterns and not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+            continue
+        if name in MICRO_BENCHMARKS:
+            times, number = time_call(MICRO_BENCHMARKS[name](), repeats)
+        else:
+            times, number = time_frames(FRAME_BENCHMARKS[name], repeats)
+        results[name] = {'median': float(np.median(times)), 'min': float(np.min(times)),
+                         'max': float(np.max(times)), 'number': number, 'repeats': len(times)}
+        print(f"{name:<30}{format_time(results[name]['median']):>12}  "
+              f"(min {format_time(results[name]['min'])}, {number} calls x {len(times)})", file=report)
+    return results
+
+
+def format_time(seconds):
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+def environment():
+    """What the numbers depend on besides the code, stored with every baseline."""
+    return {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'machine': platform.machine(),
+            'processor': platform.processor(), 'node': platform.node(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'pygame': pygame.version.ver, 'sdl': '.'.join(map(str, pygame.get_sdl_version()))}
+
+
+def save_results(results, path):
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'benchmarks': results}, f, indent=2)
+        f.write('\n')
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def select(results, patterns):
+    """results with only the benchmarks matching one of the fnmatch patterns, all of them without."""
+    if patterns:
+        results['benchmarks'] = {name: result for name, result in results['benchmarks'].items()
+                                 if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)}
+    return results
+
+
+def compare(baseline, current, threshold=THRESHOLD, report=sys.stdout):
+    """Print the change of every benchmark's median, returns the names slower than threshold allows."""
+    for key in ('machine', 'python', 'pygame'):
+        before = baseline['environment'].get(key)
+        after = current['environment'].get(key)
+        if before != after:
+            print(f"warning: baseline {key} {before} differs from {after}", file=report)
+
+    regressions = []
+    print(f"{'benchmark':<30}{'baseline':>12}{'current':>12}{'change':>9}", file=report)
+    for name, base in baseline['benchmarks'].items():
+        result = current['benchmarks'].get(name)
+        if result is None:
+            print(f"{name:<30}{format_time(base['median']):>12}{'missing':>12}", file=report)
+            continue
+        change = result['median'] / base['median'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{name:<30}{format_time(base['median']):>12}{format_time(result['median']):>12}{change:>+9.1%}{flag}",
+              file=report)
+    for name in current['benchmarks']:
+        if name not in baseline['benchmarks']:
+            print(f"{name:<30}{'new':>12}{format_time(current['benchmarks'][name]['median']):>12}", file=report)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time fusion, conversion, every renderer and whole ahrs_main frames '
+                                                 'on the synthetic sensor, and compare against a saved baseline')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='run the suite and save the results as a baseline')
+    run.add_argument('--out', default=BASELINE_FILE, help='JSON file for the results')
+    compare_parser = commands.add_parser('compare', help='run the suite (or load CURRENT) and compare it with BASELINE, '
+                                                         'exits with status 1 on a regression')
+    compare_parser.add_argument('baseline', nargs='?', default=BASELINE_FILE)
+    compare_parser.add_argument('current', nargs='?', help='results saved by an earlier run, instead of running now')
+    compare_parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                                help='relative slowdown of the median flagged as a regression, 0.15 is 15%%')
+    compare_parser.add_argument('--save', metavar='PATH', help='also save the new results here')
+    commands.add_parser('list', help='list the benchmarks')
+    for command in (run, compare_parser):
+        command.add_argument('--only', nargs='+', metavar='PATTERN', help='benchmarks to run, e.g. draw.* frame.*')
+        command.add_argument('--repeats', type=int, default=REPEATS)
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for name in list(MICRO_BENCHMARKS) + list(FRAME_BENCHMARKS):
+            print(name)
+        return
+
+    # Surfaces are converted to the display format, as in the GUI
+    pygame.display.set_mode((AHRS_L8.WIDTH, AHRS_L8.HEIGHT))
+    if args.command == 'run':
+        save_results(run_suite(args.only, args.repeats), args.out)
+        print(f"saved to {args.out}")
+        return
+
+    baseline = select(load_results(args.baseline), args.only)
+    if args.current:
+        current = select(load_results(args.current), args.only)
+    else:
+        # Only what the baseline has, or what --only picks
+        current = {'environment': environment(),
+                   'benchmarks': run_suite(args.only or list(baseline['benchmarks']), args.repeats)}
+        if args.save:
+            save_results(current['benchmarks'], args.save)
+    print()
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import json
+import math
+import os
+import socket
+import time
+import numpy as np
+
+CALIBRATION_FILE = "calibration.json"
+CALIBRATION_MAX_AGE = 7 * 24 * 3600  # Stored gyro bias older than this (s) is measured again
+CHECK_SAMPLES = 100  # Samples read at startup to check a stored bias against
+
+
+class RunningStats:
+    """Welford running mean and variance of 3-axis samples, no per-sample allocation."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = [0.0, 0.0, 0.0]
+        self.m2 = [0.0, 0.0, 0.0]
+
+    def add(self, sample):
+        self.n += 1
+        mean = self.mean
+        m2 = self.m2
+        for axis in range(3):
+            delta = sample[axis] - mean[axis]
+            mean[axis] += delta / self.n
+            m2[axis] += delta * (sample[axis] - mean[axis])
+
+    def variance(self):
+        if self.n < 2:
+            return [math.inf] * 3
+        return [m / (self.n - 1) for m in self.m2]
+
+    def std(self):
+        return [math.sqrt(v) for v in self.variance()]
+
+    def standard_error(self):
+        """Largest standard error of the mean over the three axes."""
+        return max(math.sqrt(v / self.n) for v in self.variance())
+
+
+def calibrate_gyro(sox, max_samples=1000, min_samples=100, tolerance=2e-4, stats=None):
+    """Measure the gyro bias, stopping as soon as the mean is known to within `tolerance` rad/s.
+
+    Returns the RunningStats, so callers get the noise (std) and sample count along with the bias.
+    """
+    stats = stats or RunningStats()
+    while stats.n < max_samples:
+        stats.add(sox.gyro)
+        if stats.n >= min_samples and stats.n % 10 == 0 and stats.standard_error() < tolerance:
+            break
+    return stats
+
+
+def sensor_identity(sox):
+    """Key for the calibration file: the host plus the sensor type, I2C bus and address.
+
+    None for simulated sensors (replay and synthetic), they are measured every run and
+    never stored, so one recording or seed cannot overwrite another's entry.
+    """
+    if getattr(sox, 'simulated', False):
+        return None
+    device = getattr(sox, 'i2c_device', None)
+    bus = getattr(sox, 'i2c_bus', None)
+    if device is not None and bus is not None:
+        name = f"{type(sox).__name__}@{bus}:{device.device_address:#04x}"
+    elif device is not None:
+        name = f"{type(sox).__name__}@{device.device_address:#04x}"
+    else:
+        name = type(sox).__name__
+    return f"{socket.gethostname()}/{name}"
+
+
+def load_calibrations(path=CALIBRATION_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_calibration(sox, entry, path=CALIBRATION_FILE):
+    """Store one sensor's calibration entry, keeping the other sensors' entries in the file.
+
+    Returns False, writing nothing, for a sensor without an identity (a simulated one).
+    """
+    identity = sensor_identity(sox)
+    if identity is None:
+        return False
+    calibrations = load_calibrations(path)
+    calibrations.setdefault(identity, {}).update(entry)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(calibrations, f, indent=2)
+    os.replace(tmp_path, path)
+    return True
+
+
+def gyro_bias_agrees(stored, stats, sigmas=4.0):
+    """Does a short stationary measurement agree with the stored bias and noise level?"""
+    std = stats.std()
+    for axis in range(3):
+        if not 0.5 <= std[axis] / max(stored['gyro_std'][axis], 1e-9) <= 2.0:
+            return False
+        margin = sigmas * std[axis] / math.sqrt(stats.n)
+        if abs(stats.mean[axis] - stored['gyro_bias'][axis]) > margin + 3 * stored['gyro_sem']:
+            return False
+    return True
+
+
+def load_or_calibrate_gyro(sox, path=CALIBRATION_FILE, max_age=CALIBRATION_MAX_AGE, force=False,
+                           max_samples=1000):
+    """Gyro bias for this sensor from the calibration file, measuring it only when needed.
+
+    A fresh measurement runs when there is no stored bias, it is older than max_age, or a
+    short check read at startup disagrees with the stored bias or noise level.
+    """
+    stored = None if force else load_calibrations(path).get(sensor_identity(sox))
+    stats = RunningStats()
+    if stored and 'gyro_bias' in stored and time.time() - stored['gyro_time'] < max_age:
+        for _ in range(CHECK_SAMPLES):
+            stats.add(sox.gyro)
+        if gyro_bias_agrees(stored, stats):
+            return np.array(stored['gyro_bias'])
+        print("Stored gyro bias does not match this sensor now, recalibrating")
+
+    # Keep the check samples, they are as good as any
+    stats = calibrate_gyro(sox, max_samples=max_samples, stats=stats)
+    save_calibration(sox, {
+        'gyro_bias': stats.mean,
+        'gyro_std': stats.std(),
+        'gyro_sem': stats.standard_error(),
+        'gyro_samples': stats.n,
+        'gyro_temperature': getattr(sox, 'temperature', None),
+        'gyro_time': time.time(),
+    }, path)
+    return np.array(stats.mean)
+
+
+def fit_accel_calibration(samples, targets):
+    """Least-squares fit of a_true = M @ a_raw + b over all stationary samples at once.
+
+    samples and targets are (N, 3): raw readings and the gravity vector each one should
+    have read. M takes care of scale and misalignment, b of the offsets. Returns
+    (M, b, rms residual in m/s^2).
+    """
+    samples = np.asarray(samples, dtype=float)
+    design = np.hstack((samples, np.ones((len(samples), 1))))
+    solution, _, _, _ = np.linalg.lstsq(design, targets, rcond=None)
+    matrix = solution[:3].T
+    offset = solution[3]
+    residual = np.sqrt(np.mean(np.sum((design @ solution - targets) ** 2, axis=1)))
+    return matrix, offset, residual
+
+
+def save_accel_calibration(sox, matrix, offset, residual, path=CALIBRATION_FILE):
+    return save_calibration(sox, {
+        'accel_matrix': np.asarray(matrix).tolist(),
+        'accel_offset': np.asarray(offset).tolist(),
+        'accel_residual': float(residual),
+        'accel_time': time.time(),
+    }, path)
+
+
+def load_accel_calibration(sox, path=CALIBRATION_FILE):
+    """(M, b) stored for this sensor by AccelCal.py, or None."""
+    stored = load_calibrations(path).get(sensor_identity(sox), {})
+    if 'accel_matrix' not in stored:
+        return None
+    return np.array(stored['accel_matrix']), np.array(stored['accel_offset'])
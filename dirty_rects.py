@@ -0,0 +1,58 @@
+import pygame
+
+FULL_FLIP_FRACTION = 0.5  # Push the whole frame once the changed area passes this share of the screen
+
+
+class DirtyTracker:
+    """Screen regions to push each frame, worked out from the elements that changed.
+
+    Every frame each moving element is marked with the rect it drew and a key for what it
+    showed (a surface, a color, a string). An element is dirty when either differs from the
+    previous frame, and then both its old and new rect are pushed. The back buffer is still
+    drawn completely, so any subset of it can be copied to the screen.
+    """
+
+    def __init__(self, size, full_fraction=FULL_FLIP_FRACTION):
+        self.screen_rect = pygame.Rect((0, 0), size)
+        self.full_fraction = full_fraction
+        self.previous = {}
+        self.rects = []
+        self.full = True
+        self.full_frames = 0
+        self.partial_frames = 0
+        self.pushed_area = 0
+
+    def mark(self, name, key, rect):
+        old = self.previous.get(name)
+        if old is None or old[0] != key or old[1] != rect:
+            self.rects.append(rect)
+            if old is not None:
+                self.rects.append(old[1])
+        self.previous[name] = (key, pygame.Rect(rect))
+
+    def invalidate(self):
+        """Push the whole frame next time, e.g. after a resize or theme change."""
+        self.full = True
+
+    def present(self, screen, back_buffer):
+        """Copy the changed regions of back_buffer to screen and update just those."""
+        rects = [rect.clip(self.screen_rect) for rect in self.rects]
+        area = sum(rect.width * rect.height for rect in rects)
+        if self.full or area > self.full_fraction * self.screen_rect.width * self.screen_rect.height:
+            screen.blit(back_buffer, (0, 0))
+            pygame.display.flip()
+            self.full_frames += 1
+            self.pushed_area += self.screen_rect.width * self.screen_rect.height
+        elif rects:
+            for rect in rects:
+                screen.blit(back_buffer, rect, rect)
+            pygame.display.update(rects)
+            self.partial_frames += 1
+            self.pushed_area += area
+        self.rects = []
+        self.full = False
+
+    def summary(self):
+        frames = self.full_frames + self.partial_frames
+        average = self.pushed_area / frames / (self.screen_rect.width * self.screen_rect.height) if frames else 0.0
+        return f"{self.full_frames} full, {self.partial_frames} partial, {average:.0%} of the screen pushed per frame"
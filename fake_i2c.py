@@ -0,0 +1,99 @@
+import struct
+from collections import deque
+
+from ism330_fifo import FIFO_DATA_OUT_TAG, FIFO_STATUS1, FIFO_STATUS2, FIFO_MAX_WORDS, TAG_GYRO, TAG_ACCEL
+
+FIFO_DATA_OUT_END = 0x7E
+
+
+class FakeI2C:
+    """Stand-in for busio.I2C that replays register contents for one or more devices.
+
+    Every address gets a 256 byte register map. Reads auto-increment like the real part,
+    and the ISM330DHCX FIFO output registers (0x78-0x7E) pop queued words and roll back
+    to 0x78, so a single burst read drains several words the same way it does on hardware.
+    """
+
+    def __init__(self, addresses=(0x6A,)):
+        self.registers = {address: bytearray(256) for address in addresses}
+        self.fifo = {address: deque() for address in addresses}
+        self.writes = []
+        self._locked = False
+        self._pointer = {address: 0 for address in addresses}
+
+    # busio.I2C interface used by adafruit_bus_device
+    def try_lock(self):
+        if self._locked:
+            return False
+        self._locked = True
+        return True
+
+    def unlock(self):
+        self._locked = False
+
+    def scan(self):
+        return list(self.registers)
+
+    def deinit(self):
+        pass
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        if address not in self.registers:
+            raise OSError(19, "No I2C device at address: 0x%x" % address)
+        data = bytes(buffer[start:end])
+        if not data:
+            return
+        self._pointer[address] = data[0]
+        for offset, value in enumerate(data[1:]):
+            self.registers[address][data[0] + offset] = value
+            self.writes.append((address, data[0] + offset, value))
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        if address not in self.registers:
+            raise OSError(19, "No I2C device at address: 0x%x" % address)
+        end = len(buffer) if end is None else end
+        register = self._pointer[address]
+        for i in range(start, end):
+            buffer[i] = self._read_register(address, register)
+            register += 1
+            if register > FIFO_DATA_OUT_END and self._in_fifo_window(register - 1):
+                register = FIFO_DATA_OUT_TAG
+        self._pointer[address] = register
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *, out_start=0, out_end=None,
+                              in_start=0, in_end=None):
+        self.writeto(address, buffer_out, start=out_start, end=out_end)
+        self.readfrom_into(address, buffer_in, start=in_start, end=in_end)
+
+    # Helpers for loading the fake device
+    def set_register(self, address, register, value):
+        self.registers[address][register] = value
+
+    def push_fifo_word(self, address, tag, xyz):
+        """Queue one raw FIFO word (tag sensor id plus three int16 counts)."""
+        self.fifo[address].append(struct.pack('<B3h', (tag << 3), *xyz))
+        self._update_fifo_status(address)
+
+    def push_fifo_sample(self, address, gyro_counts, accel_counts):
+        self.push_fifo_word(address, TAG_GYRO, gyro_counts)
+        self.push_fifo_word(address, TAG_ACCEL, accel_counts)
+
+    def _in_fifo_window(self, register):
+        return FIFO_DATA_OUT_TAG <= register <= FIFO_DATA_OUT_END
+
+    def _update_fifo_status(self, address):
+        level = min(len(self.fifo[address]), FIFO_MAX_WORDS)
+        self.registers[address][FIFO_STATUS1] = level & 0xFF
+        self.registers[address][FIFO_STATUS2] = (self.registers[address][FIFO_STATUS2] & 0xFC) | (level >> 8)
+
+    def _read_register(self, address, register):
+        if not self._in_fifo_window(register):
+            return self.registers[address][register & 0xFF]
+        queue = self.fifo[address]
+        if not queue:
+            return 0
+        value = queue[0][register - FIFO_DATA_OUT_TAG]
+        if register == FIFO_DATA_OUT_END:
+            queue.popleft()
+            self._update_fifo_status(address)
+        return value
@@ -0,0 +1,134 @@
+import csv
+import math
+import pygame
+from acquisition import StageTimer, RateStats
+from text_cache import get_font
+
+HUD_REFRESH = 0.5  # Seconds between rebuilds of the overlay text, in between it is only blitted
+HUD_POSITION = (4, 4)
+HUD_FONT_SIZE = 18
+HUD_COLOR = (0, 0, 0)
+HUD_BACKGROUND = (255, 255, 255, 200)  # Translucent, the dial under the overlay stays visible
+HUD_COLUMNS = (0, 130, 200)  # x of the stage name and the right edges of the p50 and p99 columns
+
+
+class FrameTimer:
+    """Time spent in each named stage during one frame, summed over every call in that frame.
+
+    add() accumulates into the current frame, end_frame() moves the totals into a StageTimer,
+    the window the rolling percentiles come from, ticks the frame rate and, with a
+    FrameTimingLog, writes the frame as one CSV row. add() is a single dict update, cheap
+    enough to call for every sample and leave on in normal runs. With the pipeline's
+    RateStats as sample_rate, the samples fused in each frame are counted as well.
+    """
+
+    def __init__(self, stages, sample_rate=None, log=None, window=1024):
+        self.stages = tuple(stages)
+        self.timer = StageTimer(self.stages, window)
+        self.rate = RateStats(window)
+        self.sample_rate = sample_rate
+        self.log = log
+        self.frames = 0
+        self.current = dict.fromkeys(self.stages, 0.0)
+        self._last_count = 0
+
+    def add(self, stage, seconds):
+        self.current[stage] += seconds
+
+    def end_frame(self, t):
+        """Close the frame that ends at time t (perf_counter seconds)."""
+        current = self.current
+        for stage in self.stages:
+            self.timer.add(stage, current[stage])
+        self.rate.tick(t)
+        samples = 0
+        if self.sample_rate is not None:
+            samples = self.sample_rate.count - self._last_count
+            self._last_count = self.sample_rate.count
+        if self.log is not None:
+            self.log.write(self.frames, t, samples, [current[stage] for stage in self.stages])
+        self.frames += 1
+        self.current = dict.fromkeys(self.stages, 0.0)
+
+    def summary(self):
+        return self.timer.summary()
+
+
+class FrameTimingLog:
+    """One CSV row per frame: frame number, time (perf_counter seconds), samples fused and
+    every stage in microseconds."""
+
+    def __init__(self, path, stages):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(['frame', 't', 'samples'] + [f"{stage}_us" for stage in stages])
+
+    def write(self, frame, t, samples, seconds):
+        self.writer.writerow([frame, f"{t:.6f}", samples] + [f"{value * 1e6:.1f}" for value in seconds])
+
+    def close(self):
+        self.file.close()
+
+
+class TimingHUD:
+    """Overlay with the rolling p50 and p99 of every stage and the achieved frame and sample rates.
+
+    The text is rebuilt every `refresh` seconds into one surface and only blitted on the
+    frames in between, so the percentiles are not recomputed at the frame rate. extra_timers
+    are (label, StageTimer) pairs shown below the frame stages, e.g. the acquisition thread's
+    per sample read and fuse times.
+    """
+
+    def __init__(self, frame_timer, extra_timers=(), visible=False, refresh=HUD_REFRESH, position=HUD_POSITION):
+        self.frame_timer = frame_timer
+        self.extra_timers = extra_timers
+        self.visible = visible
+        self.refresh = refresh
+        self.position = position
+        self.font = get_font(None, HUD_FONT_SIZE)
+        self.surface = None
+        self.updated = -math.inf
+
+    def toggle(self):
+        self.visible = not self.visible
+        # Rebuilt straight away when it comes back rather than showing stale numbers
+        self.surface = None
+
+    def rows(self):
+        """(name, p50, p99) text of each line under the rates line."""
+        rows = [("stage", "p50 us", "p99 us")]
+        timers = [('', self.frame_timer.timer)] + list(self.extra_timers)
+        for label, timer in timers:
+            for stage in timer.samples:
+                p50, p99 = timer.percentiles(stage)
+                rows.append((f"{label} {stage}".strip(), f"{p50 * 1e6:.0f}", f"{p99 * 1e6:.0f}"))
+        return rows
+
+    def build(self):
+        frame_timer = self.frame_timer
+        rates = f"{frame_timer.rate.rate():.1f} fps"
+        if frame_timer.sample_rate is not None:
+            rates += f", {frame_timer.sample_rate.rate():.0f} samples/s"
+        rows = self.rows()
+        line_height = self.font.get_linesize()
+        width = max(HUD_COLUMNS[-1], self.font.size(rates)[0]) + 8
+        surface = pygame.Surface((width, line_height * (len(rows) + 1) + 8), pygame.SRCALPHA)
+        surface.fill(HUD_BACKGROUND)
+        surface.blit(self.font.render(rates, True, HUD_COLOR), (4, 4))
+        for i, row in enumerate(rows, 1):
+            y = 4 + i * line_height
+            surface.blit(self.font.render(row[0], True, HUD_COLOR), (4 + HUD_COLUMNS[0], y))
+            # Numbers right-aligned on their column, the font is proportional
+            for text, right in zip(row[1:], HUD_COLUMNS[1:]):
+                rendered = self.font.render(text, True, HUD_COLOR)
+                surface.blit(rendered, (4 + right - rendered.get_width(), y))
+        self.surface = surface
+
+    def draw(self, target, now):
+        """Blit the overlay onto target if it is shown, returns its rect or None."""
+        if not self.visible:
+            return None
+        if self.surface is None or now - self.updated >= self.refresh:
+            self.build()
+            self.updated = now
+        return target.blit(self.surface, self.position)
@@ -0,0 +1,116 @@
+import math
+import numpy as np
+from fusion_kernels import MadgwickIMU, MADGWICK_GAIN
+
+BACKENDS = ('madgwick', 'builtin', 'mahony', 'complementary', 'ekf')
+COMPLEMENTARY_GAIN = 0.98  # Weight of the gyro-propagated angles, the rest comes from the accelerometer tilt
+
+
+class ComplementaryIMU:
+    """Complementary filter on roll and pitch, the per-sample form of ahrs.filters.Complementary.
+
+    Each update integrates the gyro into the Euler angles, then pulls roll and pitch towards
+    the accelerometer tilt: angle = gain * gyro_angle + (1 - gain) * accel_angle. Yaw is
+    gyro only. Works on Python floats like MadgwickIMU.
+    """
+
+    def __init__(self, gain=COMPLEMENTARY_GAIN, frequency=100.0):
+        self.gain = gain
+        self.frequency = frequency
+        self.Dt = 1.0 / frequency
+
+    def updateIMU(self, q, gyr, acc, dt=None):
+        dt = self.Dt if dt is None else dt
+        gx, gy, gz = (float(v) for v in gyr)
+        ax, ay, az = (float(v) for v in acc)
+        w, x, y, z = q.tolist()
+        roll = math.atan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x * x + y * y))
+        pitch = math.asin(max(-1.0, min(1.0, 2.0 * (w * y - z * x))))
+        yaw = math.atan2(2.0 * (w * z + x * y), 1.0 - 2.0 * (y * y + z * z))
+
+        # Body rates to Euler angle rates (ZYX)
+        sin_roll, cos_roll = math.sin(roll), math.cos(roll)
+        cos_pitch = max(math.cos(pitch), 1e-6)
+        roll += (gx + (gy * sin_roll + gz * cos_roll) * math.tan(pitch)) * dt
+        pitch += (gy * cos_roll - gz * sin_roll) * dt
+        yaw += (gy * sin_roll + gz * cos_roll) / cos_pitch * dt
+
+        if ax or ay or az:
+            accel_roll = math.atan2(ay, az)
+            accel_pitch = math.atan2(-ax, math.sqrt(ay * ay + az * az))
+            # Blend through the wrapped difference so +/-180 degrees roll does not jump
+            roll += (1.0 - self.gain) * math.remainder(accel_roll - roll, 2 * math.pi)
+            pitch += (1.0 - self.gain) * (accel_pitch - pitch)
+
+        cr, sr = math.cos(roll / 2), math.sin(roll / 2)
+        cp, sp = math.cos(pitch / 2), math.sin(pitch / 2)
+        cy, sy = math.cos(yaw / 2), math.sin(yaw / 2)
+        q[:] = (cr * cp * cy + sr * sp * sy,
+                sr * cp * cy - cr * sp * sy,
+                cr * sp * cy + sr * cp * sy,
+                cr * cp * sy - sr * sp * cy)
+        return q
+
+
+class AhrsMadgwick:
+    """ahrs.filters.Madgwick, with the quaternion it returns written back as a plain array."""
+
+    def __init__(self, gain=MADGWICK_GAIN, frequency=100.0):
+        from ahrs.filters import Madgwick
+        self.filter = Madgwick(gain=gain, frequency=frequency)
+        self.Dt = self.filter.Dt
+
+    def updateIMU(self, q, gyr, acc, dt=None):
+        q[:] = self.filter.updateIMU(q, gyr=gyr, acc=np.asarray(acc, dtype=float), dt=dt)
+        return q
+
+
+class AhrsMahony:
+    """ahrs.filters.Mahony, a PI correction on the gyro from the accelerometer error."""
+
+    def __init__(self, k_P=1.0, k_I=0.3, frequency=100.0):
+        from ahrs.filters import Mahony
+        self.filter = Mahony(k_P=k_P, k_I=k_I, frequency=frequency)
+        self.Dt = self.filter.Dt
+
+    def updateIMU(self, q, gyr, acc, dt=None):
+        q[:] = self.filter.updateIMU(q, gyr=np.asarray(gyr, dtype=float), acc=np.asarray(acc, dtype=float), dt=dt)
+        return q
+
+
+class AhrsEKF:
+    """ahrs.filters.EKF without a magnetometer. The filter keeps its own covariance between updates."""
+
+    def __init__(self, frequency=100.0, frame='NED'):
+        from ahrs.filters import EKF
+        self.filter = EKF(frequency=frequency, frame=frame)
+        self.Dt = self.filter.Dt
+
+    def updateIMU(self, q, gyr, acc, dt=None):
+        q[:] = self.filter.update(q, gyr=np.asarray(gyr, dtype=float), acc=np.asarray(acc, dtype=float), dt=dt)
+        return q
+
+
+def make_backend(name, frequency=100.0, **params):
+    """Fusion filter by name. Every backend has a Dt and updateIMU(q, gyr, acc, dt), which
+    updates q in place and returns it, so SamplePipeline and the offline tools take any of them.
+    """
+    if name == 'madgwick':
+        return AhrsMadgwick(frequency=frequency, **params)
+    if name == 'builtin':
+        return MadgwickIMU(frequency=frequency, **params)
+    if name == 'mahony':
+        return AhrsMahony(frequency=frequency, **params)
+    if name == 'complementary':
+        return ComplementaryIMU(frequency=frequency, **params)
+    if name == 'ekf':
+        return AhrsEKF(frequency=frequency, **params)
+    raise ValueError(f"unknown fusion backend {name!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def backend_batch(backend, q0, gyr, acc, dt, out):
+    """Run any backend over (N, 3) gyro/accel arrays with per-sample dt, quaternions into out (N, 4)."""
+    q = np.array(q0, dtype=float)
+    for i in range(len(gyr)):
+        out[i] = backend.updateIMU(q, gyr[i], acc[i], dt[i])
+    return q
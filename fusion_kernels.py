@@ -0,0 +1,214 @@
+import math
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+MADGWICK_GAIN = 0.033  # ahrs.filters.Madgwick default gain for the IMU update
+
+
+def madgwick_imu_step(qw, qx, qy, qz, gx, gy, gz, ax, ay, az, dt, gain):
+    """One Madgwick IMU update on plain floats, the same maths as ahrs.filters.Madgwick.updateIMU."""
+    norm = math.sqrt(qw * qw + qx * qx + qy * qy + qz * qz)
+    qw /= norm
+    qx /= norm
+    qy /= norm
+    qz /= norm
+    if gx == 0.0 and gy == 0.0 and gz == 0.0:
+        return qw, qx, qy, qz
+
+    # Rate of change from the gyro, 0.5 * q * (0, g)
+    dw = 0.5 * (-qx * gx - qy * gy - qz * gz)
+    dx = 0.5 * (qw * gx + qy * gz - qz * gy)
+    dy = 0.5 * (qw * gy - qx * gz + qz * gx)
+    dz = 0.5 * (qw * gz + qx * gy - qy * gx)
+
+    a_norm = math.sqrt(ax * ax + ay * ay + az * az)
+    if a_norm > 0.0:
+        ax /= a_norm
+        ay /= a_norm
+        az /= a_norm
+        # Objective function and gradient J.T @ f
+        f0 = 2.0 * (qx * qz - qw * qy) - ax
+        f1 = 2.0 * (qw * qx + qy * qz) - ay
+        f2 = 2.0 * (0.5 - qx * qx - qy * qy) - az
+        if f0 != 0.0 or f1 != 0.0 or f2 != 0.0:
+            s0 = -2.0 * qy * f0 + 2.0 * qx * f1
+            s1 = 2.0 * qz * f0 + 2.0 * qw * f1 - 4.0 * qx * f2
+            s2 = -2.0 * qw * f0 + 2.0 * qz * f1 - 4.0 * qy * f2
+            s3 = 2.0 * qx * f0 + 2.0 * qy * f1
+            s_norm = math.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            if s_norm > 0.0:
+                step = gain / s_norm
+                dw -= step * s0
+                dx -= step * s1
+                dy -= step * s2
+                dz -= step * s3
+
+    qw += dw * dt
+    qx += dx * dt
+    qy += dy * dt
+    qz += dz * dt
+    norm = math.sqrt(qw * qw + qx * qx + qy * qy + qz * qz)
+    return qw / norm, qx / norm, qy / norm, qz / norm
+
+
+def madgwick_imu_rows(Q, gyr, acc, dt, gain):
+    """madgwick_imu_step on every row of Q (N, 4) in place, one (N, 3) gyro/accel row and one dt per row."""
+    Q[:] = [madgwick_imu_step(q[0], q[1], q[2], q[3], g[0], g[1], g[2], a[0], a[1], a[2], step, gain)
+            for q, g, a, step in zip(Q.tolist(), gyr.tolist(), acc.tolist(), dt.tolist())]
+
+
+class MadgwickIMU:
+    """Madgwick IMU filter for the live loop, a drop-in for ahrs.filters.Madgwick.updateIMU.
+
+    The update runs on Python floats through madgwick_imu_step, so there are no NumPy
+    temporaries per sample, and the quaternion is written back into the array it was given
+    (or into self.q for update()). Results agree with ahrs.filters.Madgwick to within
+    UPDATE_TOLERANCE per update.
+    """
+
+    UPDATE_TOLERANCE = 1e-12
+
+    def __init__(self, gain=MADGWICK_GAIN, frequency=100.0, q0=(1., 0., 0., 0.)):
+        self.gain = gain
+        self.frequency = frequency
+        self.Dt = 1.0 / frequency
+        self.q = np.array(q0, dtype=float)
+
+    def update(self, gyr, acc, dt=None):
+        """Advance the filter's own quaternion self.q in place and return it."""
+        return self.updateIMU(self.q, gyr, acc, dt)
+
+    def updateIMU(self, q, gyr, acc, dt=None):
+        if hasattr(gyr, 'tolist'):
+            gyr = gyr.tolist()
+        if hasattr(acc, 'tolist'):
+            acc = acc.tolist()
+        qw, qx, qy, qz = q.tolist()
+        q[:] = madgwick_imu_step(qw, qx, qy, qz, gyr[0], gyr[1], gyr[2], acc[0], acc[1], acc[2],
+                                 self.Dt if dt is None else dt, self.gain)
+        return q
+
+
+class MadgwickIMUArray:
+    """Madgwick IMU filters for N sensors at once, one quaternion per row of self.Q (N, 4).
+
+    update() runs madgwick_imu_step over the rows, compiled with numba into one call when
+    it is installed (the first update compiles it, later runs load it from the cache). That
+    is about 2.5 us for 1 sensor and 3 us for 16 on x86 (bench_madgwick.py), cheaper than
+    a single MadgwickIMU update. Without numba the rows go through the plain Python step,
+    about 4 us per sensor.
+    """
+
+    def __init__(self, n, gain=MADGWICK_GAIN, frequency=100.0):
+        self.gain = gain
+        self.frequency = frequency
+        self.Dt = 1.0 / frequency
+        self.Q = np.tile([1., 0., 0., 0.], (n, 1))
+        self._dt = np.zeros(n)
+
+    def update(self, gyr, acc, dt=None):
+        """Advance every filter by one (N, 3) gyro/accel sample, dt is a scalar or one per sensor."""
+        self._dt[:] = self.Dt if dt is None else dt
+        kernel = madgwick_imu_rows if madgwick_imu_rows_jit is None else madgwick_imu_rows_jit
+        kernel(self.Q, np.asarray(gyr, dtype=float), np.asarray(acc, dtype=float), self._dt, self.gain)
+        return self.Q
+
+
+def average_quaternion(Q, weights=None):
+    """Combined attitude of several quaternions (N, 4), the eigenvector method of Markley et al.
+
+    Unlike a plain mean it does not care about the q/-q sign ambiguity between rows.
+    """
+    if weights is None:
+        M = Q.T @ Q
+    else:
+        M = (Q * np.asarray(weights)[:, None]).T @ Q
+    _, vectors = np.linalg.eigh(M)
+    q = vectors[:, -1]
+    return q if q[0] >= 0 else -q
+
+
+def slerp(q0, q1, u, out):
+    """Spherical linear interpolation from q0 (u=0) to q1 (u=1) along the shorter arc, into out (4,)."""
+    dot = float(np.dot(q0, q1))
+    sign = 1.0
+    if dot < 0.0:
+        # q and -q are the same attitude, turn towards whichever is closer
+        sign = -1.0
+        dot = -dot
+    if dot > 0.9995:
+        # Nearly the same attitude, a normalised linear blend is exact enough and never divides by ~0
+        w0 = 1.0 - u
+        w1 = sign * u
+    else:
+        theta = math.acos(dot)
+        s = math.sin(theta)
+        w0 = math.sin((1.0 - u) * theta) / s
+        w1 = sign * math.sin(u * theta) / s
+    np.multiply(q0, w0, out=out)
+    out += w1 * np.asarray(q1)
+    out /= math.sqrt(float(np.dot(out, out)))
+    return out
+
+
+def madgwick_imu_batch(q0, gyr, acc, dt, gain, out):
+    """Run the filter over (N, 3) gyro/accel arrays with per-sample dt, writing quaternions into out (N, 4).
+
+    Returns the final quaternion so a long recording can be processed chunk by chunk.
+    """
+    q = tuple(float(v) for v in q0)
+    rows = []
+    # Python floats are much quicker to loop over than NumPy scalars
+    for g, a, step in zip(gyr.tolist(), acc.tolist(), dt.tolist()):
+        q = madgwick_imu_step(q[0], q[1], q[2], q[3], g[0], g[1], g[2], a[0], a[1], a[2], step, gain)
+        rows.append(q)
+    if rows:
+        out[:len(rows)] = rows
+    return np.array(q)
+
+
+if numba is not None:
+    _madgwick_imu_step_jit = numba.njit(cache=True, fastmath=False)(madgwick_imu_step)
+
+    @numba.njit(cache=True)
+    def _madgwick_imu_batch_jit(q0, gyr, acc, dt, gain, out):
+        qw, qx, qy, qz = q0[0], q0[1], q0[2], q0[3]
+        for i in range(gyr.shape[0]):
+            qw, qx, qy, qz = _madgwick_imu_step_jit(qw, qx, qy, qz, gyr[i, 0], gyr[i, 1], gyr[i, 2],
+                                                    acc[i, 0], acc[i, 1], acc[i, 2], dt[i], gain)
+            out[i, 0] = qw
+            out[i, 1] = qx
+            out[i, 2] = qy
+            out[i, 3] = qz
+
+    def madgwick_imu_batch_jit(q0, gyr, acc, dt, gain, out):
+        """Compiled version of madgwick_imu_batch (needs numba)."""
+        if len(gyr) == 0:
+            return np.array(q0, dtype=float)
+        _madgwick_imu_batch_jit(np.asarray(q0, dtype=np.float64), gyr, acc, dt, gain, out)
+        return out[len(gyr) - 1].copy()
+
+    @numba.njit(cache=True)
+    def madgwick_imu_rows_jit(Q, gyr, acc, dt, gain):
+        """Compiled version of madgwick_imu_rows (needs numba)."""
+        for i in range(Q.shape[0]):
+            qw, qx, qy, qz = _madgwick_imu_step_jit(Q[i, 0], Q[i, 1], Q[i, 2], Q[i, 3], gyr[i, 0], gyr[i, 1],
+                                                    gyr[i, 2], acc[i, 0], acc[i, 1], acc[i, 2], dt[i], gain)
+            Q[i, 0] = qw
+            Q[i, 1] = qx
+            Q[i, 2] = qy
+            Q[i, 3] = qz
+else:
+    madgwick_imu_batch_jit = None
+    madgwick_imu_rows_jit = None
+
+
+def quaternions_to_roll_pitch(Q, roll_out, pitch_out):
+    """Vectorised quaternion_to_euler over an (N, 4) array, angles in degrees."""
+    w, x, y, z = Q[:, 0], Q[:, 1], Q[:, 2], Q[:, 3]
+    np.degrees(np.arctan2(2.0 * (w * x + y * z), 1.0 - 2.0 * (x ** 2 + y ** 2)), out=roll_out)
+    np.degrees(np.arcsin(np.clip(2.0 * (w * y - z * x), -1.0, 1.0)), out=pitch_out)
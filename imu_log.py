@@ -0,0 +1,105 @@
+import os
+import queue
+import struct
+import threading
+import numpy as np
+
+# File layout: a 64 byte header followed by fixed size little endian records
+MAGIC = b'IMULOG01'
+HEADER = struct.Struct('<8sII48x')  # magic, header size, record size
+HEADER_SIZE = HEADER.size
+MAX_PENDING = 16  # Full blocks queued for the writer before new ones are dropped, ~80 s at 833 Hz
+
+RECORD = np.dtype([
+    ('t', '<f8'),             # sample time, seconds on a monotonic clock
+    ('gyro', '<f4', (3,)),    # raw gyro, rad/s, before any bias correction
+    ('accel', '<f4', (3,)),   # raw acceleration, m/s^2
+    ('temp', '<f4'),          # die temperature, C (NaN when not read)
+])
+
+
+def open_log(path):
+    """Open a recording as a read-only np.memmap of RECORD, without loading it into memory.
+
+    A trailing partial record left by an interrupted recording is ignored.
+    """
+    with open(path, 'rb') as f:
+        magic, header_size, record_size = HEADER.unpack(f.read(HEADER_SIZE))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an IMU log")
+    if record_size != RECORD.itemsize:
+        raise ValueError(f"{path} has {record_size} byte records, expected {RECORD.itemsize}")
+    count = (os.path.getsize(path) - header_size) // record_size
+    if count == 0:
+        return np.zeros(0, dtype=RECORD)
+    return np.memmap(path, dtype=RECORD, mode='r', offset=header_size, shape=(count,))
+
+
+class ImuRecorder:
+    """Append raw samples to an IMU log without ever waiting on the disk.
+
+    Samples are copied into a preallocated block. Full blocks are handed to a writer thread
+    and a spare block is taken from a small pool (or allocated if the disk has fallen behind),
+    so append() only ever costs a row assignment. At most max_pending blocks wait for the disk,
+    past that a full block is dropped and reused, which keeps the pool bounded too.
+    """
+
+    def __init__(self, path, block_size=4096, max_pending=MAX_PENDING):
+        self.path = path
+        self.block_size = block_size
+        self.count = 0
+        self.dropped = 0  # Full blocks thrown away because the writer was max_pending behind
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, HEADER_SIZE, RECORD.itemsize))
+        self._spare = queue.SimpleQueue()
+        self._pending = queue.Queue(max_pending)
+        self._block = np.zeros(block_size, dtype=RECORD)
+        self._used = 0
+        self._writer = threading.Thread(target=self._write_blocks, daemon=True)
+        self._writer.start()
+
+    def append(self, t, gyro, accel, temp=np.nan):
+        self._block[self._used] = (t, gyro, accel, temp)
+        self._used += 1
+        self.count += 1
+        if self._used == self.block_size:
+            self._hand_off()
+
+    def _hand_off(self, wait=False):
+        try:
+            self._pending.put((self._block, self._used), block=wait)
+        except queue.Full:
+            # The disk is too far behind, lose these samples rather than the memory
+            self.dropped += 1
+            self._used = 0
+            return
+        try:
+            self._block = self._spare.get_nowait()
+        except queue.Empty:
+            self._block = np.zeros(self.block_size, dtype=RECORD)
+        self._used = 0
+
+    def _write_blocks(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            block, used = item
+            self._file.write(block[:used].tobytes())
+            self._spare.put(block)
+        self._file.close()
+
+    def close(self):
+        """Flush the partly filled block and wait for the writer to finish."""
+        if self._used:
+            self._hand_off(wait=True)
+        self._pending.put(None)
+        self._writer.join()
+        if self.dropped:
+            print(f"{self.path}: {self.dropped} blocks of {self.block_size} samples dropped, the disk fell behind")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,60 @@
+import pygame
+
+
+class ColorLUT:
+    """Angle to color table precomputed from one of the *_angle_to_color gradient functions.
+
+    Angles between lo and hi are looked up at `step` degree resolution, anything outside
+    falls back to calling the function.
+    """
+
+    def __init__(self, color_function, lo=-180.0, hi=180.0, step=0.1):
+        self.color_function = color_function
+        self.lo = lo
+        self.step = step
+        n = int(round((hi - lo) / step)) + 1
+        self.colors = [color_function(lo + i * step) for i in range(n)]
+
+    def __call__(self, angle):
+        i = int(round((angle - self.lo) / self.step))
+        if 0 <= i < len(self.colors):
+            return self.colors[i]
+        return self.color_function(angle)
+
+
+class StaticLayer:
+    """Part of an instrument that never moves, drawn once onto a transparent surface.
+
+    draw(surface) paints the layer onto a transparent surface of the given size. The result
+    is cropped to what was drawn, converted to the display format and run-length encoded,
+    which suits a layer that is mostly transparent, and then just blitted each frame.
+    invalidate() rebuilds it on the next blit, after a resize or theme change.
+    """
+
+    def __init__(self, size, draw):
+        self.size = size
+        self.draw = draw
+        self.surface = None
+        self.position = (0, 0)
+
+    def invalidate(self, size=None):
+        if size is not None:
+            self.size = size
+        self.surface = None
+
+    def bake(self):
+        surface = pygame.Surface(self.size, pygame.SRCALPHA)
+        self.draw(surface)
+        drawn = surface.get_bounding_rect()
+        surface = surface.subsurface(drawn).copy()
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        # Ticks and labels leave most of the layer transparent, RLE skips those runs in one go
+        surface.set_alpha(255, pygame.RLEACCEL)
+        self.surface = surface
+        self.position = drawn.topleft
+
+    def blit(self, target):
+        if self.surface is None:
+            self.bake()
+        return target.blit(self.surface, self.position)
@@ -0,0 +1,123 @@
+import math
+import numpy as np
+
+# ISM330DHCX FIFO registers
+FIFO_CTRL1 = 0x07  # watermark [7:0]
+FIFO_CTRL2 = 0x08  # watermark [8]
+FIFO_CTRL3 = 0x09  # BDR_GY [7:4], BDR_XL [3:0]
+FIFO_CTRL4 = 0x0A  # FIFO_MODE [2:0]
+FIFO_STATUS1 = 0x3A  # DIFF_FIFO [7:0]
+FIFO_STATUS2 = 0x3B  # flags, DIFF_FIFO [9:8]
+FIFO_DATA_OUT_TAG = 0x78  # tag byte, followed by X/Y/Z low/high (0x79-0x7E)
+
+FIFO_MODE_BYPASS = 0x00
+FIFO_MODE_CONTINUOUS = 0x06
+FIFO_OVR_IA = 0x40
+
+TAG_GYRO = 0x01
+TAG_ACCEL = 0x02
+
+FIFO_MAX_WORDS = 512  # 3 kB of 7 byte words is a little over 400, round up
+
+MILLI_G_TO_ACCEL = 0.00980665
+
+# One FIFO word as it comes off the bus: tag byte then three little endian int16
+FIFO_WORD = np.dtype([('tag', 'u1'), ('xyz', '<i2', (3,))])
+
+
+class FifoReader:
+    """Drain the ISM330DHCX hardware FIFO in bulk reads instead of polling .gyro/.acceleration.
+
+    Each call to drain() does one status read and one burst read of every waiting word,
+    then decodes the gyro/accel pairs straight into rows of a preallocated (N, 6) block:
+    gyro x, y, z (rad/s) followed by accel x, y, z (m/s^2).
+    """
+
+    def __init__(self, device, gyro_scale, accel_scale, gyro_rate, accel_rate, max_words=FIFO_MAX_WORDS):
+        self.device = device
+        self.gyro_scale = gyro_scale
+        self.accel_scale = accel_scale
+        self.gyro_rate = gyro_rate
+        self.accel_rate = accel_rate
+        self.max_words = max_words
+        self.overruns = 0
+
+        # Raw burst buffer, viewed as FIFO words without copying
+        self._raw = bytearray(max_words * FIFO_WORD.itemsize)
+        self._words = np.frombuffer(self._raw, dtype=FIFO_WORD)
+        self._status = bytearray(2)
+        self._tag_reg = bytes([FIFO_DATA_OUT_TAG])
+        self._status_reg = bytes([FIFO_STATUS1])
+
+        # Unpaired words are held here until their partner arrives in a later burst
+        self._gyro_raw = np.zeros((2 * max_words, 3), dtype=np.int16)
+        self._accel_raw = np.zeros((2 * max_words, 3), dtype=np.int16)
+        self._n_gyro = 0
+        self._n_accel = 0
+
+    @classmethod
+    def from_sensor(cls, sox, max_words=FIFO_MAX_WORDS):
+        """Build a reader sharing the I2C device, ranges and data rates already set on an ISM330DHCX."""
+        from adafruit_lsm6ds import AccelRange, GyroRange
+
+        gyro_scale = math.radians(GyroRange.lsb[sox.gyro_range] / 1000)
+        accel_scale = AccelRange.lsb[sox.accelerometer_range] * MILLI_G_TO_ACCEL
+        # The FIFO batch data rate codes share their values with the ODR codes
+        return cls(sox.i2c_device, gyro_scale, accel_scale,
+                   sox.gyro_data_rate, sox.accelerometer_data_rate, max_words)
+
+    def _write_register(self, register, value):
+        with self.device as dev:
+            dev.write(bytes([register, value]))
+
+    def enable(self):
+        """Reset the FIFO and start batching gyro and accel in continuous mode."""
+        self._write_register(FIFO_CTRL4, FIFO_MODE_BYPASS)
+        self._write_register(FIFO_CTRL3, ((self.gyro_rate & 0x0F) << 4) | (self.accel_rate & 0x0F))
+        self._write_register(FIFO_CTRL4, FIFO_MODE_CONTINUOUS)
+        self._n_gyro = 0
+        self._n_accel = 0
+
+    def disable(self):
+        self._write_register(FIFO_CTRL4, FIFO_MODE_BYPASS)
+        self._write_register(FIFO_CTRL3, 0)
+
+    def fifo_level(self):
+        """Number of unread words in the FIFO."""
+        with self.device as dev:
+            dev.write_then_readinto(self._status_reg, self._status)
+        if self._status[1] & FIFO_OVR_IA:
+            self.overruns += 1
+        return self._status[0] | ((self._status[1] & 0x03) << 8)
+
+    def drain(self, out):
+        """Read all waiting FIFO words and write gyro/accel pairs into out, returns the row count."""
+        free = self._gyro_raw.shape[0] - max(self._n_gyro, self._n_accel)
+        n_words = min(self.fifo_level(), self.max_words, free)
+        if n_words:
+            with self.device as dev:
+                dev.write_then_readinto(self._tag_reg, memoryview(self._raw)[:n_words * FIFO_WORD.itemsize])
+            words = self._words[:n_words]
+            tags = words['tag'] >> 3
+            xyz = words['xyz']
+
+            gyro_words = xyz[tags == TAG_GYRO]
+            self._gyro_raw[self._n_gyro:self._n_gyro + len(gyro_words)] = gyro_words
+            self._n_gyro += len(gyro_words)
+
+            accel_words = xyz[tags == TAG_ACCEL]
+            self._accel_raw[self._n_accel:self._n_accel + len(accel_words)] = accel_words
+            self._n_accel += len(accel_words)
+
+        n = min(self._n_gyro, self._n_accel, out.shape[0])
+        if n == 0:
+            return 0
+        np.multiply(self._gyro_raw[:n], self.gyro_scale, out=out[:n, 0:3], casting='unsafe')
+        np.multiply(self._accel_raw[:n], self.accel_scale, out=out[:n, 3:6], casting='unsafe')
+
+        # Shift whatever is still unpaired to the front of the holding buffers
+        self._gyro_raw[:self._n_gyro - n] = self._gyro_raw[n:self._n_gyro]
+        self._accel_raw[:self._n_accel - n] = self._accel_raw[n:self._n_accel]
+        self._n_gyro -= n
+        self._n_accel -= n
+        return n
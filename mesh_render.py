@@ -0,0 +1,219 @@
+import numpy as np
+import pygame
+
+PERSPECTIVE_DEPTH = 500  # Distance from the eye to the projection plane, in model units
+LIGHT_DIRECTION = (0.3, -0.5, -0.8)  # Towards the light in screen coordinates, from the upper right in front
+AMBIENT = 0.35  # Share of a face's color kept when it faces away from the light
+MIN_FACE_AREA = 0.5  # Faces covering less than this many pixels on screen are not drawn
+
+# Body frame of the sensor (x forward, y left, z up) to screen coordinates (x right, y down,
+# z into the screen), so an identity attitude shows the rover from behind
+BODY_TO_SCREEN = np.array([[0., -1., 0.],
+                           [0., 0., -1.],
+                           [1., 0., 0.]])
+# Wavefront models are y up with +z towards the viewer, turned half a revolution around x
+# into screen coordinates they stand the right way up and face the eye
+OBJ_TO_SCREEN = np.array([[1., 0., 0.],
+                          [0., -1., 0.],
+                          [0., 0., -1.]])
+
+
+def quaternion_to_matrix(q):
+    """Rotation matrix of a unit quaternion (w, x, y, z), body to earth like the fusion filters."""
+    w, x, y, z = q
+    return np.array([[1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)],
+                     [2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)],
+                     [2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)]])
+
+
+def attitude_matrix(q):
+    """Screen rotation showing the attitude quaternion q of the sensor."""
+    return BODY_TO_SCREEN @ quaternion_to_matrix(q)
+
+
+def roll_pitch_matrix(roll, pitch):
+    """Rotation the old draw_cube loop applied: pitch (radians) around x, then roll (radians) around y."""
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cr, sr = np.cos(roll), np.sin(roll)
+    pitch_rotation = np.array([[1., 0., 0.], [0., cp, -sp], [0., sp, cp]])
+    roll_rotation = np.array([[cr, 0., sr], [0., 1., 0.], [-sr, 0., cr]])
+    return roll_rotation @ pitch_rotation
+
+
+class Mesh:
+    """Vertices, faces and per face colors of a model, with everything that does not depend
+    on the attitude worked out once.
+
+    faces is an (F, k) array of vertex indices, wound counter-clockwise seen from outside, so
+    the normals point outwards. edges, if given, are (E, 2) vertex index pairs drawn as lines.
+    """
+
+    def __init__(self, vertices, faces, colors=None, edges=None):
+        self.vertices = np.asarray(vertices, dtype=float)
+        self.faces = np.asarray(faces, dtype=np.intp)
+        self.colors = None if colors is None else np.asarray(colors, dtype=float)
+        self.edges = None if edges is None else np.asarray(edges, dtype=np.intp)
+        corners = self.vertices[self.faces]
+        normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        lengths = np.linalg.norm(normals, axis=1)
+        lengths[lengths == 0] = 1.0
+        self.normals = normals / lengths[:, None]
+        self.centroids = corners.mean(axis=1)
+
+    def __len__(self):
+        return len(self.faces)
+
+
+def cube_mesh(size, colors=None):
+    """Cube from -size to size on every axis, faces in the order of the old draw_cube face colors."""
+    vertices = [
+        (-size, -size, -size),
+        (-size, size, -size),
+        (size, size, -size),
+        (size, -size, -size),
+        (-size, -size, size),
+        (-size, size, size),
+        (size, size, size),
+        (size, -size, size)
+    ]
+    faces = [
+        (0, 1, 2, 3),
+        (4, 7, 6, 5),
+        (0, 3, 7, 4),
+        (1, 5, 6, 2),
+        (0, 4, 5, 1),
+        (2, 6, 7, 3),
+    ]
+    edges = [
+        (0, 1), (1, 2), (2, 3), (0, 3),
+        (4, 5), (5, 6), (6, 7), (4, 7),
+        (0, 4), (1, 5), (2, 6), (3, 7)
+    ]
+    return Mesh(vertices, faces, colors, edges)
+
+
+def sphere_mesh(radius, rings=40, segments=60, color=(200, 200, 200)):
+    """UV sphere of 2 * rings * segments triangles, a stand-in for a detailed model in benchmarks."""
+    theta = np.linspace(0.0, np.pi, rings + 1)[:, None]
+    phi = np.linspace(0.0, 2 * np.pi, segments, endpoint=False)[None, :]
+    vertices = np.stack([radius * np.sin(theta) * np.cos(phi),
+                         radius * np.cos(theta) * np.ones_like(phi),
+                         radius * np.sin(theta) * np.sin(phi)], axis=-1).reshape(-1, 3)
+    ring = np.arange(rings)[:, None] * segments
+    a = ring + np.arange(segments)
+    b = ring + (np.arange(segments) + 1) % segments
+    c = b + segments
+    d = a + segments
+    # Two triangles per quad, wound so the normals point outwards
+    faces = np.concatenate([np.stack([a, b, c], axis=-1).reshape(-1, 3),
+                            np.stack([a, c, d], axis=-1).reshape(-1, 3)])
+    return Mesh(vertices, faces, np.tile(color, (len(faces), 1)))
+
+
+def load_obj(path, size=None, color=(200, 200, 200)):
+    """Mesh from a Wavefront .obj file, polygons split into triangles.
+
+    Only v and f lines are used (f indices may carry /vt/vn parts and be negative). The
+    model is centered on its bounding box, turned into screen coordinates (OBJ_TO_SCREEN)
+    and, with size given, scaled so its furthest vertex is size from the center. Every face
+    gets `color`.
+    """
+    vertices = []
+    faces = []
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == 'v':
+                vertices.append([float(value) for value in parts[1:4]])
+            elif parts[0] == 'f':
+                indices = []
+                for corner in parts[1:]:
+                    index = int(corner.split('/')[0])
+                    indices.append(index - 1 if index > 0 else len(vertices) + index)
+                # Fan triangulation, fine for the convex polygons exporters write
+                for i in range(1, len(indices) - 1):
+                    faces.append((indices[0], indices[i], indices[i + 1]))
+    if not faces:
+        raise ValueError(f"no faces in {path}")
+
+    vertices = np.array(vertices)
+    vertices -= (vertices.min(axis=0) + vertices.max(axis=0)) / 2
+    vertices = vertices @ OBJ_TO_SCREEN.T
+    if size is not None:
+        vertices *= size / np.linalg.norm(vertices, axis=1).max()
+    return Mesh(vertices, faces, np.tile(color, (len(faces), 1)))
+
+
+class MeshRenderer:
+    """Draws a Mesh at any rotation with one matrix product for all vertices and normals.
+
+    Faces looking away from the eye are culled with the rotated normals, as are faces smaller
+    than min_area pixels on screen, and the rest are drawn back to front (painter's algorithm,
+    by face centroid depth). With `light` set the face colors are flat shaded by their rotated
+    normals. A mesh without colors is drawn as a wireframe of its edges. Per frame the only
+    Python loop left is the one drawing the polygons. edge_color outlines every drawn face
+    with a second polygon call, which is most of the cost again, so leave it off for models
+    of more than a few faces.
+    """
+
+    def __init__(self, mesh, center, depth=PERSPECTIVE_DEPTH, light=None, ambient=AMBIENT,
+                 edge_color=None, edge_width=2, min_area=MIN_FACE_AREA):
+        self.mesh = mesh
+        self.center = np.asarray(center, dtype=float)
+        self.depth = depth
+        self.light = None if light is None else np.asarray(light, dtype=float) / np.linalg.norm(light)
+        self.ambient = ambient
+        self.edge_color = edge_color
+        self.edge_width = edge_width
+        self.min_area = min_area
+        self.eye = np.array([0., 0., -depth])
+        self.faces_drawn = 0
+
+    def project(self, rotation):
+        """Screen positions (V, 2) of the vertices and the rotated vertices (V, 3)."""
+        rotated = self.mesh.vertices @ rotation.T
+        scale = self.depth / (self.depth + rotated[:, 2])
+        points = rotated[:, :2] * scale[:, None] + self.center
+        return points.astype(np.intp), rotated
+
+    def visible_faces(self, rotation, points):
+        """Indices of the faces to draw, furthest first, and their rotated normals."""
+        normals = self.mesh.normals @ rotation.T
+        centroids = self.mesh.centroids @ rotation.T
+        visible = np.flatnonzero(np.einsum('ij,ij->i', normals, centroids - self.eye) < 0)
+        if self.min_area > 0:
+            # Screen area of each face's first triangle, enough to drop the sub-pixel ones
+            corners = points[self.mesh.faces[visible, :3]]
+            u = corners[:, 1] - corners[:, 0]
+            v = corners[:, 2] - corners[:, 0]
+            visible = visible[np.abs(u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0]) >= 2 * self.min_area]
+        order = visible[np.argsort(-centroids[visible, 2], kind='stable')]
+        return order, normals[order]
+
+    def face_colors(self, order, normals):
+        colors = self.mesh.colors[order]
+        if self.light is not None:
+            brightness = np.clip(normals @ self.light, 0.0, 1.0)
+            colors = colors * (self.ambient + (1.0 - self.ambient) * brightness)[:, None]
+        return colors.astype(np.intp).tolist()
+
+    def draw(self, screen, rotation):
+        """Draw the mesh rotated by the 3x3 matrix `rotation`, returns the rect covering it."""
+        points, _ = self.project(rotation)
+        if self.mesh.colors is not None:
+            order, normals = self.visible_faces(rotation, points)
+            polygons = points[self.mesh.faces[order]].tolist()
+            colors = self.face_colors(order, normals)
+            for polygon, color in zip(polygons, colors):
+                pygame.draw.polygon(screen, color, polygon)
+                if self.edge_color is not None:
+                    pygame.draw.polygon(screen, self.edge_color, polygon, self.edge_width)
+            self.faces_drawn = len(order)
+        elif self.mesh.edges is not None:
+            for start, end in points[self.mesh.edges].tolist():
+                pygame.draw.line(screen, self.edge_color, start, end, self.edge_width)
+        lo = points.min(axis=0)
+        hi = points.max(axis=0)
+        return pygame.Rect(int(lo[0]), int(lo[1]), int(hi[0] - lo[0]) + 1, int(hi[1] - lo[1]) + 1)
@@ -0,0 +1,181 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_FRAMES = 600  # Frames (or loop passes) a profiled run lasts, 10 s at 60 fps
+SAMPLE_INTERVAL = 0.002  # Seconds between stack samples, about 1% overhead on the rover
+PROFILE_TOP = 40  # Functions listed in the text reports
+
+# Loop passes left in the bounded run and the time each one ended, None outside run_frames()
+_frames_left = None
+_frame_times = None
+
+
+class RunComplete(Exception):
+    """Raised by frame_done() once a bounded run has done its frames."""
+
+
+def frame_done():
+    """Called once per frame (or sample loop pass) by the entry points, ends a bounded run on time."""
+    global _frames_left
+    if _frames_left is None:
+        return
+    _frame_times.append(time.perf_counter())
+    _frames_left -= 1
+    if _frames_left <= 0:
+        raise RunComplete
+
+
+class StackSampler(threading.Thread):
+    """Samples the Python stack of every other thread every `interval` seconds of wall time.
+
+    stacks counts each distinct (thread name, stack) with the code objects root first, which
+    is all the collapsed stack format needs. Time spent waiting (sleeps, sensor reads, vsync)
+    shows up under the Python function that waits, so it is not mistaken for idle.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True, name='stack sampler')
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stack.reverse()
+                self.stacks[(names.get(ident, str(ident)), tuple(stack))] += 1
+            self.samples += 1
+
+
+def code_label(code):
+    """'function (file.py:line)' for a code object, the frame name in reports and flamegraphs."""
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def write_collapsed(stacks, path):
+    """One 'thread;outer;...;inner count' line per stack, for flamegraph.pl, inferno or speedscope."""
+    with open(path, 'w') as f:
+        for (thread, stack), count in stacks.most_common():
+            frames = [thread] + [code_label(code).replace(';', ':') for code in stack]
+            f.write(f"{';'.join(frames)} {count}\n")
+
+
+def write_sample_report(stacks, path, header):
+    """Share of samples each function was running (self) or on the stack (total), and its call edges."""
+    own = Counter()
+    total = Counter()
+    callers = {}
+    callees = {}
+    samples = sum(stacks.values())
+    for (_, stack), count in stacks.items():
+        if not stack:
+            continue
+        own[stack[-1]] += count
+        for code in set(stack):
+            total[code] += count
+        for caller, callee in set(zip(stack, stack[1:])):
+            callers.setdefault(callee, Counter())[caller] += count
+            callees.setdefault(caller, Counter())[callee] += count
+
+    with open(path, 'w') as f:
+        f.write(header + "\n\n")
+        f.write(f"{'total':>7} {'self':>7}  function\n")
+        top = [code for code, _ in total.most_common(PROFILE_TOP)]
+        for code in top:
+            f.write(f"{total[code] / samples:7.1%} {own[code] / samples:7.1%}  {code_label(code)}\n")
+        f.write("\nCall graph, share of all samples through each edge\n")
+        for code in top:
+            f.write(f"\n{code_label(code)}\n")
+            for caller, count in callers.get(code, Counter()).most_common(5):
+                f.write(f"    from {count / samples:6.1%}  {code_label(caller)}\n")
+            for callee, count in callees.get(code, Counter()).most_common(10):
+                f.write(f"    calls {count / samples:5.1%}  {code_label(callee)}\n")
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', nargs='?', const='cprofile', choices=('cprofile', 'sample'),
+                        help='run --profile-frames frames under cProfile (deterministic, the default) or a '
+                             'low overhead stack sampler, then write a call graph report and collapsed stacks')
+    parser.add_argument('--profile-frames', type=int, default=PROFILE_FRAMES,
+                        help='frames (sample loop passes for the plot) in a profiled run')
+    parser.add_argument('--profile-out', metavar='PREFIX', default='profile',
+                        help='reports go to PREFIX.txt and PREFIX.collapsed, with cProfile also PREFIX.prof')
+
+
+def run_frames(frames, main, *main_args, **main_kwargs):
+    """Run main(*main_args, **main_kwargs) for `frames` frames, returns the perf_counter time each frame ended.
+
+    Closing the window or Ctrl+C ends the run early, with the frames done until then.
+    """
+    global _frames_left, _frame_times
+    _frames_left = frames
+    _frame_times = []
+    try:
+        main(*main_args, **main_kwargs)
+    except (RunComplete, KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        frame_times = _frame_times
+        _frames_left = None
+        _frame_times = None
+    return frame_times
+
+
+def run_main(args, main, *main_args, **main_kwargs):
+    """Call main(*main_args, **main_kwargs), profiled for a fixed number of frames if args.profile is set.
+
+    The stack sampler always runs and provides the collapsed stacks, with cProfile it runs
+    alongside (cProfile hooks only the calling thread) so the flamegraph carries its overhead.
+    Closing the window or Ctrl+C also ends the run, and the reports cover what ran until then.
+    """
+    if args.profile is None:
+        return main(*main_args, **main_kwargs)
+
+    sampler = StackSampler()
+    profiler = cProfile.Profile() if args.profile == 'cprofile' else None
+    sampler.start()
+    if profiler is not None:
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        frames = len(run_frames(args.profile_frames, main, *main_args, **main_kwargs))
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+
+    header = (f"{os.path.basename(sys.argv[0])} {' '.join(sys.argv[1:])}\n"
+              f"{frames} frames in {elapsed:.2f} s ({frames / elapsed:.1f} frames/s), "
+              f"{sampler.samples} stack samples every {sampler.interval * 1e3:.1f} ms")
+    report = args.profile_out + '.txt'
+    if profiler is not None:
+        profiler.dump_stats(args.profile_out + '.prof')
+        with open(report, 'w') as f:
+            f.write(header + "\n\n")
+            stats = pstats.Stats(profiler, stream=f)
+            stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+            stats.print_callees(PROFILE_TOP)
+    else:
+        write_sample_report(sampler.stacks, report, header)
+    write_collapsed(sampler.stacks, args.profile_out + '.collapsed')
+    print(header)
+    print(f"profile written to {args.profile_out}.*")
@@ -0,0 +1,183 @@
+import os
+# No window: SDL renders into memory, so this runs on the rovers and over ssh
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+# The pygame banner would end up in a raw video stream on stdout
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import shlex
+import subprocess
+import sys
+import time
+import numpy as np
+import pygame
+import AHRS_L6
+import AHRS_L8
+from acquisition import StageTimer
+from batch_fusion import fuse_recording, NOMINAL_DT
+from bench_fusion import synthetic_dataset
+from fusion_backends import BACKENDS
+from mesh_render import MeshRenderer, cube_mesh, attitude_matrix
+from rotation_cache import RotationCache
+from sim_sensor import load_recording
+from text_cache import GlyphAtlas
+
+INSTRUMENTS = ('dials', 'horizon', 'cube')
+CUBE_SIZE = (640, 480)
+# Face colors of the AHRS_V5 cube
+CUBE_COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)]
+
+
+class Instruments:
+    """The GUI instruments drawn side by side into one offscreen frame.
+
+    dials are the AHRS_L8 roll and pitch dials, horizon the AHRS_L6 horizon rulers and cube
+    the AHRS_V5 cube, each drawn by the same code the live scripts use.
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.timer = StageTimer(names)
+        sizes = {'dials': (AHRS_L8.WIDTH, AHRS_L8.HEIGHT), 'horizon': (AHRS_L6.WIDTH, AHRS_L6.HEIGHT), 'cube': CUBE_SIZE}
+        # The rotation cache and static layers convert to the display format, so there has to be a display
+        pygame.display.set_mode((1, 1))
+        self.surfaces = {name: pygame.Surface(sizes[name]).convert() for name in names}
+        self.frame = pygame.Surface((sum(sizes[name][0] for name in names),
+                                     max(sizes[name][1] for name in names))).convert()
+        self.frame.fill(AHRS_L8.WHITE)
+
+        if 'dials' in names:
+            left_image = AHRS_L8.scale_image(pygame.image.load("Rover GUI Images/Ortho_Rear_PNG.PNG"), AHRS_L8.IMAGE_SCALE_FACTOR)
+            right_image = AHRS_L8.scale_image(pygame.image.load("Rover GUI Images/Ortho_Right_PNG.PNG"), AHRS_L8.IMAGE_SCALE_FACTOR)
+            self.left_rotations = RotationCache(left_image)
+            self.right_rotations = RotationCache(right_image)
+            self.scales = AHRS_L8.make_angle_scales()
+            self.readout = GlyphAtlas(AHRS_L8.RED)
+        if 'cube' in names:
+            self.cube = MeshRenderer(cube_mesh(50, CUBE_COLORS), (CUBE_SIZE[0] // 2, CUBE_SIZE[1] // 2 + 50),
+                                     edge_color=(0, 0, 0))
+
+    def draw(self, q, roll, pitch):
+        """Render every instrument for one attitude, returns the composed frame."""
+        x = 0
+        for name in self.names:
+            surface = self.surfaces[name]
+            start = time.perf_counter()
+            if name == 'dials':
+                AHRS_L8.draw_frame(surface, self.left_rotations, self.right_rotations, self.scales, self.readout, roll, pitch)
+            elif name == 'horizon':
+                AHRS_L6.draw_horizon(surface, roll, pitch)
+            else:
+                surface.fill(AHRS_L8.WHITE)
+                self.cube.draw(surface, attitude_matrix(q))
+            self.timer.add(name, time.perf_counter() - start)
+            self.frame.blit(surface, (x, 0))
+            x += surface.get_width()
+        return self.frame
+
+
+class ImageSequence:
+    """Frames saved as numbered image files, the format follows the extension of pattern."""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        directory = os.path.dirname(pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame, index):
+        pygame.image.save(frame, self.pattern % index)
+
+    def close(self):
+        pass
+
+
+class RawVideoPipe:
+    """Frames written as raw RGB24 to stdout ('-') or to the stdin of a command such as ffmpeg."""
+
+    def __init__(self, target):
+        self.process = None
+        if target == '-':
+            self.stream = sys.stdout.buffer
+        else:
+            self.process = subprocess.Popen(shlex.split(target), stdin=subprocess.PIPE)
+            self.stream = self.process.stdin
+
+    def write(self, frame, index):
+        self.stream.write(pygame.image.tobytes(frame, 'RGB'))
+
+    def close(self):
+        self.stream.flush()
+        if self.process is not None:
+            self.stream.close()
+            self.process.wait()
+
+
+def frame_samples(t, fps):
+    """Index of the newest sample at each frame time, one frame every 1/fps seconds of the stream."""
+    frame_times = np.arange(t[0], t[-1], 1.0 / fps)
+    return np.searchsorted(t, frame_times, side='right') - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render the AHRS instruments offscreen from a recording or '
+                                                 'synthetic motion, for throughput benchmarks or review videos')
+    parser.add_argument('--recording', help='.imulog, .npy or .csv to fuse and render instead of synthetic motion')
+    parser.add_argument('--seconds', type=float, default=10.0, help='length of the synthetic motion')
+    parser.add_argument('--gyro-bias', type=float, nargs=3, default=(0.0, 0.0, 0.0), metavar=('X', 'Y', 'Z'),
+                        help='gyro bias to subtract from a recording (rad/s)')
+    parser.add_argument('--filter', choices=BACKENDS, default='madgwick', help='fusion backend for the recording')
+    parser.add_argument('--instruments', nargs='+', choices=INSTRUMENTS, default=list(INSTRUMENTS))
+    parser.add_argument('--fps', type=float, default=60.0, help='frames per second of stream time')
+    parser.add_argument('--frames', type=int, help='stop after this many frames')
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--images', metavar='PATTERN', help='save every frame, e.g. frames/frame_%%06d.png')
+    output.add_argument('--pipe', metavar='TARGET',
+                        help="raw RGB24 frames to stdout ('-') or to a command, e.g. "
+                             "\"ffmpeg -f rawvideo -pix_fmt rgb24 -s WxH -r 60 -i - review.mp4\"")
+    args = parser.parse_args()
+
+    if args.recording:
+        t, gyr, acc, _ = load_recording(args.recording)
+        if t is None:
+            t = np.arange(len(gyr)) * NOMINAL_DT
+    else:
+        t, gyr, acc, _ = synthetic_dataset(int(args.seconds / NOMINAL_DT))
+    Q = np.zeros((len(gyr), 4))
+    roll = np.zeros(len(gyr))
+    pitch = np.zeros(len(gyr))
+    fuse_recording(t, gyr, acc, Q, roll, pitch, np.asarray(args.gyro_bias), fusion=args.filter)
+
+    samples = frame_samples(np.asarray(t), args.fps)
+    if args.frames is not None:
+        samples = samples[:args.frames]
+    if not len(samples):
+        parser.error('the stream is shorter than one frame')
+
+    instruments = Instruments(args.instruments)
+    sink = None
+    if args.images:
+        sink = ImageSequence(args.images)
+    elif args.pipe:
+        sink = RawVideoPipe(args.pipe)
+    # Keep the report off stdout when the frames go there
+    report = sys.stderr if args.pipe == '-' else sys.stdout
+    width, height = instruments.frame.get_size()
+    print(f"{len(samples)} frames of {width}x{height}", file=report)
+
+    # Unthrottled: the next frame starts as soon as the last one is drawn
+    start = time.perf_counter()
+    for index, i in enumerate(samples):
+        frame = instruments.draw(Q[i], roll[i], pitch[i])
+        if sink is not None:
+            sink.write(frame, index)
+    elapsed = time.perf_counter() - start
+    if sink is not None:
+        sink.close()
+
+    print(f"{len(samples) / elapsed:.1f} frames/s, {elapsed / len(samples) * 1e3:.2f} ms per frame", file=report)
+    print(instruments.timer.summary(), file=report)
+
+
+if __name__ == "__main__":
+    main()
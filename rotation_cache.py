@@ -0,0 +1,150 @@
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+
+ROTATION_STEP = 0.25  # Degrees between cached rotations
+ROTATION_CACHE_MB = 32  # Memory budget per image, +/-20 to 28 degrees of the rover images at 0.25 degree steps
+
+
+def surface_bytes(surface):
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+class RotationCache:
+    """Rotations of one image at quantized angles, so each frame is a lookup and a blit.
+
+    Angles are rounded to the nearest `step` degrees. Rotated surfaces are made on first use
+    (or ahead of time by warm()) and the least recently used ones are dropped once their
+    pixels pass max_bytes. Each one is cropped to its visible pixels and, once a display
+    mode is set, converted to the display's pixel format, which makes the blit itself
+    many times cheaper than blitting what transform.rotate returns.
+    """
+
+    def __init__(self, image, step=ROTATION_STEP, max_bytes=ROTATION_CACHE_MB * 2 ** 20):
+        self.image = image
+        self.step = step
+        self.max_bytes = max_bytes
+        self.n_angles = int(round(360.0 / step))
+        self.surfaces = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pool = None
+        self._warm_queue = deque()
+        self._in_flight = []
+        self._workers = 0
+
+    def index(self, angle):
+        return int(round(angle / self.step)) % self.n_angles
+
+    def _rotate(self, i):
+        """(surface, x offset, y offset) where the offsets place it relative to the rotation center.
+
+        Plain software surfaces only, so the warm-up workers can run it.
+        """
+        surface = pygame.transform.rotate(self.image, i * self.step)
+        visible = surface.get_bounding_rect()
+        dx = visible.x - surface.get_width() // 2
+        dy = visible.y - surface.get_height() // 2
+        return surface.subsurface(visible).copy(), dx, dy
+
+    def _finish(self, entry):
+        """Convert a rotation to the display format, on the thread that owns the display."""
+        surface, dx, dy = entry
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+        return surface, dx, dy
+
+    def _render(self, i):
+        return self._finish(self._rotate(i))
+
+    def _store(self, i, entry):
+        surface = entry[0]
+        with self._lock:
+            if i in self.surfaces:
+                return self.surfaces[i]
+            self.surfaces[i] = entry
+            self.bytes += surface_bytes(surface)
+            while self.bytes > self.max_bytes and len(self.surfaces) > 1:
+                _, (old, _, _) = self.surfaces.popitem(last=False)
+                self.bytes -= surface_bytes(old)
+        return entry
+
+    def get(self, angle):
+        """(surface, x offset, y offset) of the image rotated by angle degrees, counter-clockwise."""
+        if self._pool is not None:
+            self._adopt()
+        i = self.index(angle)
+        with self._lock:
+            entry = self.surfaces.get(i)
+            if entry is not None:
+                self.surfaces.move_to_end(i)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        return self._store(i, self._render(i))
+
+    def rotate(self, angle, circle_center):
+        """Same result as rotate_image(): the rotated image and the top left that centers it on circle_center."""
+        surface, dx, dy = self.get(angle)
+        return surface, (circle_center[0] + dx, circle_center[1] + dy)
+
+    def warm(self, max_angle=90.0, workers=2):
+        """Render the rotations within +/-max_angle on a small thread pool, nearest to level first,
+        stopping at the memory budget. Returns at once, frames served meanwhile fill in lazily.
+
+        The workers only rotate. get() converts what they finished to the display format and
+        stores it on the calling thread, then hands out the next angles, at most one per
+        worker, so quitting never waits for more than those.
+        """
+        indices = [0]
+        for k in range(1, int(max_angle / self.step) + 1):
+            indices += [k % self.n_angles, -k % self.n_angles]
+        self.close()
+        self._warm_queue = deque(indices)
+        self._workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rotation-warmup')
+        self._feed()
+
+    def _feed(self):
+        while self._warm_queue and len(self._in_flight) < self._workers:
+            with self._lock:
+                full = self.bytes >= self.max_bytes
+                i = self._warm_queue.popleft()
+                cached = i in self.surfaces
+            if full:
+                self._warm_queue.clear()
+            elif not cached:
+                self._in_flight.append((i, self._pool.submit(self._rotate, i)))
+        if not self._in_flight:
+            self.close()
+
+    def _adopt(self):
+        """Store the rotations the warm-up finished and start the next ones."""
+        running = []
+        for i, future in self._in_flight:
+            if future.done():
+                entry = self._finish(future.result())
+                if self.bytes + surface_bytes(entry[0]) > self.max_bytes:
+                    # Full, more warm-up rotations would only push out the ones nearer to level
+                    self._warm_queue.clear()
+                else:
+                    self._store(i, entry)
+            else:
+                running.append((i, future))
+        self._in_flight = running
+        self._feed()
+
+    def close(self):
+        """Stop the warm-up, angles not started yet are dropped."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._warm_queue.clear()
+        self._in_flight = []
+
+    def summary(self):
+        return (f"{len(self.surfaces)} rotations, {self.bytes / 2 ** 20:.1f} MB, "
+                f"{self.hits} hits, {self.misses} misses")
@@ -0,0 +1,218 @@
+import math
+import time
+import numpy as np
+from imu_log import open_log
+
+GRAVITY = 9.80665
+
+
+class Pacer:
+    """Hold sample delivery to the recorded/generated timeline scaled by `speed`.
+
+    speed=1 is real time, speed=4 plays four times faster, speed=0 never waits.
+    """
+
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self.start = None
+
+    def wait(self, sample_t):
+        if not self.speed:
+            return
+        now = time.perf_counter()
+        if self.start is None:
+            self.start = now - sample_t / self.speed
+        delay = self.start + sample_t / self.speed - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SyntheticSensor:
+    """Drop-in for ISM330DHCX that generates a slow roll/pitch rocking motion.
+
+    Reading .gyro advances to the next sample, .acceleration and .temperature return the
+    values belonging to that same sample, which matches the order the AHRS loops read in.
+    The noise is seeded, so every run produces exactly the same stream.
+    """
+
+    simulated = True  # Calibration is measured every run, never stored
+
+    def __init__(self, rate=833.0, speed=1.0, seed=0, roll_amplitude=30.0, pitch_amplitude=20.0,
+                 roll_freq=0.2, pitch_freq=0.13, gyro_noise=0.002, accel_noise=0.02,
+                 gyro_bias=(0.004, -0.002, 0.001)):
+        self.rate = rate
+        self.pacer = Pacer(speed)
+        self.rng = np.random.default_rng(seed)
+        self.roll_amplitude = math.radians(roll_amplitude)
+        self.pitch_amplitude = math.radians(pitch_amplitude)
+        self.roll_freq = roll_freq
+        self.pitch_freq = pitch_freq
+        self.gyro_noise = gyro_noise
+        self.accel_noise = accel_noise
+        self.gyro_bias = gyro_bias
+        self.index = -1
+        self._accel = (0.0, 0.0, GRAVITY)
+        self._temperature = 25.0
+
+    def attitude(self, t):
+        """True roll and pitch (radians) at time t."""
+        roll = self.roll_amplitude * math.sin(2 * math.pi * self.roll_freq * t)
+        pitch = self.pitch_amplitude * math.sin(2 * math.pi * self.pitch_freq * t)
+        return roll, pitch
+
+    @property
+    def gyro(self):
+        self.index += 1
+        t = self.index / self.rate
+        self.pacer.wait(t)
+
+        roll, pitch = self.attitude(t)
+        roll_rate = self.roll_amplitude * 2 * math.pi * self.roll_freq * math.cos(2 * math.pi * self.roll_freq * t)
+        pitch_rate = self.pitch_amplitude * 2 * math.pi * self.pitch_freq * math.cos(2 * math.pi * self.pitch_freq * t)
+        gyro_noise = self.rng.normal(0.0, self.gyro_noise, 3)
+        accel_noise = self.rng.normal(0.0, self.accel_noise, 3)
+
+        # Body rates for a roll-pitch motion with no yaw
+        gyro = (roll_rate + self.gyro_bias[0] + gyro_noise[0],
+                pitch_rate * math.cos(roll) + self.gyro_bias[1] + gyro_noise[1],
+                -pitch_rate * math.sin(roll) + self.gyro_bias[2] + gyro_noise[2])
+        self._accel = (-GRAVITY * math.sin(pitch) + accel_noise[0],
+                       GRAVITY * math.sin(roll) * math.cos(pitch) + accel_noise[1],
+                       GRAVITY * math.cos(roll) * math.cos(pitch) + accel_noise[2])
+        # Slow warm-up so temperature dependent code has something to follow
+        self._temperature = 25.0 + 15.0 * (1.0 - math.exp(-t / 600.0))
+        return gyro
+
+    @property
+    def acceleration(self):
+        return self._accel
+
+    @property
+    def sample_time(self):
+        return self.index / self.rate
+
+    @property
+    def temperature(self):
+        return self._temperature
+
+
+def load_recording(path):
+    """Load a recorded stream as (t, gyro, accel, temp) arrays, temp is None if it was not recorded.
+
+    .imulog files are memory mapped, so long recordings are never read into memory.
+    .npy files hold an (N, 6) gyro+accel array or an (N, 7) array with the timestamp first,
+    .csv files hold the same columns with one header line.
+    """
+    if path.endswith('.imulog'):
+        log = open_log(path)
+        return log['t'], log['gyro'], log['accel'], log['temp']
+    if path.endswith('.npy'):
+        data = np.load(path, mmap_mode='r')
+    else:
+        data = np.loadtxt(path, delimiter=',', skiprows=1)
+    if data.shape[1] == 7:
+        return data[:, 0], data[:, 1:4], data[:, 4:7], None
+    return None, data[:, 0:3], data[:, 3:6], None
+
+
+class ReplaySensor:
+    """Drop-in for ISM330DHCX that plays back a recorded gyro/accel stream."""
+
+    simulated = True  # Calibration is measured every run, never stored
+
+    def __init__(self, path, speed=1.0, rate=833.0, loop=True):
+        self.t, self.gyro_data, self.accel_data, self.temperature_data = load_recording(path)
+        if self.t is None:
+            self.t = np.arange(len(self.gyro_data)) / rate
+        self.period = (self.t[-1] - self.t[0]) / (len(self.t) - 1) if len(self.t) > 1 else 1.0 / rate
+        # Playback rate as sensor_rate() reports it, from the recorded timestamps when there are any
+        self.rate = 1.0 / self.period
+        self.pacer = Pacer(speed)
+        self.loop = loop
+        self.index = -1
+        self._offset = 0.0
+
+    @property
+    def gyro(self):
+        self.index += 1
+        if self.index == len(self.t):
+            if not self.loop:
+                raise EOFError("end of recording")
+            # Keep the timeline moving forward when starting over
+            self._offset += self.t[-1] - self.t[0] + self.period
+            self.index = 0
+        self.pacer.wait(self.t[self.index] - self.t[0] + self._offset)
+        return tuple(self.gyro_data[self.index].tolist())
+
+    @property
+    def acceleration(self):
+        return tuple(self.accel_data[self.index].tolist())
+
+    @property
+    def sample_time(self):
+        return self.t[self.index] - self.t[0] + self._offset
+
+    @property
+    def temperature(self):
+        if self.temperature_data is None:
+            return float('nan')
+        return float(self.temperature_data[self.index])
+
+
+_i2c_buses = {}
+BOARD_I2C_BUS = 1  # Bus number behind board.I2C() on the Raspberry Pi
+
+
+def open_sensor(source='hw', speed=1.0):
+    """Open the IMU named on the command line.
+
+    'hw' is the ISM330DHCX on the board I2C bus and 'hw:BUS:ADDRESS' (e.g. hw:3:0x6b) one
+    on another bus or address. 'synthetic' generates motion, 'synthetic:SEED' the same
+    motion with different noise. Anything else is taken as the path of a recording to replay.
+    """
+    if source == 'hw':
+        import board
+        from adafruit_lsm6ds.ism330dhcx import ISM330DHCX
+        sox = ISM330DHCX(board.I2C())
+        # Same calibration key as hw:1:0x6a, the same physical sensor
+        sox.i2c_bus = BOARD_I2C_BUS
+        return sox
+    if source.startswith('hw:'):
+        from adafruit_extended_bus import ExtendedI2C
+        from adafruit_lsm6ds.ism330dhcx import ISM330DHCX
+        _, bus, address = source.split(':')
+        bus = int(bus)
+        # Sensors on the same bus share one bus object
+        if bus not in _i2c_buses:
+            _i2c_buses[bus] = ExtendedI2C(bus)
+        sox = ISM330DHCX(_i2c_buses[bus], address=int(address, 0))
+        sox.i2c_bus = bus
+        return sox
+    if source == 'synthetic':
+        return SyntheticSensor(speed=speed)
+    if source.startswith('synthetic:'):
+        return SyntheticSensor(speed=speed, seed=int(source.split(':')[1]))
+    return ReplaySensor(source, speed=speed)
+
+
+def sensor_rate(sox):
+    """Output data rate (Hz) of the gyro: the configured ODR on hardware, the playback rate otherwise."""
+    if hasattr(sox, 'rate'):
+        return sox.rate
+    from adafruit_lsm6ds import Rate
+    return Rate.string[sox.gyro_data_rate]
+
+
+def sensor_clock(sox):
+    """Clock to timestamp samples with: the simulated timeline for simulated sensors, so dt stays
+    right at any playback speed, and the monotonic wall clock for hardware."""
+    if hasattr(sox, 'sample_time'):
+        return lambda: sox.sample_time
+    return time.perf_counter
+
+
+def add_sensor_arguments(parser):
+    parser.add_argument('--sensor', default='hw',
+                        help="'hw' for the ISM330DHCX, 'synthetic' for generated motion, or a recording (.imulog/.npy/.csv) to replay")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='playback speed for simulated sensors: 1 is real time, 0 is unthrottled')
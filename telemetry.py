@@ -0,0 +1,163 @@
+import ipaddress
+import select
+import socket
+import struct
+import time
+from collections import namedtuple
+
+TELEMETRY_MAGIC = b'AHR2'
+# magic, sequence, t, wall, quaternion w x y z, gyro x y z (rad/s, bias removed), accel x y z (m/s^2, calibrated)
+# t is the publisher's perf_counter, only good for intervals between samples (and on Linux
+# comparable with perf_counter on the same host). wall is time.time() when the sample was
+# sent, the stamp to relate samples to other hosts by.
+TELEMETRY_PACKET = struct.Struct('<4sIdd4f3f3f')
+TELEMETRY_PORT = 5005
+TELEMETRY_TTL = 1  # Multicast hops, 1 keeps the stream on the local network
+RECEIVE_BUFFER = 2 ** 20  # Socket buffer asked for by subscribers, seconds of packets at full rate
+REORDER_WINDOW = 64  # Packets a reordered one may trail the newest by, further back is a publisher restart
+
+TelemetrySample = namedtuple('TelemetrySample', 'sequence t wall q gyro accel')
+
+
+def parse_address(text, default_port=TELEMETRY_PORT):
+    """(host, port) from 'HOST:PORT' or 'HOST'."""
+    host, _, port = text.rpartition(':')
+    if not host:
+        return text, default_port
+    return host, int(port)
+
+
+def is_multicast(host):
+    try:
+        return ipaddress.ip_address(host).is_multicast
+    except ValueError:
+        return False
+
+
+class TelemetryPublisher:
+    """Sends every fused sample as one fixed-size TELEMETRY_PACKET datagram.
+
+    Each address may be unicast or a multicast group, a group reaches any number of
+    subscribers with one send. The socket never blocks: a datagram the kernel cannot take
+    right away, or one to an unreachable network, is counted in dropped and the sample
+    stream carries on.
+    """
+
+    def __init__(self, addresses, ttl=TELEMETRY_TTL):
+        self.addresses = [(socket.gethostbyname(host), port) for host, port in addresses]
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        if any(is_multicast(host) for host, _ in self.addresses):
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+            # Subscribers on this machine, like the GUI, receive the group too
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        self.sequence = 0
+        self.sent = 0
+        self.dropped = 0
+        self._packet = bytearray(TELEMETRY_PACKET.size)
+
+    def publish(self, t, q, gyro, accel):
+        TELEMETRY_PACKET.pack_into(self._packet, 0, TELEMETRY_MAGIC, self.sequence, t, time.time(),
+                                   q[0], q[1], q[2], q[3], gyro[0], gyro[1], gyro[2], accel[0], accel[1], accel[2])
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        for address in self.addresses:
+            try:
+                self.sock.sendto(self._packet, address)
+                self.sent += 1
+            except OSError:
+                self.dropped += 1
+
+    def close(self):
+        self.sock.close()
+
+    def summary(self):
+        return f"{self.sent} packets sent, {self.dropped} dropped"
+
+
+class TelemetryReceiver:
+    """Subscriber side: decodes TELEMETRY_PACKETs arriving on a UDP port, optionally joining a
+    multicast group.
+
+    The port is bound with SO_REUSEADDR, so several subscribers on one machine can share a
+    group. Gaps in the sequence numbers are counted in lost, packets up to REORDER_WINDOW
+    older than the newest one seen in late, and datagrams that are not telemetry packets in
+    invalid. A sequence that jumps back further means the publisher restarted from 0: it is
+    counted in restarts and followed from there on.
+    """
+
+    def __init__(self, port=TELEMETRY_PORT, group=None, host='', interface='0.0.0.0'):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Room for the packets that pile up while the subscriber is busy, e.g. drawing a frame
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        if group is not None and hasattr(socket, 'SO_REUSEPORT'):
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.sock.bind((host, port))
+        if group is not None:
+            membership = socket.inet_aton(socket.gethostbyname(group)) + socket.inet_aton(interface)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        self.sock.setblocking(False)
+        self.received = 0
+        self.lost = 0
+        self.late = 0
+        self.invalid = 0
+        self.restarts = 0
+        self.last_sequence = None
+        self._buffer = bytearray(TELEMETRY_PACKET.size + 1)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def _read(self):
+        """Next queued packet as a TelemetrySample, None once nothing valid is left to read."""
+        while True:
+            try:
+                n = self.sock.recv_into(self._buffer)
+            except BlockingIOError:
+                return None
+            if n != TELEMETRY_PACKET.size:
+                self.invalid += 1
+                continue
+            fields = TELEMETRY_PACKET.unpack_from(self._buffer)
+            if fields[0] != TELEMETRY_MAGIC:
+                self.invalid += 1
+                continue
+            sequence = fields[1]
+            self.received += 1
+            if self.last_sequence is not None:
+                gap = (sequence - self.last_sequence - 1) & 0xFFFFFFFF
+                if gap < 0x80000000:
+                    self.lost += gap
+                elif (self.last_sequence - sequence) & 0xFFFFFFFF <= REORDER_WINDOW:
+                    # Behind the newest packet already seen, reordered or duplicated on the way
+                    self.late += 1
+                    continue
+                else:
+                    self.restarts += 1
+            self.last_sequence = sequence
+            return TelemetrySample(sequence, fields[2], fields[3], fields[4:8], fields[8:11], fields[11:14])
+
+    def receive(self, timeout=None):
+        """Wait up to timeout seconds (forever for None) for the next packet, None on timeout."""
+        sample = self._read()
+        while sample is None:
+            if not select.select([self.sock], [], [], timeout)[0]:
+                return None
+            sample = self._read()
+        return sample
+
+    def latest(self):
+        """Newest packet among everything queued, without waiting. None if nothing arrived."""
+        newest = None
+        sample = self._read()
+        while sample is not None:
+            newest = sample
+            sample = self._read()
+        return newest
+
+    def close(self):
+        self.sock.close()
+
+    def summary(self):
+        return (f"{self.received} packets, {self.lost} lost, {self.late} late, {self.invalid} invalid, "
+                f"{self.restarts} restarts")
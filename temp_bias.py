@@ -0,0 +1,89 @@
+import math
+import numpy as np
+from calibration import RunningStats, load_calibrations, save_calibration, sensor_identity, CALIBRATION_FILE
+from sim_sensor import GRAVITY
+
+STATIONARY_WINDOW = 400  # Samples per stationary check (about half a second at 833 Hz)
+STATIONARY_GYRO_STD = 0.01  # rad/s, noise above this means the rover is vibrating or moving
+STATIONARY_GYRO_MEAN = 0.05  # rad/s, a mean above this is a real rotation, not bias
+STATIONARY_ACCEL_ERROR = 0.3  # m/s^2 allowed between |accel| and g
+MAX_BIN_WEIGHT = 20000  # Cap on samples per bin so old estimates keep giving way to new ones
+
+
+class TempBiasTable:
+    """Gyro bias per 1 C temperature bin, filled in from stationary periods while running.
+
+    Each bin holds a weighted mean of the bias seen at that temperature. bias_at()
+    interpolates linearly between filled bins and holds the end values outside them.
+    """
+
+    def __init__(self, t_min=-20.0, t_max=80.0, bin_width=1.0):
+        self.t_min = t_min
+        self.bin_width = bin_width
+        n_bins = int(round((t_max - t_min) / bin_width)) + 1
+        self.centers = t_min + bin_width * np.arange(n_bins)
+        self.bias = np.zeros((n_bins, 3))
+        self.weight = np.zeros(n_bins)
+        self._window = RunningStats()
+        self._accel_error = 0.0
+        self._filled = None
+
+    def bin_index(self, temperature):
+        return int(min(max(round((temperature - self.t_min) / self.bin_width), 0), len(self.centers) - 1))
+
+    def add(self, temperature, bias, weight):
+        i = self.bin_index(temperature)
+        total = self.weight[i] + weight
+        self.bias[i] += (np.asarray(bias) - self.bias[i]) * (weight / total)
+        self.weight[i] = min(total, MAX_BIN_WEIGHT)
+        self._filled = None
+
+    def bias_at(self, temperature, default=None):
+        """Interpolated bias at a temperature, or default when no bin has been filled yet."""
+        if self._filled is None:
+            self._filled = np.flatnonzero(self.weight)
+        filled = self._filled
+        if len(filled) == 0 or math.isnan(temperature):
+            return default
+        centers = self.centers[filled]
+        return np.array([np.interp(temperature, centers, self.bias[filled, axis]) for axis in range(3)])
+
+    def observe(self, gyro, accel, temperature):
+        """Feed one raw sample, every STATIONARY_WINDOW samples a still window is added to the table."""
+        window = self._window
+        window.add(gyro)
+        self._accel_error = max(self._accel_error, abs(math.sqrt(accel[0] ** 2 + accel[1] ** 2 + accel[2] ** 2) - GRAVITY))
+        if window.n < STATIONARY_WINDOW:
+            return False
+        stationary = (self._accel_error < STATIONARY_ACCEL_ERROR
+                      and max(window.std()) < STATIONARY_GYRO_STD
+                      and max(abs(m) for m in window.mean) < STATIONARY_GYRO_MEAN
+                      and not math.isnan(temperature))
+        if stationary:
+            self.add(temperature, window.mean, window.n)
+        self._window = RunningStats()
+        self._accel_error = 0.0
+        return stationary
+
+    def to_dict(self):
+        return {'t_min': self.t_min, 'bin_width': self.bin_width,
+                'bias': self.bias.tolist(), 'weight': self.weight.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        table = cls(t_min=data['t_min'], t_max=data['t_min'] + data['bin_width'] * (len(data['weight']) - 1),
+                    bin_width=data['bin_width'])
+        table.bias[:] = data['bias']
+        table.weight[:] = data['weight']
+        return table
+
+
+def load_temp_bias_table(sox, path=CALIBRATION_FILE):
+    stored = load_calibrations(path).get(sensor_identity(sox), {})
+    if 'gyro_temp_table' in stored:
+        return TempBiasTable.from_dict(stored['gyro_temp_table'])
+    return TempBiasTable()
+
+
+def save_temp_bias_table(sox, table, path=CALIBRATION_FILE):
+    save_calibration(sox, {'gyro_temp_table': table.to_dict()}, path)
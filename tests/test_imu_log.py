@@ -0,0 +1,95 @@
+import threading
+
+import numpy as np
+import pytest
+
+from imu_log import ImuRecorder, open_log, HEADER, HEADER_SIZE, MAGIC, RECORD
+
+TIMEOUT = 1.0  # Seconds to wait for the writer thread
+
+
+class StalledFile:
+    """Stands in for the log file and holds the writer in write() until released."""
+
+    def __init__(self, file):
+        self.file = file
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.entered.set()
+        self.release.wait(TIMEOUT)
+        return self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+def record(recorder, indices):
+    for i in indices:
+        recorder.append(i * 0.01, (i, -i, 0.5), (0.0, 1.0, i), 20.0 + i)
+
+
+def test_round_trip_with_partial_last_block(tmp_path):
+    path = tmp_path / 'run.imulog'
+    with ImuRecorder(path, block_size=8) as recorder:
+        record(recorder, range(21))
+
+    log = open_log(path)
+    assert isinstance(log, np.memmap)
+    assert log.dtype == RECORD
+    assert len(log) == recorder.count == 21
+    np.testing.assert_allclose(log['t'], np.arange(21) * 0.01)
+    np.testing.assert_allclose(log['gyro'][20], [20, -20, 0.5])
+    np.testing.assert_allclose(log['accel'][:, 2], np.arange(21))
+    np.testing.assert_allclose(log['temp'], 20.0 + np.arange(21))
+    assert recorder.dropped == 0
+
+
+def test_trailing_partial_record_is_ignored(tmp_path):
+    path = tmp_path / 'cut.imulog'
+    with ImuRecorder(path, block_size=4) as recorder:
+        record(recorder, range(3))
+    with open(path, 'ab') as f:
+        f.write(b'\0' * (RECORD.itemsize // 2))
+
+    assert len(open_log(path)) == 3
+
+
+def test_empty_log(tmp_path):
+    path = tmp_path / 'empty.imulog'
+    ImuRecorder(path).close()
+
+    log = open_log(path)
+    assert len(log) == 0
+    assert log.dtype == RECORD
+
+
+def test_header_is_checked(tmp_path):
+    wrong_magic = tmp_path / 'magic.imulog'
+    wrong_magic.write_bytes(HEADER.pack(b'NOTALOG0', HEADER_SIZE, RECORD.itemsize))
+    wrong_size = tmp_path / 'size.imulog'
+    wrong_size.write_bytes(HEADER.pack(MAGIC, HEADER_SIZE, RECORD.itemsize + 4))
+
+    with pytest.raises(ValueError, match='not an IMU log'):
+        open_log(wrong_magic)
+    with pytest.raises(ValueError, match='byte records'):
+        open_log(wrong_size)
+
+
+def test_blocks_are_dropped_when_the_writer_falls_behind(tmp_path):
+    path = tmp_path / 'slow.imulog'
+    recorder = ImuRecorder(path, block_size=4, max_pending=2)
+    stalled = recorder._file = StalledFile(recorder._file)
+
+    record(recorder, range(4))
+    assert stalled.entered.wait(TIMEOUT)
+    # One block is being written and two are queued, the next three have nowhere to go
+    record(recorder, range(4, 24))
+    assert recorder.dropped == 3
+
+    stalled.release.set()
+    recorder.close()
+    log = open_log(path)
+    np.testing.assert_allclose(log['t'], np.arange(12) * 0.01)
+    assert recorder.count == 24
@@ -0,0 +1,112 @@
+import numpy as np
+from adafruit_bus_device.i2c_device import I2CDevice
+
+from fake_i2c import FakeI2C
+from ism330_fifo import (FifoReader, FIFO_DATA_OUT_TAG, FIFO_STATUS1, FIFO_STATUS2, FIFO_OVR_IA,
+                         FIFO_CTRL3, FIFO_CTRL4, FIFO_MODE_CONTINUOUS, FIFO_WORD, TAG_GYRO, TAG_ACCEL)
+
+ADDRESS = 0x6A
+GYRO_SCALE = 0.001
+ACCEL_SCALE = 0.01
+
+
+def make_reader(i2c, max_words=64):
+    return FifoReader(I2CDevice(i2c, ADDRESS), GYRO_SCALE, ACCEL_SCALE, 0x8, 0x8, max_words)
+
+
+def test_paired_words_scale_into_block():
+    i2c = FakeI2C()
+    samples = [((1, -2, 3), (100, -200, 300)), ((-32768, 0, 32767), (1000, 0, -1000)), ((7, 8, 9), (10, 11, 12))]
+    for gyro, accel in samples:
+        i2c.push_fifo_sample(ADDRESS, gyro, accel)
+    reader = make_reader(i2c)
+    out = np.zeros((8, 6))
+
+    assert reader.drain(out) == 3
+    expected = np.array([[*np.multiply(gyro, GYRO_SCALE), *np.multiply(accel, ACCEL_SCALE)] for gyro, accel in samples])
+    np.testing.assert_allclose(out[:3], expected)
+    assert not i2c.fifo[ADDRESS]
+    assert reader.drain(out) == 0
+
+
+def test_unpaired_word_waits_for_its_partner():
+    i2c = FakeI2C()
+    i2c.push_fifo_word(ADDRESS, TAG_GYRO, (1, 1, 1))
+    i2c.push_fifo_word(ADDRESS, TAG_ACCEL, (2, 2, 2))
+    i2c.push_fifo_word(ADDRESS, TAG_GYRO, (3, 3, 3))
+    reader = make_reader(i2c)
+    out = np.zeros((8, 6))
+
+    assert reader.drain(out) == 1
+    np.testing.assert_allclose(out[0], [0.001] * 3 + [0.02] * 3)
+
+    # The held gyro word pairs with the accel word of the next burst
+    i2c.push_fifo_word(ADDRESS, TAG_ACCEL, (4, 4, 4))
+    assert reader.drain(out) == 1
+    np.testing.assert_allclose(out[0], [0.003] * 3 + [0.04] * 3)
+
+
+def test_other_tags_are_skipped():
+    i2c = FakeI2C()
+    i2c.push_fifo_word(ADDRESS, TAG_GYRO, (5, 5, 5))
+    i2c.push_fifo_word(ADDRESS, 0x03, (9, 9, 9))  # temperature
+    i2c.push_fifo_word(ADDRESS, TAG_ACCEL, (6, 6, 6))
+    reader = make_reader(i2c)
+    out = np.zeros((8, 6))
+
+    assert reader.drain(out) == 1
+    np.testing.assert_allclose(out[0], [0.005] * 3 + [0.06] * 3)
+
+
+def test_status_level_and_overrun():
+    i2c = FakeI2C()
+    for i in range(150):
+        i2c.push_fifo_sample(ADDRESS, (i, 0, 0), (0, i, 0))
+    reader = make_reader(i2c)
+
+    # 300 words needs DIFF_FIFO bit 8 from STATUS2
+    assert i2c.registers[ADDRESS][FIFO_STATUS1] == 300 & 0xFF
+    assert i2c.registers[ADDRESS][FIFO_STATUS2] & 0x03 == 1
+    assert reader.fifo_level() == 300
+    assert reader.overruns == 0
+
+    i2c.set_register(ADDRESS, FIFO_STATUS2, i2c.registers[ADDRESS][FIFO_STATUS2] | FIFO_OVR_IA)
+    assert reader.fifo_level() == 300
+    assert reader.overruns == 1
+
+
+def test_burst_rolls_over_the_output_registers():
+    i2c = FakeI2C()
+    i2c.push_fifo_word(ADDRESS, TAG_GYRO, (0x0102, 0x0304, 0x0506))
+    i2c.push_fifo_word(ADDRESS, TAG_ACCEL, (-1, -2, -3))
+    raw = bytearray(2 * FIFO_WORD.itemsize)
+    with I2CDevice(i2c, ADDRESS) as device:
+        device.write_then_readinto(bytes([FIFO_DATA_OUT_TAG]), raw)
+
+    words = np.frombuffer(raw, dtype=FIFO_WORD)
+    assert list(words['tag'] >> 3) == [TAG_GYRO, TAG_ACCEL]
+    assert words['xyz'].tolist() == [[0x0102, 0x0304, 0x0506], [-1, -2, -3]]
+    assert i2c.registers[ADDRESS][FIFO_STATUS1] == 0
+
+
+def test_drain_is_limited_to_max_words():
+    i2c = FakeI2C()
+    for i in range(10):
+        i2c.push_fifo_sample(ADDRESS, (i, 0, 0), (0, 0, i))
+    reader = make_reader(i2c, max_words=8)
+    out = np.zeros((8, 6))
+
+    assert reader.drain(out) == 4
+    assert reader.drain(out) == 4
+    assert reader.drain(out) == 2
+    np.testing.assert_allclose(out[:2, 0], [0.008, 0.009])
+    np.testing.assert_allclose(out[:2, 5], [0.08, 0.09])
+
+
+def test_enable_sets_continuous_mode():
+    i2c = FakeI2C()
+    reader = make_reader(i2c)
+    reader.enable()
+
+    assert i2c.registers[ADDRESS][FIFO_CTRL3] == 0x88
+    assert i2c.registers[ADDRESS][FIFO_CTRL4] == FIFO_MODE_CONTINUOUS
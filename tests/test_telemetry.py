@@ -0,0 +1,125 @@
+import socket
+import time
+
+import pytest
+
+from telemetry import TelemetryPublisher, TelemetryReceiver, TELEMETRY_PACKET, TELEMETRY_MAGIC
+
+TIMEOUT = 1.0  # Seconds to wait for a packet on loopback
+
+Q = (1.0, 0.0, 0.0, 0.0)
+GYRO = (0.1, -0.2, 0.3)
+ACCEL = (0.0, 0.0, 9.80665)
+
+
+@pytest.fixture
+def link():
+    receiver = TelemetryReceiver(port=0, host='127.0.0.1')
+    publisher = TelemetryPublisher([('127.0.0.1', receiver.sock.getsockname()[1])])
+    yield publisher, receiver
+    publisher.close()
+    receiver.close()
+
+
+def send_raw(receiver, data):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.sendto(data, receiver.sock.getsockname())
+
+
+def publish_sequences(publisher, sequences):
+    for sequence in sequences:
+        publisher.sequence = sequence
+        publisher.publish(sequence * 0.01, Q, GYRO, ACCEL)
+
+
+def test_round_trip(link):
+    publisher, receiver = link
+    before = time.time()
+    publisher.publish(1.5, (0.5, 0.5, -0.5, 0.5), GYRO, ACCEL)
+
+    sample = receiver.receive(TIMEOUT)
+    assert sample.sequence == 0
+    assert sample.t == 1.5
+    assert before <= sample.wall <= time.time()
+    assert sample.q == (0.5, 0.5, -0.5, 0.5)
+    assert sample.gyro == pytest.approx(GYRO)
+    assert sample.accel == pytest.approx(ACCEL)
+    assert publisher.sent == 1 and publisher.dropped == 0
+    assert (receiver.received, receiver.lost, receiver.late, receiver.invalid, receiver.restarts) == (1, 0, 0, 0, 0)
+
+
+def test_sequence_gaps_count_as_lost(link):
+    publisher, receiver = link
+    publish_sequences(publisher, [0, 1, 4, 10])
+
+    assert [receiver.receive(TIMEOUT).sequence for _ in range(4)] == [0, 1, 4, 10]
+    assert receiver.lost == 2 + 5
+    assert receiver.late == 0
+
+
+def test_sequence_wraps_without_loss(link):
+    publisher, receiver = link
+    publish_sequences(publisher, [0xFFFFFFFE, 0xFFFFFFFF, 0, 1])
+
+    assert [receiver.receive(TIMEOUT).sequence for _ in range(4)] == [0xFFFFFFFE, 0xFFFFFFFF, 0, 1]
+    assert receiver.lost == 0
+    assert receiver.late == 0
+
+
+def test_reordered_packets_count_as_late(link):
+    publisher, receiver = link
+    publish_sequences(publisher, [0, 2, 1, 2, 3])
+
+    assert [receiver.receive(TIMEOUT).sequence for _ in range(3)] == [0, 2, 3]
+    # 1 was counted lost when 2 arrived, then skipped as late along with the duplicate 2
+    assert receiver.lost == 1
+    assert receiver.late == 2
+    assert receiver.last_sequence == 3
+
+
+def test_publisher_restart_resyncs(link):
+    publisher, receiver = link
+    publish_sequences(publisher, range(200))
+    assert receiver.receive(TIMEOUT).sequence == 0
+    assert receiver.latest().sequence == 199
+
+    # A new publisher process starts counting from 0 again
+    restarted = TelemetryPublisher([('127.0.0.1', receiver.sock.getsockname()[1])])
+    for _ in range(50):
+        restarted.publish(0.0, Q, GYRO, ACCEL)
+    restarted.close()
+
+    assert [receiver.receive(TIMEOUT).sequence for _ in range(50)] == list(range(50))
+    assert receiver.restarts == 1
+    assert receiver.late == 0
+    assert receiver.lost == 0
+
+
+def test_wrong_size_or_magic_is_invalid(link):
+    publisher, receiver = link
+    packet = TELEMETRY_PACKET.pack(TELEMETRY_MAGIC, 7, 0.0, 0.0, *Q, *GYRO, *ACCEL)
+    send_raw(receiver, packet[:-1])
+    send_raw(receiver, packet + b'\0')
+    send_raw(receiver, b'XXXX' + packet[4:])
+    send_raw(receiver, b'')
+    send_raw(receiver, packet)
+
+    assert receiver.receive(TIMEOUT).sequence == 7
+    assert receiver.invalid == 4
+    assert receiver.received == 1
+
+
+def test_latest_drains_to_newest(link):
+    publisher, receiver = link
+    assert receiver.latest() is None
+
+    publish_sequences(publisher, range(5))
+    first = receiver.receive(TIMEOUT)
+    newest = receiver.latest()
+
+    assert first.sequence == 0
+    assert newest.sequence == 4
+    assert newest.t == pytest.approx(0.04)
+    assert receiver.latest() is None
+    assert receiver.received == 5
+    assert receiver.receive(0.0) is None
@@ -0,0 +1,103 @@
+from collections import OrderedDict
+import pygame
+
+TEXT_CACHE_SIZE = 512  # Rendered labels kept before the least recently used ones are dropped
+ATLAS_CHARS = "0123456789+-.°"  # Characters pre-rendered for numeric readouts
+
+_fonts = {}
+
+
+def get_font(name=None, size=24):
+    """pygame Font loaded once per (name, size) and shared by every caller."""
+    key = (name, size)
+    font = _fonts.get(key)
+    if font is None:
+        font = _fonts[key] = pygame.font.Font(name, size)
+    return font
+
+
+class TextCache:
+    """Rendered text surfaces keyed by (text, color, font), evicting the least recently used.
+
+    Meant for labels that repeat from frame to frame, like dial and ruler numbers.
+    """
+
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, color, font_name=None, size=24, antialias=True):
+        key = (text, tuple(color), font_name, size, antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = get_font(font_name, size).render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+class GlyphAtlas:
+    """One surface holding every character of `chars`, for readouts whose value changes each frame.
+
+    blit() draws a string glyph by glyph straight from the atlas, so a changing number never
+    goes through the font renderer. Characters outside the atlas are rendered once and kept.
+    """
+
+    def __init__(self, color, chars=ATLAS_CHARS, font_name=None, size=24):
+        self.color = color
+        self.font = get_font(font_name, size)
+        glyphs = [self.font.render(char, True, color) for char in dict.fromkeys(chars)]
+        self.height = max(glyph.get_height() for glyph in glyphs)
+        self.surface = pygame.Surface((sum(glyph.get_width() for glyph in glyphs), self.height), pygame.SRCALPHA)
+        self.glyphs = {}
+        x = 0
+        for char, glyph in zip(dict.fromkeys(chars), glyphs):
+            self.surface.blit(glyph, (x, 0))
+            self.glyphs[char] = (self.surface, pygame.Rect(x, 0, glyph.get_width(), self.height))
+            x += glyph.get_width()
+
+    def _glyph(self, char):
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            surface = self.font.render(char, True, self.color)
+            glyph = self.glyphs[char] = (surface, surface.get_rect())
+        return glyph
+
+    def size(self, text):
+        return sum(self._glyph(char)[1].width for char in text), self.height
+
+    def blit(self, target, text, prefix='', **anchor):
+        """Draw prefix + text onto target, placed like Surface.get_rect(**anchor), e.g. midtop=(x, y).
+
+        The prefix (a fixed label like "Roll: ") is kept as one glyph of its own.
+        """
+        glyphs = [self._glyph(char) for char in text]
+        if prefix:
+            glyphs.insert(0, self._glyph(prefix))
+        rect = pygame.Rect(0, 0, sum(area.width for _, area in glyphs), self.height)
+        for name, value in anchor.items():
+            setattr(rect, name, value)
+        x = rect.x
+        y = rect.y
+        sequence = []
+        for surface, area in glyphs:
+            sequence.append((surface, (x, y), area))
+            x += area.width
+        # One call for the whole string, blits() is far cheaper than a blit() per glyph
+        target.blits(sequence, False)
+        return rect
+
+
+# Shared by every script, so all of them reuse the same rendered labels
+label_cache = TextCache()
+
+
+def render_text(text, color, font_name=None, size=24):
+    return label_cache.render(text, color, font_name, size)